@@ -0,0 +1,165 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import csv
+import math
+import time
+import argparse
+import tempfile
+import multiprocessing as mp
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+import pygame
+from pygame import Vector2, Surface
+
+import bsp.bsp_map as bsp_map
+from entities.player import EYE_DROP, VIEW_HEIGHT, Player
+from utils.defs import RES_WIDTH, RES_HEIGHT
+from wad.reader import WadFile, read_playpal
+
+class Pose(NamedTuple):
+    index : int
+    map_name : str
+    x : float
+    y : float
+    # Degrees, like THINGS angles.
+    angle : float
+    # Eye height above the floor of the sector the pose is in.
+    height : float
+
+class FrameResult(NamedTuple):
+    index : int
+    worker : int
+    loaded_map : bool
+    load_time : float
+    render_time : float
+    write_time : float
+
+def read_poses(path : str) -> List[Pose]:
+    # One pose per line: map,x,y,angle[,height]. Blank lines and lines starting with # are skipped.
+    poses : List[Pose] = []
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#') or row[0] == 'map':
+                continue
+            height = float(row[4]) if len(row) > 4 and row[4] else VIEW_HEIGHT
+            poses.append(Pose(len(poses), row[0], float(row[1]), float(row[2]), float(row[3]), height))
+    return poses
+
+_wad : Optional[WadFile] = None
+_cache_dir = ''
+_out_dir = ''
+_out_format = ''
+_map_name : Optional[str] = None
+_frame_surface : Optional[Surface] = None
+_renderer : Optional[bsp_map.Renderer] = None
+
+def _init_worker(wad_path : str, cache_dir : str, out_dir : str, out_format : str, width : int, height : int):
+    global _wad, _cache_dir, _out_dir, _out_format, _frame_surface, _renderer
+    _renderer = bsp_map.Renderer(width, height)
+    _wad = WadFile(wad_path)
+    _cache_dir, _out_dir, _out_format = cache_dir, out_dir, out_format
+    _frame_surface = Surface((width, height), depth=8)
+    _frame_surface.set_palette(read_playpal(_wad, *_wad.info_table['PLAYPAL'])[0])
+
+def _render_pose(pose : Pose) -> FrameResult:
+    global _map_name
+    start = time.perf_counter()
+    loaded_map = pose.map_name != _map_name
+    if loaded_map:
+        bsp_map.init_bsp_map(_wad, _wad.info_table, pose.map_name, _cache_dir)
+        _map_name = pose.map_name
+    load_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    player = Player(Vector2(pose.x, pose.y), math.radians(pose.angle), math.radians(90), pose.height + EYE_DROP)
+    player.update_foot_pos(bsp_map.sector_search(player.pos).floor_height)
+    frame = bsp_map.render_player_view(player, renderer=_renderer)
+    render_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    path = os.path.join(_out_dir, 'frame_%06d.%s' % (pose.index, _out_format))
+    if _out_format == 'npy':
+        np.save(path, frame)
+    else:
+        pygame.surfarray.blit_array(_frame_surface, frame)
+        pygame.image.save(_frame_surface, path)
+    write_time = time.perf_counter() - start
+
+    return FrameResult(pose.index, os.getpid(), loaded_map, load_time, render_time, write_time)
+
+def _group_by_map(poses : List[Pose]) -> List[Pose]:
+    # Consecutive poses share a map, so a worker rarely has to switch maps mid-chunk.
+    return sorted(poses, key=lambda p: (p.map_name, p.index))
+
+def render_batch(wad_path : str, poses : List[Pose], out_dir : str, out_format : str = 'png',
+        n_workers : Optional[int] = None, cache_dir : Optional[str] = None, chunk_size : int = 8,
+        width : int = RES_WIDTH, height : int = RES_HEIGHT) -> Iterator[FrameResult]:
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if cache_dir is None:
+            # Holds only the parsed maps, loading never builds a PVS. Pass a
+            # --cache-dir that main.py --build-pvs filled to render with one.
+            cache_dir = tmp_dir
+        # Build each map's cache once here instead of in every worker.
+        wad = WadFile(wad_path)
+        for map_name in sorted({p.map_name for p in poses}):
+            bsp_map.load_map_arrays(wad, wad.info_table, map_name, cache_dir)
+        if out_format == 'npy':
+            np.save(os.path.join(out_dir, 'palette.npy'),
+                np.array(read_playpal(wad, *wad.info_table['PLAYPAL'])[0], dtype=np.uint8)[:, :3])
+        wad.close()
+
+        # The pool queues every pose up front and results pile up until they
+        # are consumed. Memory stays bounded only because workers write frames
+        # to disk and send back small FrameResults.
+        with mp.get_context('spawn').Pool(n_workers, _init_worker, (wad_path, cache_dir, out_dir, out_format, width, height)) as pool:
+            yield from pool.imap_unordered(_render_pose, _group_by_map(poses), chunk_size)
+
+def summarize(results : List[FrameResult], wall_time : float, n_workers : int) -> Dict[str, float]:
+    render = np.array([r.render_time for r in results]) * 1000
+    return {
+        'frames': len(results),
+        'workers': n_workers,
+        'wall_s': wall_time,
+        'fps': len(results) / wall_time,
+        'fps_per_core': len(results) / wall_time / n_workers,
+        'map_loads': sum(r.loaded_map for r in results),
+        'load_s': sum(r.load_time for r in results),
+        'render_ms_mean': float(render.mean()),
+        'render_ms_p95': float(np.percentile(render, 95)),
+        'write_ms_mean': sum(r.write_time for r in results) / len(results) * 1000,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a list of poses to image files headlessly.')
+    parser.add_argument('wad')
+    parser.add_argument('poses', help='CSV file with map,x,y,angle[,height] per line')
+    parser.add_argument('out_dir')
+    parser.add_argument('--format', choices=('png', 'npy'), default='png', help='npy writes raw palette indices plus palette.npy')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--cache-dir', help='map cache to reuse, e.g. wads/cache once main.py --build-pvs filled it')
+    parser.add_argument('--width', type=int, default=RES_WIDTH)
+    parser.add_argument('--height', type=int, default=RES_HEIGHT)
+    args = parser.parse_args()
+
+    poses = read_poses(args.poses)
+    start = time.perf_counter()
+    results : List[FrameResult] = []
+    for result in render_batch(args.wad, poses, args.out_dir, args.format, args.workers, args.cache_dir, args.chunk_size, args.width, args.height):
+        results.append(result)
+        if len(results) % 100 == 0:
+            print('%d/%d frames' % (len(results), len(poses)))
+    if not results:
+        raise SystemExit('no poses in %s' % args.poses)
+    stats = summarize(results, time.perf_counter() - start, args.workers)
+
+    print('%d frames in %.2f s with %d workers' % (stats['frames'], stats['wall_s'], stats['workers']))
+    print('%.1f fps, %.1f fps per core' % (stats['fps'], stats['fps_per_core']))
+    print('%d map loads, %.2f s loading' % (stats['map_loads'], stats['load_s']))
+    print('render %.2f ms mean, %.2f ms p95, write %.2f ms mean' % (stats['render_ms_mean'], stats['render_ms_p95'], stats['write_ms_mean']))
@@ -0,0 +1,59 @@
+import random
+import argparse
+import time
+from typing import List, Tuple
+
+from bsp.wall_clip import ClipRanges
+from utils.defs import RES_WIDTH
+
+# (name, segs per frame, widest seg in columns, share of solid segs)
+SCENES = (
+    ('open', 64, 160, 0.8),
+    ('corridors', 256, 48, 0.5),
+    ('crowded', 1024, 24, 0.3),
+    ('very crowded', 4096, 12, 0.15),
+)
+
+Span = Tuple[int, int, bool]
+
+def make_frames(n_frames : int, n_segs : int, max_width : int, solid_share : float, seed : int) -> List[List[Span]]:
+    rnd = random.Random(seed)
+    frames : List[List[Span]] = []
+    for _ in range(n_frames):
+        spans : List[Span] = []
+        for _ in range(n_segs):
+            first = rnd.randrange(0, RES_WIDTH)
+            last = min(RES_WIDTH, first + rnd.randint(1, max_width))
+            spans.append((first, last, rnd.random() < solid_share))
+        frames.append(spans)
+    return frames
+
+def run_scene(frames : List[List[Span]]) -> Tuple[float, float, float]:
+    clip_ranges = ClipRanges(RES_WIDTH)
+    n_segs = 0
+    n_fragments = 0
+    max_ranges = 0
+    start = time.perf_counter()
+    for spans in frames:
+        clip_ranges.clear()
+        for first, last, solid in spans:
+            if solid:
+                n_fragments += len(clip_ranges.clip_solid_wall(first, last))
+            else:
+                n_fragments += len(clip_ranges.clip_window_wall(first, last))
+            max_ranges = max(max_ranges, len(clip_ranges))
+        n_segs += len(spans)
+    elapsed = time.perf_counter() - start
+    return elapsed / n_segs * 1e6, n_fragments / n_segs, max_ranges
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Microbenchmark the solid clip range list.')
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print('%-14s %8s %10s %12s %11s' % ('scene', 'segs', 'us/seg', 'frags/seg', 'max ranges'))
+    for name, n_segs, max_width, solid_share in SCENES:
+        frames = make_frames(args.frames, n_segs, max_width, solid_share, args.seed)
+        us_per_seg, frags_per_seg, max_ranges = run_scene(frames)
+        print('%-14s %8d %10.2f %12.2f %11d' % (name, n_segs, us_per_seg, frags_per_seg, max_ranges))
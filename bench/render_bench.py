@@ -0,0 +1,260 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import math
+import json
+import random
+import sys
+import argparse
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pygame
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bsp import collision
+from bsp import render_stats
+from bsp.strip_render import StripRenderer
+from bench.synth_wad import write_wad
+from utils.defs import RES_WIDTH, RES_HEIGHT
+from entities.player import PLAYER_HEIGHT, Player
+from entities.ticcmd import read_demo
+from entities.tic_loop import replay
+from wad.reader import WadFile, read_things
+
+FRAMES_PER_STOP = 24
+
+# Frame times may grow by this share over a baseline before they are reported as slower.
+TIME_TOLERANCE = 0.25
+# Work counted per frame and cache misses only change with the renderer
+# itself, the same on every machine, so they get little slack.
+COUNT_TOLERANCE = 0.02
+CACHE_COUNTERS = ('misses', 'evictions')
+
+Pose = Tuple[Vector2, float]
+
+def make_camera_path(wad : WadFile, map_name : str, n_frames : int, seed : int) -> List[Pose]:
+    # Turns in place at the player start, then at the centre of seeded random subsectors.
+    things = read_things(wad, *wad.info_table[map_name]['THINGS'])
+    start = [t for t in things if t.thing_type == 1][0]
+    stops : List[Pose] = [(Vector2(start.position), math.radians(start.angle))]
+
+    # Only centres a player fits at, an eye right on a wall sees past it.
+    centers : List[Vector2] = []
+    for subsector in bsp_map.ssectors:
+        points = [bsp_map.vertexes[bsp_map.segs[i].start_vert]
+            for i in range(subsector.start_seg, subsector.start_seg + subsector.n_segs)]
+        player = make_player((sum(points, Vector2()) / len(points), 0.0))
+        if collision.check_position(player.pos.x, player.pos.y, player.radius, player.head_height, player.foot_pos).ok:
+            centers.append(player.pos)
+
+    rnd = random.Random(seed)
+    n_stops = -(-n_frames // FRAMES_PER_STOP)
+    for center in rnd.choices(centers, k=n_stops - 1):
+        stops.append((center, rnd.uniform(0, 2 * math.pi)))
+
+    poses : List[Pose] = []
+    for i in range(n_frames):
+        pos, angle = stops[i // FRAMES_PER_STOP]
+        poses.append((pos, angle + (i % FRAMES_PER_STOP) * 2 * math.pi / FRAMES_PER_STOP))
+    return poses
+
+def demo_camera_path(wad : WadFile, map_name : str, demo_path : str) -> List[Pose]:
+    # One pose per tic of a recorded demo, so the workload is the same on every run.
+    demo_map, cmds = read_demo(demo_path)
+    if demo_map != map_name:
+        raise ValueError('%s was recorded on %s, not %s' % (demo_path, demo_map, map_name))
+    things = read_things(wad, *wad.info_table[map_name]['THINGS'])
+    start = [t for t in things if t.thing_type == 1][0]
+    player = make_player((Vector2(start.position), math.radians(start.angle)))
+    return [(Vector2(p.pos), p.angle) for p in replay(player, cmds)]
+
+def make_player(pose : Pose) -> Player:
+    pos, angle = pose
+    player = Player(Vector2(pos), angle, math.radians(90), PLAYER_HEIGHT)
+    player.update_foot_pos(bsp_map.sector_search(player.pos).floor_height)
+    return player
+
+def run_frames(poses : List[Pose], renderer : Union[StripRenderer, bsp_map.Renderer, None] = None) -> np.ndarray:
+    frame_times = np.zeros(len(poses))
+    for i, pose in enumerate(poses):
+        player = make_player(pose)
+        start = time.perf_counter()
+        if isinstance(renderer, StripRenderer):
+            renderer.render(player)
+        else:
+            bsp_map.render_player_view(player, renderer=renderer)
+        frame_times[i] = time.perf_counter() - start
+    return frame_times
+
+def run_stage_split(poses : List[Pose], renderer : Union[StripRenderer, bsp_map.Renderer]) -> Tuple[Dict[str, float], Dict[str, float]]:
+    # Timing every call inflates the frame time, so the split runs as a separate pass.
+    stats = render_stats.enable(history=len(poses))
+    try:
+        run_frames(poses, renderer)
+        total = stats.mean('frame_ms')
+        split = {stage: stats.mean(stage + '_ms') / total for stage in render_stats.STAGES}
+        counts = {name: stats.mean(name) for name in render_stats.COUNTERS}
+    finally:
+        render_stats.disable()
+
+    split['other'] = max(0.0, 1.0 - sum(split.values()))
+    return split, counts
+
+def run_benchmark(wad_path : str, map_name : str, n_frames : int, n_warmup : int, seed : int, cache_dir : str = None, n_workers : int = 0,
+        texture_budget : Optional[int] = None, demo_path : Optional[str] = None,
+        width : int = RES_WIDTH, height : int = RES_HEIGHT, column_budget : Optional[int] = None) -> Dict:
+    pygame.init()
+    pygame.display.set_mode((1, 1))
+    if texture_budget is not None:
+        bsp_map.texture_manager.set_budget(texture_budget)
+    if column_budget is not None:
+        bsp_map.column_cache.set_budget(column_budget)
+
+    # Cache counters are only comparable between runs from empty caches.
+    for cache in (bsp_map.texture_manager, bsp_map.column_cache):
+        cache.clear()
+        cache.reset_stats()
+
+    wad = WadFile(wad_path)
+    start = time.perf_counter()
+    bsp_map.init_bsp_map(wad, wad.info_table, map_name, cache_dir)
+    load_time = time.perf_counter() - start
+
+    if demo_path is not None:
+        poses = demo_camera_path(wad, map_name, demo_path)
+        n_frames = len(poses)
+    else:
+        poses = make_camera_path(wad, map_name, n_frames, seed)
+    if n_workers > 0:
+        with StripRenderer(wad_path, map_name, n_workers, cache_dir, width, height) as renderer:
+            run_frames(poses[:n_warmup], renderer)
+            frame_times = run_frames(poses, renderer) * 1000
+            cache_stats = bsp_map.texture_manager.stats(), bsp_map.column_cache.stats()
+            # Strips are drawn side by side, so only the counts add up to a frame.
+            _, counts = run_stage_split(poses, renderer)
+        split = {}
+    else:
+        renderer = bsp_map.Renderer(width, height)
+        run_frames(poses[:n_warmup], renderer)
+        # Column cache counts are of the timed pass alone, from empty, as a
+        # later pass over the same poses would find them all.
+        bsp_map.column_cache.clear()
+        bsp_map.column_cache.reset_stats()
+        frame_times = run_frames(poses, renderer) * 1000
+        cache_stats = bsp_map.texture_manager.stats(), bsp_map.column_cache.stats()
+        split, counts = run_stage_split(poses, renderer)
+    wad.close()
+
+    p50, p95, p99 = np.percentile(frame_times, (50, 95, 99))
+    return {
+        'wad': os.path.basename(wad_path),
+        'map': map_name,
+        'frames': n_frames,
+        'seed': seed,
+        'workers': n_workers,
+        'resolution': [width, height],
+        'load_s': load_time,
+        'fps': 1000 / frame_times.mean(),
+        'mean_ms': frame_times.mean(),
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'split': split,
+        'counts_per_frame': counts,
+        'texture_cache': cache_stats[0],
+        'column_cache': cache_stats[1],
+    }
+
+def compare_to_baseline(result : Dict, baseline : Dict, time_tolerance : float = TIME_TOLERANCE) -> Tuple[List[str], List[str]]:
+    # Against a run written with --json: regressions in the work done, which
+    # is deterministic, and frame times over the tolerance, which depend on
+    # the machine and its load.
+    for key in ('wad', 'map', 'frames', 'seed', 'workers', 'resolution'):
+        if result.get(key) != baseline.get(key):
+            raise ValueError('baseline has %s %s, this run %s' % (key, baseline.get(key), result.get(key)))
+    if result['column_cache']['budget_bytes'] != baseline['column_cache']['budget_bytes']:
+        raise ValueError('baseline has another column cache budget')
+
+    regressions = []
+    for name, count in baseline['counts_per_frame'].items():
+        if result['counts_per_frame'].get(name, 0.0) > count * (1 + COUNT_TOLERANCE):
+            regressions.append('%s %.1f per frame, baseline %.1f' % (name, result['counts_per_frame'][name], count))
+    for cache in ('texture_cache', 'column_cache'):
+        for name in CACHE_COUNTERS:
+            if result[cache][name] > baseline[cache][name] * (1 + COUNT_TOLERANCE):
+                regressions.append('%s %s %d, baseline %d' % (cache.replace('_', ' '), name, result[cache][name], baseline[cache][name]))
+
+    slower = []
+    for key in ('mean_ms', 'p95_ms'):
+        if result[key] > baseline[key] * (1 + time_tolerance):
+            slower.append('%s %.2f, baseline %.2f' % (key, result[key], baseline[key]))
+    return regressions, slower
+
+def print_result(result : Dict):
+    print('%s %s, %d frames at %dx%d, %d workers, loaded in %.3f s' % (result['wad'], result['map'], result['frames'],
+        *result['resolution'], result['workers'], result['load_s']))
+    print('%8s %8s %8s %8s %8s' % ('fps', 'mean ms', 'p50 ms', 'p95 ms', 'p99 ms'))
+    print('%8.1f %8.2f %8.2f %8.2f %8.2f' % (result['fps'], result['mean_ms'], result['p50_ms'], result['p95_ms'], result['p99_ms']))
+    if result['split']:
+        print(' '.join('%s %.0f%%' % (stage, share * 100) for stage, share in result['split'].items()))
+    if result['counts_per_frame']:
+        print(' '.join('%s %.1f' % (name, count) for name, count in result['counts_per_frame'].items()))
+    cache = result['texture_cache']
+    print('texture cache: %d hits, %d misses, %d evictions, %.1f of %.1f MB resident' % (cache['hits'], cache['misses'],
+        cache['evictions'], cache['resident_bytes'] / (1 << 20), cache['budget_bytes'] / (1 << 20)))
+    cache = result['column_cache']
+    if cache['budget_bytes']:
+        print('column cache: %.1f%% of %d lookups hit, %d evictions, %.1f of %.1f MB resident' % (cache['hit_rate'] * 100,
+            cache['hits'] + cache['misses'], cache['evictions'], cache['resident_bytes'] / (1 << 20), cache['budget_bytes'] / (1 << 20)))
+    else:
+        print('column cache: off')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render a scripted camera path headlessly and report frame times.')
+    parser.add_argument('--wad', help='WAD to load, a synthetic one is generated when omitted')
+    parser.add_argument('--map', default='E1M1')
+    parser.add_argument('--frames', type=int, default=240)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rows', type=int, default=4, help='rooms per column of the synthetic map')
+    parser.add_argument('--cols', type=int, default=4, help='rooms per row of the synthetic map')
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--workers', type=int, default=0, help='render column strips in this many processes')
+    parser.add_argument('--demo', help='render every tic of this demo instead of the scripted camera path')
+    parser.add_argument('--texture-budget', type=float, help='texture cache budget in MB')
+    parser.add_argument('--column-budget', type=float, help='scaled wall column cache budget in MB')
+    parser.add_argument('--width', type=int, default=RES_WIDTH, help='internal render width')
+    parser.add_argument('--height', type=int, default=RES_HEIGHT, help='internal render height')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--baseline', help='exit with an error when doing more work than the results in this file')
+    parser.add_argument('--tolerance', type=float, default=TIME_TOLERANCE, help='share frame times may grow over the baseline')
+    parser.add_argument('--gate-times', action='store_true',
+        help='also exit with an error on slower frame times, for baselines recorded on the same machine')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        wad_path = args.wad
+        if wad_path is None:
+            wad_path = os.path.join(tmp_dir, 'synth.wad')
+            write_wad(wad_path, args.rows, args.cols, args.seed)
+        result = run_benchmark(wad_path, args.map, args.frames, args.warmup, args.seed, args.cache_dir, args.workers,
+            None if args.texture_budget is None else int(args.texture_budget * (1 << 20)), args.demo,
+            args.width, args.height, None if args.column_budget is None else int(args.column_budget * (1 << 20)))
+
+    print_result(result)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions, slower = compare_to_baseline(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('regression: ' + regression)
+        for line in slower:
+            print('slower: ' + line)
+        if regressions or (args.gate_times and slower):
+            sys.exit(1)
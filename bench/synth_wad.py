@@ -0,0 +1,433 @@
+import math
+import random
+import struct
+import argparse
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+
+ROOM_SIZE = 512
+ROOM_GAP = 128
+CORRIDOR_WIDTH = 128
+PILLAR_SIZE = 128
+BLOCK_SIZE = 128
+
+class _Line(NamedTuple):
+    v0 : int
+    v1 : int
+    front_sector : int
+    back_sector : int
+    texture : str
+
+class _Seg(NamedTuple):
+    v0 : int
+    v1 : int
+    line : int
+    direction : int
+    offset : int
+
+class _SynthMap:
+    def __init__(self) -> None:
+        self.vertexes : List[Tuple[int, int]] = []
+        self.vertex_ids : Dict[Tuple[int, int], int] = {}
+        self.lines : List[_Line] = []
+        self.sectors : List[Tuple[int, int, str, str, int]] = []
+        self.things : List[Tuple[int, int, int, int]] = []
+
+    def vertex(self, x : int, y : int) -> int:
+        if (x, y) not in self.vertex_ids:
+            self.vertex_ids[(x, y)] = len(self.vertexes)
+            self.vertexes.append((x, y))
+        return self.vertex_ids[(x, y)]
+
+    def line(self, p0 : Tuple[int, int], p1 : Tuple[int, int], front : int, back : int = -1, texture : str = 'BRICK'):
+        self.lines.append(_Line(self.vertex(*p0), self.vertex(*p1), front, back, texture))
+
+    def polyline(self, points : List[Tuple[int, int]], front : int, texture : str = 'BRICK'):
+        for p0, p1 in zip(points, points[1:] + points[:1]):
+            self.line(p0, p1, front, texture=texture)
+
+def _room_wall(m : _SynthMap, p0 : Tuple[int, int], p1 : Tuple[int, int], sector : int, doors : List[Tuple[int, int]], texture : str):
+    # Walks from p0 to p1 splitting the wall at each (door_start, door_sector) opening.
+    dx = (p1[0] > p0[0]) - (p1[0] < p0[0])
+    dy = (p1[1] > p0[1]) - (p1[1] < p0[1])
+    cur = p0
+    for door_dist, door_sector in sorted(doors):
+        d0 = (p0[0] + dx * door_dist, p0[1] + dy * door_dist)
+        d1 = (d0[0] + dx * CORRIDOR_WIDTH, d0[1] + dy * CORRIDOR_WIDTH)
+        m.line(cur, d0, sector, texture=texture)
+        m.line(d0, d1, sector, door_sector, texture=texture)
+        cur = d1
+    m.line(cur, p1, sector, texture=texture)
+
+def build_map(rows : int, cols : int, seed : int = 0, pillars : bool = True) -> _SynthMap:
+    rnd = random.Random(seed)
+    m = _SynthMap()
+    step = ROOM_SIZE + ROOM_GAP
+    door_dist = (ROOM_SIZE - CORRIDOR_WIDTH) // 2
+    textures = ('BRICK', 'STONE', 'SHORT')
+
+    room_ids = {}
+    for r in range(rows):
+        for c in range(cols):
+            ceiling = rnd.choice((128, 160, 192, 256))
+            ceiling_tex = 'F_SKY1' if rnd.random() < 0.2 else 'CEIL1'
+            room_ids[(r, c)] = len(m.sectors)
+            m.sectors.append((rnd.choice((-16, 0, 16, 32)), ceiling, rnd.choice(('FLOOR1', 'FLOOR2')), ceiling_tex, rnd.choice((144, 176, 208, 255))))
+
+    h_corr, v_corr = {}, {}
+    for r in range(rows):
+        for c in range(cols):
+            if c + 1 < cols:
+                h_corr[(r, c)] = len(m.sectors)
+                m.sectors.append((8, 112, 'FLOOR2', 'CEIL1', 128))
+            if r + 1 < rows:
+                v_corr[(r, c)] = len(m.sectors)
+                m.sectors.append((8, 112, 'FLOOR2', 'CEIL1', 128))
+
+    for r in range(rows):
+        for c in range(cols):
+            s = room_ids[(r, c)]
+            x0, y0 = c * step, r * step
+            x1, y1 = x0 + ROOM_SIZE, y0 + ROOM_SIZE
+            tex = rnd.choice(textures)
+            # Clockwise: left, top, right, bottom walls.
+            _room_wall(m, (x0, y0), (x0, y1), s,
+                [(door_dist, h_corr[(r, c - 1)])] if c > 0 else [], tex)
+            _room_wall(m, (x0, y1), (x1, y1), s,
+                [(door_dist, v_corr[(r, c)])] if r + 1 < rows else [], tex)
+            _room_wall(m, (x1, y1), (x1, y0), s,
+                [(door_dist, h_corr[(r, c)])] if c + 1 < cols else [], tex)
+            _room_wall(m, (x1, y0), (x0, y0), s,
+                [(door_dist, v_corr[(r - 1, c)])] if r > 0 else [], tex)
+
+            if pillars and rnd.random() < 0.6:
+                px = x0 + rnd.choice((96, 288))
+                py = y0 + rnd.choice((96, 288))
+                # Counter-clockwise so that the room lies on the front side.
+                m.polyline([(px, py), (px + PILLAR_SIZE, py), (px + PILLAR_SIZE, py + PILLAR_SIZE), (px, py + PILLAR_SIZE)], s, 'STONE')
+
+            for _ in range(rnd.randint(1, 4)):
+                tx = x0 + rnd.choice((48, 240, 464))
+                ty = y0 + rnd.choice((48, 464))
+                m.things.append((tx, ty, rnd.choice((0, 90, 180, 270)), rnd.choice((3001, 2035))))
+
+    # Horizontal corridors between (r, c) and (r, c + 1).
+    for (r, c), s in h_corr.items():
+        x0 = c * step + ROOM_SIZE
+        x1 = x0 + ROOM_GAP
+        y0 = r * step + door_dist
+        y1 = y0 + CORRIDOR_WIDTH
+        m.line((x0, y1), (x1, y1), s, texture='SHORT')
+        m.line((x1, y0), (x0, y0), s, texture='SHORT')
+    for (r, c), s in v_corr.items():
+        y0 = r * step + ROOM_SIZE
+        y1 = y0 + ROOM_GAP
+        x0 = c * step + door_dist
+        x1 = x0 + CORRIDOR_WIDTH
+        m.line((x0, y0), (x0, y1), s, texture='SHORT')
+        m.line((x1, y1), (x1, y0), s, texture='SHORT')
+
+    m.things.insert(0, (ROOM_SIZE // 2 - 160, ROOM_SIZE // 2 + 16, 45, 1))
+    return m
+
+
+def _side(seg_v0 : Tuple[int, int], seg_v1 : Tuple[int, int], p : Tuple[float, float]) -> float:
+    dx = seg_v1[0] - seg_v0[0]
+    dy = seg_v1[1] - seg_v0[1]
+    return (p[0] - seg_v0[0]) * dy - (p[1] - seg_v0[1]) * dx
+
+class _BspBuilder:
+    def __init__(self, m : _SynthMap) -> None:
+        self.m = m
+        self.vertexes = list(m.vertexes)
+        self.out_segs : List[_Seg] = []
+        self.ssectors : List[Tuple[int, int]] = []
+        self.nodes : List[Tuple] = []
+
+    def _pt(self, v : int) -> Tuple[int, int]:
+        return self.vertexes[v]
+
+    def _is_convex(self, segs : List[_Seg]) -> bool:
+        for s in segs:
+            a, b = self._pt(s.v0), self._pt(s.v1)
+            for o in segs:
+                if _side(a, b, self._pt(o.v0)) < 0 or _side(a, b, self._pt(o.v1)) < 0:
+                    return False
+        return True
+
+    def _split(self, part : _Seg, segs : List[_Seg]) -> Tuple[List[_Seg], List[_Seg], int]:
+        a, b = self._pt(part.v0), self._pt(part.v1)
+        front : List[_Seg] = []
+        back : List[_Seg] = []
+        n_splits = 0
+        for s in segs:
+            p0, p1 = self._pt(s.v0), self._pt(s.v1)
+            s0, s1 = _side(a, b, p0), _side(a, b, p1)
+            if s0 == 0 and s1 == 0:
+                same_dir = (p1[0] - p0[0]) * (b[0] - a[0]) + (p1[1] - p0[1]) * (b[1] - a[1]) > 0
+                (front if same_dir else back).append(s)
+            elif s0 >= 0 and s1 >= 0:
+                front.append(s)
+            elif s0 <= 0 and s1 <= 0:
+                back.append(s)
+            else:
+                n_splits += 1
+                t = s0 / (s0 - s1)
+                ix = round(p0[0] + (p1[0] - p0[0]) * t)
+                iy = round(p0[1] + (p1[1] - p0[1]) * t)
+                key = (ix, iy)
+                if key not in self.m.vertex_ids:
+                    self.m.vertex_ids[key] = len(self.vertexes)
+                    self.vertexes.append(key)
+                mid = self.m.vertex_ids[key]
+                first_len = round(((ix - p0[0]) ** 2 + (iy - p0[1]) ** 2) ** 0.5)
+                h0 = _Seg(s.v0, mid, s.line, s.direction, s.offset)
+                h1 = _Seg(mid, s.v1, s.line, s.direction, s.offset + first_len)
+                (front if s0 > 0 else back).append(h0)
+                (front if s1 > 0 else back).append(h1)
+        return front, back, n_splits
+
+    def _bbox(self, segs : List[_Seg]) -> Tuple[int, int, int, int]:
+        xs = [self._pt(v)[0] for s in segs for v in (s.v0, s.v1)]
+        ys = [self._pt(v)[1] for s in segs for v in (s.v0, s.v1)]
+        return max(ys), min(ys), min(xs), max(xs)
+
+    def build(self, segs : List[_Seg]) -> int:
+        if self._is_convex(segs):
+            self.ssectors.append((len(segs), len(self.out_segs)))
+            self.out_segs += segs
+            return (len(self.ssectors) - 1) | 0x8000
+
+        best = None
+        for part in segs:
+            a, b = self._pt(part.v0), self._pt(part.v1)
+            n_front = n_back = n_splits = 0
+            for s in segs:
+                s0, s1 = _side(a, b, self._pt(s.v0)), _side(a, b, self._pt(s.v1))
+                if (s0 > 0 and s1 < 0) or (s0 < 0 and s1 > 0):
+                    n_splits += 1
+                elif s0 > 0 or s1 > 0:
+                    n_front += 1
+                elif s0 < 0 or s1 < 0:
+                    n_back += 1
+            if n_back == 0 and n_splits == 0:
+                continue
+            score = n_splits * 8 + abs(n_front - n_back)
+            if best is None or score < best[0]:
+                best = (score, part)
+        assert best is not None
+        part = best[1]
+        front, back, _ = self._split(part, segs)
+        right = self.build(front)
+        left = self.build(back)
+        a, b = self._pt(part.v0), self._pt(part.v1)
+        self.nodes.append((a[0], a[1], b[0] - a[0], b[1] - a[1],
+            *self._bbox(front), *self._bbox(back), right, left))
+        return len(self.nodes) - 1
+
+def _bam(p0 : Tuple[int, int], p1 : Tuple[int, int]) -> int:
+    a = math.atan2(p1[1] - p0[1], p1[0] - p0[0])
+    return int(round(a / (2 * math.pi) * 65536)) & 0xffff
+
+def _name(n : str) -> bytes:
+    return n.encode('ascii').ljust(8, b'\x00')
+
+def _blockmap(vertexes : List[Tuple[int, int]], lines : List[_Line], leading_zero : bool = True) -> bytes:
+    xs = [v[0] for v in vertexes]
+    ys = [v[1] for v in vertexes]
+    ox, oy = min(xs) - 8, min(ys) - 8
+    cols = (max(xs) - ox) // BLOCK_SIZE + 1
+    rows = (max(ys) - oy) // BLOCK_SIZE + 1
+    blocks : List[List[int]] = [[] for _ in range(cols * rows)]
+    for i, line in enumerate(lines):
+        x0, y0 = vertexes[line.v0]
+        x1, y1 = vertexes[line.v1]
+        bx0, bx1 = sorted(((x0 - ox) // BLOCK_SIZE, (x1 - ox) // BLOCK_SIZE))
+        by0, by1 = sorted(((y0 - oy) // BLOCK_SIZE, (y1 - oy) // BLOCK_SIZE))
+        for by in range(by0, by1 + 1):
+            for bx in range(bx0, bx1 + 1):
+                blocks[by * cols + bx].append(i)
+    header_words = 4 + cols * rows
+    offsets : List[int] = []
+    body : List[int] = []
+    for block in blocks:
+        offsets.append(header_words + len(body))
+        # Most node builders start every list with a 0, some leave it out.
+        body += [0] * leading_zero + block + [0xffff]
+    return struct.pack('<hhhh', ox, oy, cols, rows) + \
+        struct.pack('<%dH' % len(offsets), *offsets) + \
+        struct.pack('<%dH' % len(body), *body)
+
+def _patch(pixels : np.ndarray, mask : Optional[np.ndarray] = None) -> bytes:
+    width, height = pixels.shape
+    columns : List[bytes] = []
+    for x in range(width):
+        col = b''
+        y = 0
+        while y < height:
+            if mask is not None and not mask[x, y]:
+                y += 1
+                continue
+            start = y
+            while y < height and (mask is None or mask[x, y]) and y - start < 128:
+                y += 1
+            col += bytes((start, y - start, 0)) + bytes(pixels[x, start:y].tolist()) + b'\x00'
+        columns.append(col + b'\xff')
+    header = struct.pack('<HHhh', width, height, 0, 0)
+    offsets : List[int] = []
+    pos = len(header) + 4 * width
+    for col in columns:
+        offsets.append(pos)
+        pos += len(col)
+    return header + struct.pack('<%dI' % width, *offsets) + b''.join(columns)
+
+def _texture_lump(textures : List[Tuple[str, int, int, List[Tuple[int, int, int]]]]) -> bytes:
+    entries : List[bytes] = []
+    for name, width, height, patches in textures:
+        e = _name(name) + struct.pack('<ihhih', 0, width, height, 0, len(patches))
+        for ox, oy, p in patches:
+            e += struct.pack('<hhhhh', ox, oy, p, 1, 0)
+        entries.append(e)
+    offsets : List[int] = []
+    pos = 4 + 4 * len(entries)
+    for e in entries:
+        offsets.append(pos)
+        pos += len(e)
+    return struct.pack('<i', len(entries)) + struct.pack('<%di' % len(entries), *offsets) + b''.join(entries)
+
+def _palette_and_colormap() -> Tuple[bytes, bytes]:
+    # 16 hues x 16 brightness levels so that darkening is an index shift.
+    hues = [(255, 255, 255), (255, 64, 64), (64, 255, 64), (64, 64, 255),
+            (255, 255, 64), (255, 64, 255), (64, 255, 255), (255, 160, 64),
+            (160, 96, 48), (128, 128, 160), (96, 160, 96), (200, 160, 120),
+            (180, 40, 40), (40, 120, 40), (120, 120, 120), (224, 200, 160)]
+    palette = bytearray()
+    for hue in hues:
+        for level in range(16):
+            palette += bytes(int(c * (level + 1) / 16) for c in hue)
+    colormap = bytearray()
+    idx = np.arange(256)
+    for r in range(32):
+        level = (idx & 15) * (32 - r) // 32
+        colormap += ((idx & ~15) | level).astype(np.uint8).tobytes()
+    colormap += (15 - (idx & 15)).astype(np.uint8).tobytes()
+    colormap += bytes(256)
+    return bytes(palette) * 14, bytes(colormap)
+
+def build_wad(rows : int = 4, cols : int = 4, seed : int = 0, blockmap : bool = True, blockmap_zero : bool = True) -> bytes:
+    rnd = np.random.default_rng(seed)
+    m = build_map(rows, cols, seed)
+
+    segs : List[_Seg] = []
+    for i, line in enumerate(m.lines):
+        segs.append(_Seg(line.v0, line.v1, i, 0, 0))
+        if line.back_sector != -1:
+            segs.append(_Seg(line.v1, line.v0, i, 1, 0))
+    bsp = _BspBuilder(m)
+    bsp.build(segs)
+
+    sidedefs : List[Tuple[int, int, str, str, str, int]] = []
+    linedef_data = b''
+    for line in m.lines:
+        front = len(sidedefs)
+        if line.back_sector == -1:
+            sidedefs.append((0, 0, '-', '-', line.texture, line.front_sector))
+            linedef_data += struct.pack('<7h', line.v0, line.v1, 1, 0, 0, front, -1)
+        else:
+            sidedefs.append((0, 0, line.texture, line.texture, '-', line.front_sector))
+            sidedefs.append((0, 0, 'SHORT', 'SHORT', '-', line.back_sector))
+            linedef_data += struct.pack('<7h', line.v0, line.v1, 4, 0, 0, front, front + 1)
+
+    lumps : List[Tuple[str, bytes]] = [('E1M1', b'')]
+    lumps.append(('THINGS', b''.join(struct.pack('<5h', x, y, a, t, 7) for x, y, a, t in m.things)))
+    lumps.append(('LINEDEFS', linedef_data))
+    lumps.append(('SIDEDEFS', b''.join(struct.pack('<hh', xo, yo) + _name(u) + _name(l) + _name(mid) + struct.pack('<h', s)
+                                       for xo, yo, u, l, mid, s in sidedefs)))
+    lumps.append(('VERTEXES', b''.join(struct.pack('<hh', x, y) for x, y in bsp.vertexes)))
+    lumps.append(('SEGS', b''.join(struct.pack('<hhHhhh', s.v0, s.v1, _bam(bsp.vertexes[s.v0], bsp.vertexes[s.v1]), s.line, s.direction, s.offset)
+                                   for s in bsp.out_segs)))
+    lumps.append(('SSECTORS', b''.join(struct.pack('<HH', n, first) for n, first in bsp.ssectors)))
+    lumps.append(('NODES', b''.join(struct.pack('<12h2H', *n) for n in bsp.nodes)))
+    lumps.append(('SECTORS', b''.join(struct.pack('<hh', f, c) + _name(ft) + _name(ct) + struct.pack('<hhh', l, 0, 0)
+                                      for f, c, ft, ct, l in m.sectors)))
+    lumps.append(('REJECT', bytes((len(m.sectors) ** 2 + 7) // 8)))
+    if blockmap:
+        lumps.append(('BLOCKMAP', _blockmap(bsp.vertexes, m.lines, blockmap_zero)))
+
+    playpal, colormap = _palette_and_colormap()
+    lumps.append(('PLAYPAL', playpal))
+    lumps.append(('COLORMAP', colormap))
+
+    def brick(w : int, h : int, hue : int) -> np.ndarray:
+        x, y = np.meshgrid(np.arange(w), np.arange(h), indexing='ij')
+        mortar = ((y % 16) == 0) | (((x + (y // 16) * 16) % 32) == 0)
+        base = hue * 16 + 8 + rnd.integers(0, 5, (w, h))
+        return np.where(mortar, hue * 16 + 3, base).astype(np.uint8)
+
+    grate_mask = np.ones((64, 64), dtype=bool)
+    grate_mask[8:56:16, :] = False
+    grate_mask[:, 20:28] = False
+    patches = [('BRICKP', _patch(brick(64, 128, 8))),
+               ('STONE1', _patch(brick(64, 128, 9))),
+               ('STONE2', _patch(brick(64, 128, 14))),
+               ('SHORTP', _patch(brick(64, 64, 11))),
+               ('GRATEP', _patch(brick(64, 64, 13), grate_mask)),
+               ('SKYP', _patch(brick(256, 128, 3)))]
+    lumps.append(('PNAMES', struct.pack('<i', len(patches)) + b''.join(_name(n) for n, _ in patches)))
+    lumps.append(('TEXTURE1', _texture_lump([
+        ('BRICK', 64, 128, [(0, 0, 0)]),
+        ('STONE', 128, 128, [(0, 0, 1), (64, 0, 2), (32, 32, 4)]),
+        ('SHORT', 64, 64, [(0, 0, 3)]),
+    ])))
+    lumps.append(('TEXTURE2', _texture_lump([('SKY1', 256, 128, [(0, 0, 5)])])))
+
+    lumps.append(('P_START', b''))
+    lumps += patches
+    lumps.append(('P_END', b''))
+
+    def flat(hue : int) -> bytes:
+        x, y = np.meshgrid(np.arange(64), np.arange(64), indexing='ij')
+        check = ((x // 16 + y // 16) % 2) * 4
+        return (hue * 16 + 6 + check + rnd.integers(0, 3, (64, 64))).astype(np.uint8).T.tobytes()
+
+    lumps.append(('F_START', b''))
+    lumps += [('FLOOR1', flat(10)), ('FLOOR2', flat(12)), ('CEIL1', flat(15)), ('F_SKY1', flat(3))]
+    lumps.append(('F_END', b''))
+
+    x, y = np.meshgrid(np.arange(41), np.arange(56), indexing='ij')
+    imp_mask = ((x - 20) ** 2 / 400 + (y - 28) ** 2 / 784) <= 1
+    bar_mask = np.ones((23, 32), dtype=bool)
+    lumps.append(('S_START', b''))
+    lumps.append(('TROOA0', _sprite(np.full((41, 56), 12 * 16 + 10, dtype=np.uint8), imp_mask, 20, 52)))
+    lumps.append(('BAR1A0', _sprite(np.full((23, 32), 13 * 16 + 9, dtype=np.uint8), bar_mask, 11, 30)))
+    lumps.append(('S_END', b''))
+
+    directory = b''
+    data = b''
+    pos = 12
+    for name, lump in lumps:
+        directory += struct.pack('<ii', pos, len(lump)) + _name(name)
+        data += lump
+        pos += len(lump)
+    return b'IWAD' + struct.pack('<ii', len(lumps), pos) + data + directory
+
+def _sprite(pixels : np.ndarray, mask : np.ndarray, left : int, top : int) -> bytes:
+    lump = bytearray(_patch(pixels, mask))
+    struct.pack_into('<hh', lump, 4, left, top)
+    return bytes(lump)
+
+def write_wad(path : str, rows : int = 4, cols : int = 4, seed : int = 0, blockmap : bool = True, blockmap_zero : bool = True):
+    with open(path, 'wb') as f:
+        f.write(build_wad(rows, cols, seed, blockmap, blockmap_zero))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a small synthetic IWAD with a single map E1M1.')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=4)
+    parser.add_argument('--cols', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-blockmap', action='store_true')
+    args = parser.parse_args()
+    write_wad(args.path, args.rows, args.cols, args.seed, not args.no_blockmap)
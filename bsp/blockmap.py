@@ -0,0 +1,71 @@
+from typing import Dict, List, Set
+
+import numpy as np
+
+from wad.d_types import Blockmap
+
+BLOCK_SIZE = 128
+
+def line_touches_box(x0 : float, y0 : float, x1 : float, y1 : float,
+        left : float, bottom : float, right : float, top : float) -> bool:
+    # Like P_BoxOnLineSide: overlapping bounds and box corners on both sides of the line.
+    if max(x0, x1) < left or min(x0, x1) > right or max(y0, y1) < bottom or min(y0, y1) > top:
+        return False
+    dx, dy = x1 - x0, y1 - y0
+    front = back = False
+    for cx, cy in ((left, bottom), (left, top), (right, bottom), (right, top)):
+        side = (cx - x0) * dy - (cy - y0) * dx
+        if side >= 0:
+            front = True
+        if side <= 0:
+            back = True
+    return front and back
+
+def build_blockmap(vertexes : np.ndarray, linedefs : np.ndarray) -> Blockmap:
+    # For maps without a BLOCKMAP lump, laid out like the node builders do it.
+    vx, vy = vertexes['x'].astype(np.int64), vertexes['y'].astype(np.int64)
+    origin_x, origin_y = int(vx.min()) - 8, int(vy.min()) - 8
+    columns = (int(vx.max()) - origin_x) // BLOCK_SIZE + 1
+    rows = (int(vy.max()) - origin_y) // BLOCK_SIZE + 1
+
+    blocks : List[int] = []
+    lines : List[int] = []
+    starts, ends = linedefs['start_vert'].tolist(), linedefs['end_vert'].tolist()
+    for i, (v0, v1) in enumerate(zip(starts, ends)):
+        x0, y0 = int(vx[v0]) - origin_x, int(vy[v0]) - origin_y
+        x1, y1 = int(vx[v1]) - origin_x, int(vy[v1]) - origin_y
+        for row in range(min(y0, y1) // BLOCK_SIZE, max(y0, y1) // BLOCK_SIZE + 1):
+            for column in range(min(x0, x1) // BLOCK_SIZE, max(x0, x1) // BLOCK_SIZE + 1):
+                left, bottom = column * BLOCK_SIZE, row * BLOCK_SIZE
+                if line_touches_box(x0, y0, x1, y1, left, bottom, left + BLOCK_SIZE - 1, bottom + BLOCK_SIZE - 1):
+                    blocks.append(row * columns + column)
+                    lines.append(i)
+
+    block_arr = np.array(blocks, dtype=np.int64)
+    line_arr = np.array(lines, dtype=np.int32)
+    order = np.lexsort((line_arr, block_arr))
+    offsets = np.searchsorted(block_arr[order], np.arange(columns * rows + 1)).astype(np.int32)
+    return Blockmap(origin_x, origin_y, columns, rows, offsets, line_arr[order])
+
+def blockmap_to_arrays(blockmap : Blockmap) -> Dict[str, np.ndarray]:
+    header = np.array([blockmap.origin_x, blockmap.origin_y, blockmap.columns, blockmap.rows], dtype=np.int32)
+    return {'blockmap_header': header, 'blockmap_offsets': blockmap.offsets, 'blockmap_lines': blockmap.lines}
+
+def blockmap_from_arrays(arrays : Dict[str, np.ndarray]) -> Blockmap:
+    origin_x, origin_y, columns, rows = arrays['blockmap_header'].tolist()
+    return Blockmap(origin_x, origin_y, columns, rows, arrays['blockmap_offsets'], arrays['blockmap_lines'])
+
+def lines_in_box(blockmap : Blockmap, left : float, bottom : float, right : float, top : float) -> Set[int]:
+    # Lines listed in any block the box overlaps, blocks off the map hold nothing.
+    first_column = max(int((left - blockmap.origin_x) // BLOCK_SIZE), 0)
+    last_column = min(int((right - blockmap.origin_x) // BLOCK_SIZE), blockmap.columns - 1)
+    first_row = max(int((bottom - blockmap.origin_y) // BLOCK_SIZE), 0)
+    last_row = min(int((top - blockmap.origin_y) // BLOCK_SIZE), blockmap.rows - 1)
+
+    found : Set[int] = set()
+    offsets, lines = blockmap.offsets, blockmap.lines
+    for row in range(first_row, last_row + 1):
+        b = row * blockmap.columns
+        for column in range(first_column, last_column + 1):
+            found.update(lines[offsets[b + column]:offsets[b + column + 1]].tolist())
+    return found
@@ -1,21 +1,36 @@
 import math
-from typing import Dict, List, NamedTuple, Optional, Tuple
-
-from pygame import Vector2, Surface, transform, Rect
-
-from wad.d_types import ColorPalette, LineDef, SideDef, Seg, SubSector, \
-    Node, Sector, WadTexture
-
-from wad.reader import read_patch, \
-    read_patch_names, read_playpal, read_textures
-from wad.reader import read_linedefs, read_vertexes, \
-    read_sidedefs, read_segs, read_ssectors, read_nodes, \
-    read_sectors
-
-from bsp.wall_clip import ScreenCoords, clear_clip_range, clip_solid_wall, clip_window_wall
-
-from utils.pic_utils import patch_to_surface
-from utils.math_utils import line_intersection
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pygame import Vector2, Rect
+
+from wad.d_types import LineDef, SideDef, Seg, SubSector, \
+    Node, Sector, Blockmap, Thing
+
+from wad.reader import WadFile, read_blockmap, read_reject, read_flat, read_colormap
+from wad.reader import read_linedefs_array, read_vertexes_array, \
+    read_sidedefs_array, read_segs_array, read_ssectors_array, \
+    read_nodes_array, read_sectors_array, read_things_array
+from wad.reader import linedefs_from_array, vertexes_from_array, \
+    sidedefs_from_array, segs_from_array, ssectors_from_array, \
+    nodes_from_array, sectors_from_array, things_from_array
+
+from bsp import map_cache
+from bsp import point_location
+from bsp import sprites
+from bsp.lighting import MAXLIGHTSCALE, build_light_tables, identity_colormaps, light_index
+from bsp.blockmap import build_blockmap, blockmap_from_arrays, blockmap_to_arrays
+from bsp.geometry import MapGeometry, build_map_geometry
+from bsp.point_location import SUBSECTOR_FLAG, LocatorTables
+from bsp.pvs import build_pvs
+from bsp.map_cache import IndexedTexture
+from bsp.texture_manager import TextureManager
+from bsp.column_cache import ColumnCache
+from bsp.sprites import DrawSeg, SpriteFrame, VisSprite
+from bsp.projection import FINEMASK, FINE_ANG90, FRACBITS, FRACUNIT, \
+    ScreenCoords, SegProjection, angle_to_fine, build_projection_tables
+from bsp.visplanes import FLAT_SIZE, Visplane, Visplanes, build_plane_tables, draw_planes
+from bsp.wall_clip import ClipRanges
 
 from entities.player import Player
 from utils.defs import RES_WIDTH, RES_HEIGHT
@@ -23,14 +38,12 @@ from utils.defs import RES_WIDTH, RES_HEIGHT
 WALL_HEIGHT_SCALE = 1.0
 
 FOV : float = math.radians(90)
-TAN_HALF_FOV = math.tan(FOV / 2)
 
-VIEW_POS = Vector2(0,0)
-VIEW_DIR = Vector2(1,0)
-VIEW_LEFT_FRUST = VIEW_DIR.rotate_rad(-FOV / 2)
-VIEW_RIGHT_FRUST = VIEW_DIR.rotate_rad(FOV / 2)
-VIEW_LEFT_FRUST_NORM = Vector2(-VIEW_LEFT_FRUST.y, VIEW_LEFT_FRUST.x)
-VIEW_RIGHT_FRUST_NORM = Vector2(VIEW_RIGHT_FRUST.y, -VIEW_RIGHT_FRUST.x)
+# White in the DOOM palette, shows through where no floors or ceilings are drawn.
+CLEAR_COLOR = 4
+
+# Light levels to palette index remaps of the loaded WAD.
+colormaps = identity_colormaps()
 
 
 linedefs : List[LineDef]   = []
@@ -41,141 +54,169 @@ ssectors : List[SubSector] = []
 nodes    : List[Node]      = []
 sectors  : List[Sector]    = []
 
-wall_textures : Dict[str, Surface] = {}
-
-top_bound : List[int] = [0] * RES_WIDTH
-bottom_bound : List[int] = [RES_HEIGHT] * RES_WIDTH
-
-def _clear_floor_ceiling_bounds():
-    global top_bound, bottom_bound
-    top_bound = [0] * RES_WIDTH
-    bottom_bound = [RES_HEIGHT] * RES_WIDTH
-
-def _classify_point_to_view(pos : Vector2, dir : Vector2, left_norm : Vector2, right_norm : Vector2, p : Vector2) -> int:
-    a = int((pos - p).dot(left_norm) < 0)
-    b = int((pos - p).dot(right_norm) < 0) << 1
-    c = int((pos - p).dot(dir) < 0) << 2
-    return a | b | c
-
-def _classify_edge_to_view(pos : Vector2, dir : Vector2, left_norm : Vector2, right_norm : Vector2, p0 : Vector2, p1 : Vector2) -> Tuple[int, int]:
-    c0 = _classify_point_to_view(pos, dir, left_norm, right_norm, p0)
-    c1 = _classify_point_to_view(pos, dir, left_norm, right_norm, p1)
-    return c0, c1
-
-def _test_edge_classification(pos : Vector2, dir : Vector2, p0 : Vector2, p1 : Vector2, c0 : int, c1 : int) -> bool:
-    if c0 == 7 or c1 == 7:
+geometry : Optional[MapGeometry] = None
+locator : Optional[LocatorTables] = None
+blockmap : Optional[Blockmap] = None
+reject : Optional[np.ndarray] = None
+_last_subsector = -1
+
+# Subsectors visible from each subsector and contained in each node's subtree,
+# as int bitsets. Without a PVS every subsector sees all of them.
+pvs_rows : List[int] = []
+subtree_subsectors : List[int] = []
+
+# Textures, flats and sprites are loaded on first sight and kept within its budget.
+# Both caches are shared by every renderer of the map.
+texture_manager = TextureManager()
+column_cache = ColumnCache()
+
+# Drawn things bucketed by the subsector they stand in.
+subsector_things : List[List[Thing]] = []
+sprite_frames : Dict[str, SpriteFrame] = {}
+
+class Renderer:
+    # A view of the loaded map at its own internal resolution, with every
+    # table and buffer sized from it and the state of the frame being drawn.
+    def __init__(self, width : int = RES_WIDTH, height : int = RES_HEIGHT, frame_buffer : Optional[np.ndarray] = None) -> None:
+        self.set_resolution(width, height, frame_buffer)
+
+    def set_resolution(self, width : int, height : int, frame_buffer : Optional[np.ndarray] = None):
+        # frame_buffer, when given, is drawn into instead of a buffer of our own.
+        self.screen_width, self.screen_height = width, height
+        self.projection = build_projection_tables(width, FOV)
+        self.plane_tables = build_plane_tables(width, height, WALL_HEIGHT_SCALE * height, FOV)
+        self.light_tables = build_light_tables(colormaps, width, FOV)
+        if frame_buffer is None:
+            frame_buffer = np.full((width, height), CLEAR_COLOR, dtype=np.uint8)
+        self.frame_buffer = frame_buffer
+        self.clip_ranges = ClipRanges(width)
+        self.visplanes = Visplanes(width)
+        self.top_bound = [0] * width
+        self.bottom_bound = [height] * width
+        # Walls drawn this frame, for clipping sprites against.
+        self.draw_segs : List[DrawSeg] = []
+
+    def begin_frame(self, first_col : int, last_col : int):
+        if self.light_tables.colormaps is not colormaps:
+            self.light_tables = build_light_tables(colormaps, self.screen_width, FOV)
+        column_cache.set_screen_height(self.screen_height)
+        self.clip_ranges.clear(first_col, last_col)
+        self.top_bound[:] = [0] * self.screen_width
+        self.bottom_bound[:] = [self.screen_height] * self.screen_width
+        self.visplanes.clear()
+        self.draw_segs.clear()
+        self.frame_buffer[first_col:last_col].fill(CLEAR_COLOR)
+
+# Used by render_player_view when it is not given a renderer.
+default_renderer = Renderer()
+# The renderer of the frame being drawn.
+_view = default_renderer
+
+def _wrap_angle(a : float) -> float:
+    return (a + math.pi) % (2 * math.pi) - math.pi
+
+def _view_angle_to_col(a : float) -> int:
+    return _view.projection.view_angle_to_x[angle_to_fine(a) + FINE_ANG90]
+
+def _check_bbox(pos : Vector2, angle : float, bbox : Rect) -> bool:
+    # Like R_CheckBBox: the box must fall inside the view angle and its
+    # column span must not already be covered by solid walls.
+    if bbox.left <= pos.x <= bbox.right and bbox.top <= pos.y <= bbox.bottom:
         return True
-    x_or = c0 ^ c1
-    if x_or == 0:
-        return False
-    if x_or == 3 and c0 & 0b100:
-        return True
-    if x_or == 7:
-        p = line_intersection(p0, p1, pos, pos + dir)
-        dist = (p - pos).dot(dir)
-        if dist > 0:
-            return True
-    return False
 
-
-def _test_edge_to_view(pos : Vector2, dir : Vector2, left_norm : Vector2, right_norm : Vector2, p0 : Vector2, p1 : Vector2) -> bool:
-    return _test_edge_classification(pos, dir, p0, p1, *_classify_edge_to_view(pos, dir, left_norm, right_norm, p0, p1))
-
-def _boundingbox_intersects_view(pos : Vector2, dir : Vector2, left_norm : Vector2, right_norm : Vector2, bbox : Rect):
-    if bbox.collidepoint(pos.x, pos.y):
-        return True
-    if _test_edge_to_view(pos, dir, left_norm, right_norm, Vector2(bbox.topleft), Vector2(bbox.topright)):
-        return True
-    if _test_edge_to_view(pos, dir, left_norm, right_norm, Vector2(bbox.topleft), Vector2(bbox.bottomleft)):
-        return True
-    if _test_edge_to_view(pos, dir, left_norm, right_norm, Vector2(bbox.bottomleft), Vector2(bbox.bottomright)):
-        return True
-    if _test_edge_to_view(pos, dir, left_norm, right_norm, Vector2(bbox.topright), Vector2(bbox.bottomright)):
-        return True
+    center_angle = math.atan2(bbox.centery - pos.y, bbox.centerx - pos.x)
+    rel_angles = [
+        _wrap_angle(math.atan2(y - pos.y, x - pos.x) - center_angle)
+        for x, y in (bbox.topleft, bbox.topright, bbox.bottomleft, bbox.bottomright)
+    ]
+    view_center = _wrap_angle(center_angle - angle)
+    left = view_center + max(rel_angles)
+    right = view_center + min(rel_angles)
+
+    clip_angle = _view.projection.clip_angle
+    for wrap in (0.0, 2 * math.pi, -2 * math.pi):
+        if right + wrap <= clip_angle and left + wrap >= -clip_angle:
+            # Widened by a column each side to absorb the table's angle quantisation.
+            first_col = _view_angle_to_col(min(left + wrap, clip_angle)) - 1
+            last_col = _view_angle_to_col(max(right + wrap, -clip_angle)) + 1
+            return not _view.clip_ranges.is_range_covered(first_col, last_col)
     return False
 
-def _on_right_side(pos : Vector2, node : Node) -> bool:
-    normal = node.part_line_dir.rotate_rad(math.pi / 2).normalize()
-    dist_to_line = (pos - node.part_line_start).dot(normal)
+def _on_right_side(pos : Vector2, node_index : int) -> bool:
+    dist_to_line = (pos.x - geometry.node_x[node_index]) * geometry.node_normal_x[node_index] + \
+                   (pos.y - geometry.node_y[node_index]) * geometry.node_normal_y[node_index]
     if dist_to_line > 0:
         return False
     return True
 
-def _clip_to_view(v0 : Vector2, v1 : Vector2, pos : Vector2, dir : Vector2, frust_left : Vector2, frust_right : Vector2, c0 : int, c1 : int) -> Tuple[Vector2, Vector2]:
-    vs = Vector2(v0), Vector2(v1)
-    cs = c0, c1
-    if c0 == 7 or c1 == 7:
-        in_p = 1 if c1 == 7 else 0
-        if cs[in_p ^ 1] & 0b010:
-            vs[in_p ^ 1].update(line_intersection(pos, pos + frust_left, *vs))
-        elif cs[in_p ^ 1] & 0b001:
-            vs[in_p ^ 1].update(line_intersection(pos, pos + frust_right, *vs))
-        else:
-            pl = line_intersection(pos, pos + frust_left, *vs)
-            if (pos - pl).dot(dir) < 0:
-                vs[in_p ^ 1].update(pl)
-            else:
-                vs[in_p ^ 1].update(line_intersection(pos, pos + frust_right, *vs))
-    else:
-        vs[0].update(line_intersection(pos, pos + frust_right, *vs))
-        vs[1].update(line_intersection(pos, pos + frust_left, *vs))
-    return vs
-
-def _is_backface(p : Vector2, angle : float, pos : Vector2) -> bool:
-    angle = angle + math.pi / 2
-    seg_normal = Vector2(math.cos(angle), math.sin(angle))
-    dist_vec = p - pos
-    if dist_vec.length_squared() < 0.01:
+def _is_backface(p : Vector2, seg_index : int, pos : Vector2) -> bool:
+    dist_x = p.x - pos.x
+    dist_y = p.y - pos.y
+    if dist_x * dist_x + dist_y * dist_y < 0.01:
         return True
-    return (dist_vec.normalize()).dot(seg_normal) < 0
+    return dist_x * geometry.seg_normal_x[seg_index] + dist_y * geometry.seg_normal_y[seg_index] < 0
+
+
+def _mip_level(texel_scale : float, light_pos : float, n_levels : int) -> int:
+    # Texels per screen row are 1 / (vfov * one_over_z), each level halving them.
+    if light_pos <= 0:
+        return n_levels - 1
+    return min(max(int(texel_scale / light_pos).bit_length() - 1, 0), n_levels - 1)
 
 
-ScreenColumn = Tuple[Tuple[int, int], Surface]
 SOLID_WALL = 0
 UPPER_WALL = 1
 LOWER_WALL = 2
 MIDDLE_WALL = 3
 
-def _screen_coord_to_screen_cols(sc:ScreenCoords, tex_name:str, sidedef_x:int, sidedef_y:int, wall_type:int) -> List[ScreenColumn]:
-    global top_bound, bottom_bound
-
-    texture = wall_textures.get(tex_name, None)
-    render_list : List[ScreenColumn] = []
-
-    y_top = sc.h_top_start
-    y_bottom = sc.h_bottom_start
-    u = sc.u_left
-    one_over_z = sc.one_over_z0
-
-    for i in range(sc.first_col, sc.last_col):
-        top = max(int(y_top), top_bound[i])
-        bottom = min(int(y_bottom), bottom_bound[i])
-        col_height = int(y_bottom - y_top)
-
-        if texture is not None and y_top < RES_HEIGHT and y_bottom >= 0 and col_height != 0 and bottom > top:
-            y_offset = int(((top - int(y_top)) / col_height) * sc.wall_height)
-            off_screen = int(((int(y_bottom) - bottom) / col_height) * sc.wall_height)
-            tex_x = sidedef_x + int(u / one_over_z)
-
-            if (texture.get_height() - sidedef_y) >= sc.wall_height:
-                ss = texture.subsurface((tex_x % texture.get_width(), y_offset + sidedef_y, 1, sc.wall_height - (y_offset + off_screen)))
-                ss = transform.scale(ss, (1, bottom - top))
-                render_list.append(((i, top), ss))
-            else:
-                surf = Surface((1, sc.wall_height - (y_offset + off_screen))).convert_alpha()
-                rect = (tex_x % texture.get_width(), (sidedef_y + y_offset), 1, texture.get_height() - (sidedef_y + y_offset))
-                surf.blit(texture, (0,0), rect)
-                y = (texture.get_height() - (sidedef_y + y_offset))
-                pix_left = sc.wall_height - (texture.get_height() - (sidedef_y + y_offset))
-                while pix_left > texture.get_height():
-                    rect = (tex_x % texture.get_width(), 0, 1, texture.get_height())
-                    surf.blit(texture, (0,y), rect)
-                    y += texture.get_height()
-                    pix_left -= texture.get_height()
-                rect = (tex_x % texture.get_width(), 0, 1, pix_left - off_screen)
-                surf.blit(texture, (0,y), rect)
-                surf = transform.scale(surf, (1, bottom - top))
-                render_list.append(((i, top), surf))
+def _draw_wall_columns(sc:ScreenCoords, first_col:int, last_col:int, tex_name:str, sidedef_x:int, sidedef_y:int, wall_type:int,
+        light:int, ceiling_plane:Optional[Visplane]=None, floor_plane:Optional[Visplane]=None):
+    projection, light_tables, frame_buffer = _view.projection, _view.light_tables, _view.frame_buffer
+    top_bound, bottom_bound = _view.top_bound, _view.bottom_bound
+
+    mips = texture_manager.mips(tex_name)
+    if mips is not None:
+        tex_w = mips[0].shape[0]
+        x_to_view_angle = projection.x_to_view_angle
+        fine_tangent = projection.fine_tangent
+        tex_offset = sidedef_x + sc.tex_offset
+        # Like walllights: the colormap follows the column's scale.
+        wall_lights = light_tables.scale_light[light]
+        light_scale = sc.one_over_z_step * light_tables.scale_factor
+
+    first_diff = first_col - sc.first_col
+    y_top = sc.y_top_start + first_diff * sc.y_top_step
+    y_bottom = sc.y_bottom_start + first_diff * sc.y_bottom_step
+    light_pos = (sc.one_over_z0 + first_diff * sc.one_over_z_step) * light_tables.scale_factor
+
+    if mips is not None:
+        # The scale is linear across the wall, so the level only has to be
+        # followed column by column when it differs between the two ends.
+        texel_scale = light_tables.scale_factor / (WALL_HEIGHT_SCALE * _view.screen_height)
+        level = _mip_level(texel_scale, light_pos, len(mips))
+        varying_level = level != _mip_level(texel_scale, light_pos + (last_col - 1 - first_col) * light_scale, len(mips))
+
+    for i in range(first_col, last_col):
+        top = max(y_top >> FRACBITS, top_bound[i])
+        bottom = min(y_bottom >> FRACBITS, bottom_bound[i])
+
+        # Like markceiling/markfloor: the rows between the open bounds and the wall's edges.
+        if ceiling_plane is not None:
+            ceiling_plane.top[i] = top_bound[i]
+            ceiling_plane.bottom[i] = min(y_top >> FRACBITS, bottom_bound[i])
+        if floor_plane is not None:
+            floor_plane.top[i] = max(y_bottom >> FRACBITS, top_bound[i])
+            floor_plane.bottom[i] = bottom_bound[i]
+
+        if mips is not None and bottom > top and y_bottom > y_top:
+            tex_x = int(tex_offset - fine_tangent[(sc.center_angle + x_to_view_angle[i]) & FINEMASK] * sc.tex_distance) % tex_w
+            if varying_level:
+                level = _mip_level(texel_scale, light_pos, len(mips))
+            y0 = y_top >> FRACBITS
+            column = column_cache.column(mips, tex_name, tex_x, level, sidedef_y, sc.wall_height,
+                y_top, y_bottom, top - y0, bottom - y0)
+            colormap = wall_lights[min(int(light_pos), MAXLIGHTSCALE - 1)]
+            frame_buffer[i, top:bottom] = colormap.take(column)
         if wall_type == SOLID_WALL:
             top_bound[i] = top
             bottom_bound[i] = bottom
@@ -184,101 +225,116 @@ def _screen_coord_to_screen_cols(sc:ScreenCoords, tex_name:str, sidedef_x:int, s
         elif wall_type == LOWER_WALL:
             bottom_bound[i] = min(top, bottom)
 
-        y_top += sc.y_step_top
-        y_bottom += sc.y_step_bottom
-        u += sc.u_step
-        one_over_z += sc.one_over_z_step
-    return render_list
+        y_top += sc.y_top_step
+        y_bottom += sc.y_bottom_step
+        if mips is not None:
+            light_pos += light_scale
 
-def _seg_to_screen_coord(seg:Seg, linedef:LineDef, ceiling_h:int, floor_h:int, pos:Vector2, angle:float, eye_pos:int) -> Optional[ScreenCoords]:
+def _project_seg(seg_index:int, pos:Vector2, angle:float) -> Optional[SegProjection]:
+    seg = segs[seg_index]
     v0 = vertexes[seg.start_vert]
-    v1 = vertexes[seg.end_vert]
 
-    if _is_backface(v0, seg.angle, pos):
+    if _is_backface(v0, seg_index, pos):
         return None
 
-    linedef_len = (vertexes[linedef.end_vert] - vertexes[linedef.start_vert]).length()
-    v0 = (v0 - pos).rotate_rad(-angle)
-    v1 = (v1 - pos).rotate_rad(-angle)
-
-    c0, c1 = _classify_edge_to_view(VIEW_POS, VIEW_DIR,
-        VIEW_LEFT_FRUST_NORM, VIEW_RIGHT_FRUST_NORM, v0, v1)
-    seg_in_view = _test_edge_classification(VIEW_POS, VIEW_DIR,
-        v0, v1, c0, c1)
-
-    if seg_in_view:
-        u_left, u_right = 0.0, linedef_len
-        if not (c0 == 7 and c1 == 7):
-            tmp_v0, tmp_v1 = v0, v1
-            v0, v1 = _clip_to_view(v0, v1, VIEW_POS, VIEW_DIR,
-                VIEW_LEFT_FRUST, VIEW_RIGHT_FRUST, c0, c1)
-            u_left = (tmp_v0 - v0).length()
-            u_right = linedef_len - (tmp_v1 - v1).length()
-
-        x_scale0 = v0.y / (TAN_HALF_FOV * -v0.x)
-        x_scale1 = v1.y / (TAN_HALF_FOV * -v1.x)
-
-        x_scale0, x_scale1 = min(x_scale0, x_scale1), max(x_scale0, x_scale1)
-        first_col = int((max(-1.0, min(x_scale0, 1.0)) + 1.0) * (RES_WIDTH / 2))
-        last_col = int((max(-1.0, min(x_scale1, 1.0)) + 1.0) * (RES_WIDTH / 2))
+    # Like R_AddLine: clip the seg's view angles to the field of view.
+    v1 = vertexes[seg.end_vert]
+    angle0 = _wrap_angle(math.atan2(v0.y - pos.y, v0.x - pos.x) - angle)
+    angle1 = _wrap_angle(math.atan2(v1.y - pos.y, v1.x - pos.x) - angle)
+    span = (angle0 - angle1) % (2 * math.pi)
+    if span >= math.pi:
+        return None
 
-        if last_col == first_col:
+    clip_angle = _view.projection.clip_angle
+    tspan = (angle0 + clip_angle) % (2 * math.pi)
+    if tspan > 2 * clip_angle:
+        if tspan - 2 * clip_angle >= span:
             return None
+        angle0 = clip_angle
+    tspan = (clip_angle - angle1) % (2 * math.pi)
+    if tspan > 2 * clip_angle:
+        if tspan - 2 * clip_angle >= span:
+            return None
+        angle1 = -clip_angle
 
-        if x_scale0 > x_scale1:
-            v0, v1 = v1, v0
-
-        vfov = WALL_HEIGHT_SCALE * RES_HEIGHT
-        y_scale0 = vfov / v0.x
-        y_scale1 = vfov / v1.x
-
-        half_height = RES_HEIGHT / 2
-        h_top_start = int(half_height - y_scale0 * (ceiling_h - eye_pos))
-        h_bottom_start = int(half_height - y_scale0 * (floor_h - eye_pos))
-        h_top_end = int(half_height - y_scale1 * (ceiling_h - eye_pos))
-        h_bottom_end = int(half_height - y_scale1 * (floor_h - eye_pos))
-
-        u_left += (vertexes[linedef.start_vert] - vertexes[seg.start_vert]).length()
-        u_right -= (vertexes[linedef.end_vert] - vertexes[seg.end_vert]).length()
-
-        n_columns = last_col - first_col
-
-        y_step_top = (h_top_end - h_top_start) / n_columns
-        y_step_bottom = (h_bottom_end - h_bottom_start) / n_columns
-
-        one_over_z0 = 1 / v0.x
-        one_over_z1 = 1 / v1.x
-        one_over_z_step = (one_over_z1 - one_over_z0) / n_columns
-        u_left *= one_over_z0
-        u_right *= one_over_z1
-        u_step = (u_right - u_left) / n_columns
+    first_col = _view_angle_to_col(angle0)
+    last_col = _view_angle_to_col(angle1)
+    if last_col <= first_col:
+        return None
 
-        return ScreenCoords(
-            first_col, last_col,
-            h_top_start, h_top_end, y_step_top,
-            h_bottom_start, h_bottom_end, y_step_bottom,
-            u_left, u_right, u_step,
-            one_over_z0, one_over_z1, one_over_z_step,
-            ceiling_h - floor_h)
-    return None
+    normal_x = geometry.seg_normal_x[seg_index]
+    normal_y = geometry.seg_normal_y[seg_index]
+    tex_distance = (v0.x - pos.x) * normal_x + (v0.y - pos.y) * normal_y
+    if tex_distance < 0.001:
+        return None
+    tex_offset = geometry.seg_tex_offset[seg_index] + (pos.x - v0.x) * normal_y - (pos.y - v0.y) * normal_x
+    center_angle = angle_to_fine(angle - math.atan2(normal_y, normal_x))
+
+    x_to_view_angle = _view.projection.x_to_view_angle
+    fine_cosine = _view.projection.fine_cosine
+    view_angle0 = x_to_view_angle[first_col]
+    view_angle1 = x_to_view_angle[last_col]
+    one_over_z0 = fine_cosine[(center_angle + view_angle0) & FINEMASK] / (tex_distance * fine_cosine[view_angle0 & FINEMASK])
+    one_over_z1 = fine_cosine[(center_angle + view_angle1) & FINEMASK] / (tex_distance * fine_cosine[view_angle1 & FINEMASK])
+
+    return SegProjection(first_col, last_col, tex_offset, tex_distance, center_angle,
+        one_over_z0, (one_over_z1 - one_over_z0) / (last_col - first_col))
+
+def _seg_to_screen_coord(proj:SegProjection, ceiling_h:int, floor_h:int, eye_pos:int) -> ScreenCoords:
+    n_columns = proj.last_col - proj.first_col
+    one_over_z1 = proj.one_over_z0 + proj.one_over_z_step * n_columns
+
+    vfov = WALL_HEIGHT_SCALE * _view.screen_height
+    half_height = _view.screen_height / 2
+    h_top_start = half_height - vfov * proj.one_over_z0 * (ceiling_h - eye_pos)
+    h_bottom_start = half_height - vfov * proj.one_over_z0 * (floor_h - eye_pos)
+    h_top_end = half_height - vfov * one_over_z1 * (ceiling_h - eye_pos)
+    h_bottom_end = half_height - vfov * one_over_z1 * (floor_h - eye_pos)
+
+    return ScreenCoords(*proj,
+        int(h_top_start * FRACUNIT), int((h_top_end - h_top_start) * FRACUNIT / n_columns),
+        int(h_bottom_start * FRACUNIT), int((h_bottom_end - h_bottom_start) * FRACUNIT / n_columns),
+        ceiling_h - floor_h)
 
 def _render_subsector(subsector_index:int, player:Player):
-    render_list : List[ScreenColumn] = []
     subsector = ssectors[subsector_index]
+    eye_pos = player.get_eye_pos()
+
+    # Like R_Subsector: only planes facing the eye are visible.
+    sector = sectors[locator.subsector_sector[subsector_index]]
+    ceiling_plane = floor_plane = None
+    if sector.ceiling_height > eye_pos:
+        ceiling_plane = _view.visplanes.find(sector.ceiling_height, sector.ceiling_texture_name, sector.light_level)
+    if sector.floor_height < eye_pos:
+        floor_plane = _view.visplanes.find(sector.floor_height, sector.floor_texture_name, sector.light_level)
+
+    for seg_index in range(subsector.start_seg, subsector.start_seg + subsector.n_segs):
+        proj = _project_seg(seg_index, player.pos, player.angle)
+        if proj is None:
+            continue
 
-    for i in range(subsector.n_segs):
-        seg_index = subsector.start_seg + i
         seg = segs[seg_index]
         linedef = linedefs[seg.linedef]
 
+        # Like R_StoreWallRange's fake contrast: lines along y are lighter, along x darker.
+        v0, v1 = vertexes[seg.start_vert], vertexes[seg.end_vert]
+        light = light_index(sector.light_level, -1 if v0.y == v1.y else 1 if v0.x == v1.x else 0)
+
         if linedef.back_sidedef == -1:
             sidedef = sidedefs[linedef.front_sidedef]
             sector = sectors[sidedef.sector]
 
-            if sc := _seg_to_screen_coord(seg, linedef, sector.ceiling_height, sector.floor_height, player.pos, player.angle, player.get_eye_pos()):
-                for clipped_sc in clip_solid_wall(sc):
-                    if clipped_sc.last_col != clipped_sc.first_col:
-                        render_list += _screen_coord_to_screen_cols(clipped_sc, sidedef.middle_texture_name, sidedef.x_offset, sidedef.y_offset, SOLID_WALL)
+            sc = _seg_to_screen_coord(proj, sector.ceiling_height, sector.floor_height, eye_pos)
+            for first_col, last_col in _view.clip_ranges.clip_solid_wall(sc.first_col, sc.last_col):
+                if last_col != first_col:
+                    if ceiling_plane is not None:
+                        ceiling_plane = _view.visplanes.check(ceiling_plane, first_col, last_col)
+                    if floor_plane is not None:
+                        floor_plane = _view.visplanes.check(floor_plane, first_col, last_col)
+                    _draw_wall_columns(sc, first_col, last_col, sidedef.middle_texture_name, sidedef.x_offset, sidedef.y_offset, SOLID_WALL,
+                        light, ceiling_plane, floor_plane)
+                    _view.draw_segs.append(DrawSeg(first_col, last_col,
+                        proj.one_over_z0 + (first_col - proj.first_col) * proj.one_over_z_step, proj.one_over_z_step, None, None))
         else:
             front_sidedef = sidedefs[linedef.front_sidedef]
             back_sidedef = sidedefs[linedef.back_sidedef]
@@ -289,58 +345,122 @@ def _render_subsector(subsector_index:int, player:Player):
             front_sector = sectors[front_sidedef.sector]
             back_sector = sectors[back_sidedef.sector]
 
-            if sc := _seg_to_screen_coord(seg, linedef, front_sector.ceiling_height, back_sector.ceiling_height, player.pos, player.angle, player.get_eye_pos()):
-                for clipped_sc in clip_window_wall(sc):
-                    render_list += _screen_coord_to_screen_cols(clipped_sc, front_sidedef.upper_texture_name, front_sidedef.x_offset, front_sidedef.y_offset, UPPER_WALL)
-            if sc := _seg_to_screen_coord(seg, linedef, back_sector.floor_height, front_sector.floor_height, player.pos, player.angle, player.get_eye_pos()):
-                for clipped_sc in clip_window_wall(sc):
-                    render_list += _screen_coord_to_screen_cols(clipped_sc, front_sidedef.lower_texture_name, front_sidedef.x_offset, front_sidedef.y_offset, LOWER_WALL)
-    return render_list
-
-def _render_bsp_node(player:Player, node_index:Optional[int]=None):
-    if node_index is None:
-        node_index = len(nodes) - 1
-
-    if node_index >> 15:
-        return _render_subsector(node_index ^ (1 << 15), player)
-
-    node = nodes[node_index]
-    render_list : List[ScreenColumn] = []
-
-    if _on_right_side(player.pos, node):
-        render_list += _render_bsp_node(player, node.right_child)
-        if _boundingbox_intersects_view(player.pos, player.dir, player.frust_norm_left, player.frust_norm_right, node.left_bbox):
-            render_list += _render_bsp_node(player, node.left_child)
-    else:
-        render_list += _render_bsp_node(player, node.left_child)
-        if _boundingbox_intersects_view(player.pos, player.dir, player.frust_norm_left, player.frust_norm_right, node.right_bbox):
-            render_list += _render_bsp_node(player, node.right_child)
-    return render_list
-
-def sector_search(pos:Vector2, node_index:Optional[int]=None) -> Sector:
-    if node_index is None:
-        node_index = len(nodes) - 1
-
-    if node_index >> 15:
-        subsector = ssectors[node_index ^ (1 << 15)]
-        seg = segs[subsector.start_seg]
-        linedef = linedefs[seg.linedef]
-        if seg.direction == 0:
-            return sectors[sidedefs[linedef.front_sidedef].sector]
-        return sectors[sidedefs[linedef.back_sidedef].sector]
-    
-    node = nodes[node_index]
-    if _on_right_side(pos, node):
-        return sector_search(pos, node.right_child)
-    return sector_search(pos, node.left_child)
+            fragments = _view.clip_ranges.clip_window_wall(proj.first_col, proj.last_col)
+
+            # Like R_StoreWallRange: planes only need marking where the sector
+            # behind looks different, or where a closed door hides it.
+            closed = back_sector.ceiling_height <= front_sector.floor_height or back_sector.floor_height >= front_sector.ceiling_height
+            mark_ceiling = closed or back_sector.ceiling_height != front_sector.ceiling_height or \
+                back_sector.ceiling_texture_name != front_sector.ceiling_texture_name or back_sector.light_level != front_sector.light_level
+            mark_floor = closed or back_sector.floor_height != front_sector.floor_height or \
+                back_sector.floor_texture_name != front_sector.floor_texture_name or back_sector.light_level != front_sector.light_level
+
+            if mark_ceiling:
+                sc = _seg_to_screen_coord(proj, front_sector.ceiling_height, back_sector.ceiling_height, eye_pos)
+                for first_col, last_col in fragments:
+                    if ceiling_plane is not None:
+                        ceiling_plane = _view.visplanes.check(ceiling_plane, first_col, last_col)
+                    _draw_wall_columns(sc, first_col, last_col, front_sidedef.upper_texture_name, front_sidedef.x_offset, front_sidedef.y_offset, UPPER_WALL,
+                        light, ceiling_plane, None)
+            if mark_floor:
+                sc = _seg_to_screen_coord(proj, back_sector.floor_height, front_sector.floor_height, eye_pos)
+                for first_col, last_col in fragments:
+                    if floor_plane is not None:
+                        floor_plane = _view.visplanes.check(floor_plane, first_col, last_col)
+                    _draw_wall_columns(sc, first_col, last_col, front_sidedef.lower_texture_name, front_sidedef.x_offset, front_sidedef.y_offset, LOWER_WALL,
+                        light, None, floor_plane)
+
+            # An opening without steps leaves the bounds as the walls in front of it set them.
+            if front_sector.ceiling_height != back_sector.ceiling_height or front_sector.floor_height != back_sector.floor_height:
+                for first_col, last_col in fragments:
+                    _view.draw_segs.append(DrawSeg(first_col, last_col,
+                        proj.one_over_z0 + (first_col - proj.first_col) * proj.one_over_z_step, proj.one_over_z_step,
+                        np.array(_view.top_bound[first_col:last_col]), np.array(_view.bottom_bound[first_col:last_col])))
+
+def _in_pvs(node_index : int, visible : int) -> bool:
+    if node_index & SUBSECTOR_FLAG:
+        return bool(visible >> (node_index ^ SUBSECTOR_FLAG) & 1)
+    return bool(subtree_subsectors[node_index] & visible)
+
+def _visible_subsectors(player:Player) -> Iterator[int]:
+    visible = pvs_rows[subsector_search(player.pos, _last_subsector)] if pvs_rows else -1
+
+    # Entries are (node, bbox); the bbox of a far child is only tested once
+    # everything in front of it has been drawn and clipped.
+    stack : List[Tuple[int, Optional[Rect]]] = [(len(nodes) - 1 if nodes else 1 << 15, None)]
+    while stack:
+        if _view.clip_ranges.is_range_covered(0, _view.screen_width):
+            return
+
+        node_index, bbox = stack.pop()
+        # Whole subtrees nothing can be seen in from here are skipped before any bbox test.
+        if not _in_pvs(node_index, visible):
+            continue
+        if bbox is not None and not _check_bbox(player.pos, player.angle, bbox):
+            continue
+
+        if node_index >> 15:
+            yield node_index ^ (1 << 15)
+            continue
+
+        node = nodes[node_index]
+        if _on_right_side(player.pos, node_index):
+            stack.append((node.left_child, node.left_bbox))
+            stack.append((node.right_child, None))
+        else:
+            stack.append((node.right_child, node.right_bbox))
+            stack.append((node.left_child, None))
+
+def subsector_search(pos:Vector2, hint:int=-1) -> int:
+    return point_location.locate_subsector(locator, pos.x, pos.y, hint)
+
+def sector_search(pos:Vector2) -> Sector:
+    # Usually called once a frame for the player, who mostly stays in the same subsector.
+    global _last_subsector
+    _last_subsector = point_location.locate_subsector(locator, pos.x, pos.y, _last_subsector)
+    return sectors[locator.subsector_sector[_last_subsector]]
+
+def sectors_search(points:np.ndarray) -> np.ndarray:
+    return point_location.locate_sectors(locator, points)
 
-def render_player_view(player:Player):
-    clear_clip_range()
-    _clear_floor_ceiling_bounds()
-    return _render_bsp_node(player)
+def _project_sprites(visible_subsectors:List[int], player:Player) -> List[VisSprite]:
+    eye_pos = player.get_eye_pos()
+    vfov = WALL_HEIGHT_SCALE * _view.screen_height
+    vissprites : List[VisSprite] = []
+    for subsector_index in visible_subsectors:
+        things = subsector_things[subsector_index]
+        if not things:
+            continue
+        sector = sectors[locator.subsector_sector[subsector_index]]
+        for thing in things:
+            vis = sprites.project_thing(thing, sector.floor_height, sector.light_level, player.pos, player.angle, eye_pos,
+                sprite_frames, texture_manager.sprite, _view.projection, _view.light_tables, vfov, _view.screen_height)
+            if vis is not None:
+                vissprites.append(vis)
+    return vissprites
 
+def _draw_planes(player:Player):
+    draw_planes(_view.frame_buffer, _view.visplanes.planes, texture_manager.flat, _view.plane_tables, _view.light_tables,
+        player.pos.x, player.pos.y, player.angle, player.get_eye_pos())
 
+def _draw_sprites(vissprites:List[VisSprite], first_col:int, last_col:int):
+    sprites.draw_vissprites(_view.frame_buffer, vissprites, _view.draw_segs, first_col, last_col)
 
+def render_player_view(player:Player, first_col:int=0, last_col:Optional[int]=None,
+        renderer:Optional[Renderer]=None) -> np.ndarray:
+    global _view
+    _view = renderer if renderer is not None else default_renderer
+    if last_col is None:
+        last_col = _view.screen_width
+    _view.begin_frame(first_col, last_col)
+    # Things are only looked for in the subsectors the walk reaches.
+    visited : List[int] = []
+    for subsector_index in _visible_subsectors(player):
+        _render_subsector(subsector_index, player)
+        visited.append(subsector_index)
+    _draw_planes(player)
+    _draw_sprites(_project_sprites(visited, player), first_col, last_col)
+    return _view.frame_buffer
 
 
 
@@ -361,73 +481,169 @@ def render_player_view(player:Player):
 
 
 
-def _add_linedefs_to_sector(sector : Sector, sector_id : int):
-    for i, linedef in enumerate(linedefs):
-        front_sidedef = linedef.front_sidedef
-        back_sidedef = linedef.back_sidedef
-        if (front_sidedef != -1 and sidedefs[front_sidedef].sector == sector_id) or \
-           (back_sidedef != -1 and sidedefs[back_sidedef].sector == sector_id):
-           sector.lines.append(i)
 
-def _load_map_data(wad_path : str, info_table : Dict, map_name : str):
+
+
+def _read_map_arrays(wad : WadFile, info_table : Dict, map_name : str) -> Dict[str, np.ndarray]:
+    map_info = info_table[map_name]
+    return {
+        'linedefs': read_linedefs_array(wad, *map_info['LINEDEFS']),
+        'vertexes': read_vertexes_array(wad, *map_info['VERTEXES']),
+        'sidedefs': read_sidedefs_array(wad, *map_info['SIDEDEFS']),
+        'segs':     read_segs_array(wad, *map_info['SEGS']),
+        'ssectors': read_ssectors_array(wad, *map_info['SSECTORS']),
+        'nodes':    read_nodes_array(wad, *map_info['NODES']),
+        'sectors':  read_sectors_array(wad, *map_info['SECTORS']),
+        'things':   read_things_array(wad, *map_info['THINGS']),
+    }
+
+def _build_sector_lines(linedef_arr : np.ndarray, sidedef_arr : np.ndarray, n_sectors : int) -> Tuple[np.ndarray, np.ndarray]:
+    line_ids = np.arange(len(linedef_arr), dtype=np.int32)
+    pairs = []
+    for side in ('front_sidedef', 'back_sidedef'):
+        has_side = linedef_arr[side] != -1
+        pairs.append(np.stack((sidedef_arr['sector'][linedef_arr[side][has_side]].astype(np.int32), line_ids[has_side]), axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    offsets = np.searchsorted(pairs[:, 0], np.arange(n_sectors + 1)).astype(np.int32)
+    return offsets, np.ascontiguousarray(pairs[:, 1])
+
+def _load_map_data(arrays : Dict[str, np.ndarray]):
     global linedefs, vertexes, sidedefs, segs, ssectors, nodes, sectors
 
-    linedefs = read_linedefs(wad_path, *info_table[map_name]['LINEDEFS'])
-    vertexes = read_vertexes(wad_path, *info_table[map_name]['VERTEXES'])
-    sidedefs = read_sidedefs(wad_path, *info_table[map_name]['SIDEDEFS'])
-    segs     =     read_segs(wad_path, *info_table[map_name]['SEGS'])
-    ssectors = read_ssectors(wad_path, *info_table[map_name]['SSECTORS'])
-    nodes    =    read_nodes(wad_path, *info_table[map_name]['NODES'])
-    sectors  =  read_sectors(wad_path, *info_table[map_name]['SECTORS'])
+    linedefs = linedefs_from_array(arrays['linedefs'])
+    vertexes = vertexes_from_array(arrays['vertexes'])
+    sidedefs = sidedefs_from_array(arrays['sidedefs'])
+    segs     =     segs_from_array(arrays['segs'])
+    ssectors = ssectors_from_array(arrays['ssectors'])
+    nodes    =    nodes_from_array(arrays['nodes'])
+    sectors  =  sectors_from_array(arrays['sectors'])
 
+    offsets, lines = arrays['sector_line_offsets'].tolist(), arrays['sector_lines'].tolist()
     for i, sector in enumerate(sectors):
-        _add_linedefs_to_sector(sector, i)
-
-def _create_texture_from_patches(
-        wad_path : str,
-        info_table : Dict,
-        wad_tex : WadTexture,
-        p_names : List[str],
-        p_dict : Dict[str, Surface],
-        color_palette : ColorPalette) -> Surface:
-
-    surface = Surface((wad_tex.width, wad_tex.height)).convert_alpha()
-    surface.fill((0, 0, 0, 0))
-
-    for layout in wad_tex.layouts:
-        p_name = p_names[layout.p_number]
-        if p_name not in p_dict:
-            p_dict[p_name] = patch_to_surface(
-                read_patch(wad_path, *info_table['PATCH'][p_name]),
-                color_palette)
-        surface.blit(p_dict[p_name], (layout.orginx, layout.orginy))
-
-    return surface
-
-def _load_texture_data(wad_path : str, info_table : Dict, map_name : str):
-    global wall_textures
-
-    color_palette = read_playpal(wad_path, *info_table['PLAYPAL'])[0]
-    p_names = read_patch_names(wad_path, *info_table['PNAMES'])
-    p_dict : Dict[str, Surface] = {}
-
-    wtex_dict = read_textures(wad_path, *info_table['TEXTURE1'])
-    wtex_dict.update(read_textures(wad_path, *info_table['TEXTURE2']))
-
-    def add_texture(t_name):
-        if t_name not in wall_textures:
-            wall_textures[t_name] = _create_texture_from_patches(
-                wad_path, info_table, wtex_dict[t_name], p_names, p_dict,
-                color_palette)
-
-    for sidedef in sidedefs:
-        if sidedef.lower_texture_name != '-':
-            add_texture(sidedef.lower_texture_name)
-        if sidedef.middle_texture_name != '-':
-            add_texture(sidedef.middle_texture_name)
-        if sidedef.upper_texture_name != '-':
-            add_texture(sidedef.upper_texture_name)
-
-def init_bsp_map(wad_path : str, info_table : Dict, map_name : str):
-    _load_map_data(wad_path, info_table, map_name)
-    _load_texture_data(wad_path, info_table, map_name)
\ No newline at end of file
+        sector.lines.extend(lines[offsets[i]:offsets[i + 1]])
+
+def _build_texture_data(wad : WadFile, info_table : Dict, sidedef_arr : np.ndarray) -> Dict[str, IndexedTexture]:
+    # Composited with a manager of its own, building a cache changes nothing that is loaded.
+    builder = TextureManager()
+    builder.attach(wad, info_table)
+    tex_names = np.unique(np.concatenate((
+        sidedef_arr['lower_texture_name'],
+        sidedef_arr['middle_texture_name'],
+        sidedef_arr['upper_texture_name'])))
+
+    textures : Dict[str, IndexedTexture] = {}
+    for t_name in tex_names.tolist():
+        t_name = t_name.decode('utf-8')
+        if builder.has_texture(t_name):
+            textures[t_name] = builder.composite(t_name)
+    return textures
+
+def _read_flats(wad : WadFile, info_table : Dict, sector_arr : np.ndarray) -> Dict[str, np.ndarray]:
+    flat_names = np.unique(np.concatenate((sector_arr['floor_texture_name'], sector_arr['ceiling_texture_name'])))
+    flat_lumps = info_table.get('FLAT', {})
+    names = [n.decode('utf-8') for n in flat_names.tolist()]
+    names = [n for n in names if n in flat_lumps]
+    return {
+        'flat_names': np.array(names, dtype='S8'),
+        'flat_pixels': np.array([read_flat(wad, *flat_lumps[n]) for n in names], dtype=np.uint8).reshape(-1, FLAT_SIZE, FLAT_SIZE),
+    }
+
+def _load_texture_data(arrays : Dict[str, np.ndarray]):
+    # Only cached maps come with composited textures and flats, the rest are
+    # built from the WAD as they come into view.
+    textures : Dict[str, np.ndarray] = {}
+    flats : Dict[str, np.ndarray] = {}
+    if 'texture_info' in arrays:
+        textures = {t_name: pixels for t_name, (pixels, _) in map_cache.unpack_textures(arrays).items()}
+    if 'flat_names' in arrays:
+        flats = dict(zip((n.decode('utf-8') for n in arrays['flat_names'].tolist()), arrays['flat_pixels']))
+    texture_manager.use_map_data(textures, flats)
+
+def load_map_arrays(wad : WadFile, info_table : Dict, map_name : str, cache_dir : Optional[str] = None) -> Dict[str, np.ndarray]:
+    arrays = None
+    if cache_dir is not None:
+        path = map_cache.cache_path(cache_dir, wad, map_name)
+        digest = map_cache.wad_digest(wad)
+        arrays = map_cache.read_map_cache(path, digest, map_name)
+
+    if arrays is None:
+        arrays = _read_map_arrays(wad, info_table, map_name)
+        arrays['sector_line_offsets'], arrays['sector_lines'] = _build_sector_lines(
+            arrays['linedefs'], arrays['sidedefs'], len(arrays['sectors']))
+        n_sectors = len(arrays['sectors'])
+        if 'REJECT' in info_table[map_name]:
+            arrays['reject'] = read_reject(wad, *info_table[map_name]['REJECT'], n_sectors)
+        else:
+            arrays['reject'] = np.zeros((n_sectors * n_sectors + 7) // 8, dtype=np.uint8)
+        if 'BLOCKMAP' in info_table[map_name]:
+            arrays.update(blockmap_to_arrays(read_blockmap(wad, *info_table[map_name]['BLOCKMAP'])))
+        else:
+            arrays.update(blockmap_to_arrays(build_blockmap(arrays['vertexes'], arrays['linedefs'])))
+        if cache_dir is not None:
+            arrays.update(map_cache.pack_textures(_build_texture_data(wad, info_table, arrays['sidedefs'])))
+            arrays.update(_read_flats(wad, info_table, arrays['sectors']))
+            map_cache.write_map_cache(path, digest, map_name, arrays)
+    return arrays
+
+def build_map_pvs(wad : WadFile, info_table : Dict, map_name : str, cache_dir : str) -> np.ndarray:
+    # Taking minutes on big maps, the PVS is only ever built by this offline
+    # step and kept in the map cache. Loads use it when it is there.
+    arrays = load_map_arrays(wad, info_table, map_name, cache_dir)
+    if 'pvs' not in arrays:
+        arrays = dict(arrays, pvs=build_pvs(arrays))
+        map_cache.write_map_cache(map_cache.cache_path(cache_dir, wad, map_name), map_cache.wad_digest(wad), map_name, arrays)
+    return arrays['pvs']
+
+def _load_things(info_table : Dict, thing_arr : np.ndarray):
+    global subsector_things, sprite_frames
+
+    sprite_lumps = info_table.get('SPRITE', {})
+    sprite_frames = sprites.build_sprite_frames(sprite_lumps)
+    drawn = [sprites.is_drawn(t, f, sprite_frames) for t, f in zip(thing_arr['thing_type'].tolist(), thing_arr['flags'].tolist())]
+    thing_arr = thing_arr[np.array(drawn, dtype=bool)]
+
+    subsector_things = [[] for _ in ssectors]
+    points = np.stack((thing_arr['x'], thing_arr['y']), axis=1)
+    for subsector_index, thing in zip(point_location.locate_subsectors(locator, points).tolist(), things_from_array(thing_arr)):
+        subsector_things[subsector_index].append(thing)
+
+def _load_pvs(arrays : Dict[str, np.ndarray]):
+    global pvs_rows, subtree_subsectors
+
+    pvs_rows = [int.from_bytes(row.tobytes(), 'little') for row in arrays['pvs']] if 'pvs' in arrays else []
+
+    # A walk from the root lists parents before their children, so filling
+    # nodes in reverse order has both children done before each parent.
+    subtree_subsectors = [0] * len(nodes)
+    order : List[int] = []
+    stack = [len(nodes) - 1] if nodes else []
+    while stack:
+        node_index = stack.pop()
+        order.append(node_index)
+        for child in (nodes[node_index].right_child, nodes[node_index].left_child):
+            if not child & SUBSECTOR_FLAG:
+                stack.append(child)
+    for node_index in reversed(order):
+        bits = 0
+        for child in (nodes[node_index].right_child, nodes[node_index].left_child):
+            bits |= 1 << (child ^ SUBSECTOR_FLAG) if child & SUBSECTOR_FLAG else subtree_subsectors[child]
+        subtree_subsectors[node_index] = bits
+
+def init_bsp_map(wad : WadFile, info_table : Dict, map_name : str, cache_dir : Optional[str] = None):
+    global geometry, locator, blockmap, reject, _last_subsector, colormaps
+
+    arrays = load_map_arrays(wad, info_table, map_name, cache_dir)
+    _load_map_data(arrays)
+    _load_pvs(arrays)
+    geometry = build_map_geometry(arrays)
+    locator = point_location.build_locator_tables(arrays, geometry)
+    blockmap = blockmap_from_arrays(arrays)
+    reject = arrays['reject']
+    _last_subsector = -1
+    texture_manager.attach(wad, info_table)
+    # Texture names can mean other pixels in the next WAD.
+    column_cache.clear()
+    _load_texture_data(arrays)
+    if 'COLORMAP' in info_table:
+        colormaps = read_colormap(wad, *info_table['COLORMAP'])
+    _load_things(info_table, arrays['things'])
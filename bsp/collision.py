@@ -0,0 +1,72 @@
+from typing import NamedTuple
+
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bsp.blockmap import line_touches_box, lines_in_box
+
+STEP_HEIGHT = 24
+# LineDef flag for lines that block monsters and players even when two sided.
+ML_BLOCKING = 1
+
+class PositionCheck(NamedTuple):
+    ok : bool
+    floor_height : int
+    ceiling_height : int
+    # The first line that stopped the move, -1 when ok or blocked by height alone.
+    blocking_line : int
+
+def _sector_at(x : float, y : float):
+    return bsp_map.sectors[bsp_map.locator.subsector_sector[bsp_map.subsector_search(Vector2(x, y))]]
+
+def check_position(x : float, y : float, radius : float, height : float, foot_z : float) -> PositionCheck:
+    # Like P_CheckPosition for walls only: the box of the thing at (x, y) may
+    # touch two sided lines whose opening it fits through and steps up to.
+    sector = _sector_at(x, y)
+    floor, ceiling = sector.floor_height, sector.ceiling_height
+    left, bottom, right, top = x - radius, y - radius, x + radius, y + radius
+
+    for line_index in lines_in_box(bsp_map.blockmap, left, bottom, right, top):
+        linedef = bsp_map.linedefs[line_index]
+        v0 = bsp_map.vertexes[linedef.start_vert]
+        v1 = bsp_map.vertexes[linedef.end_vert]
+        if not line_touches_box(v0.x, v0.y, v1.x, v1.y, left, bottom, right, top):
+            continue
+        if linedef.back_sidedef == -1 or linedef.flags & ML_BLOCKING:
+            return PositionCheck(False, floor, ceiling, line_index)
+
+        front = bsp_map.sectors[bsp_map.sidedefs[linedef.front_sidedef].sector]
+        back = bsp_map.sectors[bsp_map.sidedefs[linedef.back_sidedef].sector]
+        floor = max(floor, front.floor_height, back.floor_height)
+        ceiling = min(ceiling, front.ceiling_height, back.ceiling_height)
+        if ceiling - floor < height or floor - foot_z > STEP_HEIGHT or ceiling - foot_z < height:
+            return PositionCheck(False, floor, ceiling, line_index)
+
+    ok = ceiling - floor >= height and floor - foot_z <= STEP_HEIGHT and ceiling - foot_z >= height
+    return PositionCheck(ok, floor, ceiling, -1)
+
+def slide_move(pos : Vector2, delta : Vector2, radius : float, height : float, foot_z : float) -> Vector2:
+    target = pos + delta
+    check = check_position(target.x, target.y, radius, height, foot_z)
+    if check.ok:
+        return target
+
+    # Slide along the line that blocked the move.
+    if check.blocking_line != -1:
+        linedef = bsp_map.linedefs[check.blocking_line]
+        along = bsp_map.vertexes[linedef.end_vert] - bsp_map.vertexes[linedef.start_vert]
+        if along.length_squared() > 0:
+            along.normalize_ip()
+            target = pos + along * delta.dot(along)
+            if check_position(target.x, target.y, radius, height, foot_z).ok:
+                return target
+
+    # Then, like P_SlideMove's stairstep fallback, try each axis on its own.
+    for step in (Vector2(delta.x, 0), Vector2(0, delta.y)):
+        target = pos + step
+        if step.length_squared() > 0 and check_position(target.x, target.y, radius, height, foot_z).ok:
+            return target
+    return Vector2(pos)
+
+def move_player(player, delta : Vector2) -> Vector2:
+    return slide_move(player.pos, delta, player.radius, player.head_height, player.foot_pos)
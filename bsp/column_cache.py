@@ -0,0 +1,118 @@
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+import numpy as np
+
+from bsp.mipmap import MipChain
+from bsp.projection import FRACBITS, FRACUNIT
+
+# Off by default: with walls aligned to 1/16 of a row, one pass over the
+# bench path finds 8% of columns already scaled, nearly all of them within
+# the last 2 MB drawn, and lookups only pay for their misses from about a
+# third. A budget of a few MB is worth it where views repeat, like a still camera.
+DEFAULT_BUDGET = 0
+# Array header, key tuple and dict slot of an entry, counted against the
+# budget on top of its pixels so short columns are not free.
+ENTRY_OVERHEAD = 200
+# Columns this many times taller than the screen are only ever seen in part,
+# from right up against a wall, and are sampled without being kept.
+MAX_HEIGHT_SCREENS = 4
+# Where the wall's top edge falls within its row and the wall's height are
+# kept to this many fraction bits of a row. Sampled at the middle of each
+# step, texel edges land within 1/16 of a row of where they belong.
+SUBROW_BITS = 4
+
+# (texture name, column of the mip level, mip level, vertical offset, wall
+# height in texels, top edge within its row and height in rows as SUBROW_BITS fixed point)
+ColumnKey = Tuple[str, int, int, int, int, int, int]
+
+def scale_column(mips : MipChain, tex_x : int, level : int, y_offset : int, wall_height : int, top : float, height : float,
+        rows : np.ndarray) -> np.ndarray:
+    # Texture column tex_x at the given rows of it stretched over height rows
+    # from top, repeating down the wall for textures shorter than it. Texels
+    # are wrapped at full resolution, then looked up in the mip level.
+    tex_y = rows - top
+    tex_y *= wall_height / height
+    tex_y += y_offset
+    tex_y = tex_y.astype(np.intp)
+    tex_y %= mips[0].shape[1]
+    if level:
+        return mips[level][tex_x >> level].take(tex_y >> level)
+    return mips[0][tex_x].take(tex_y)
+
+class ColumnCache:
+    # Wall columns already scaled to the height they are drawn at, as palette
+    # indices before lighting, least recently used first out.
+    def __init__(self, budget_bytes : int = DEFAULT_BUDGET) -> None:
+        self.budget_bytes = budget_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.max_height = 0
+        self._rows = np.zeros(0)
+        self._entries : 'OrderedDict[ColumnKey, np.ndarray]' = OrderedDict()
+
+    def clear(self):
+        self._entries.clear()
+        self.resident_bytes = 0
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_budget(self, budget_bytes : int):
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def set_screen_height(self, screen_height : int):
+        # Called for every frame, with the height of the renderer drawing it.
+        if MAX_HEIGHT_SCREENS * screen_height == self.max_height:
+            return
+        self.max_height = MAX_HEIGHT_SCREENS * screen_height
+        self._rows = np.arange(self.max_height, dtype=np.float64)
+
+    def _evict(self):
+        while self.resident_bytes > self.budget_bytes and self._entries:
+            _, column = self._entries.popitem(last=False)
+            self.resident_bytes -= column.nbytes + ENTRY_OVERHEAD
+            self.evictions += 1
+
+    def column(self, mips : MipChain, tex_name : str, tex_x : int, level : int, y_offset : int, wall_height : int,
+            y_top : int, y_bottom : int, first_row : int, last_row : int) -> np.ndarray:
+        # Rows first_row to last_row of a wall column between the 16.16 fixed
+        # point edges y_top and y_bottom, counted from the row of y_top.
+        top, height = y_top & (FRACUNIT - 1), y_bottom - y_top
+        shift = FRACBITS - SUBROW_BITS
+        n_rows = ((top >> shift) + (height >> shift) + 2) >> SUBROW_BITS
+        if not self.budget_bytes or n_rows > self.max_height:
+            return scale_column(mips, tex_x, level, y_offset, wall_height, top / FRACUNIT, height / FRACUNIT,
+                np.arange(first_row, last_row, dtype=np.float64))
+
+        # Neighbouring texture columns share a column of the coarser levels.
+        key = (tex_name, tex_x >> level, level, y_offset, wall_height, top >> shift, height >> shift)
+        column = self._entries.get(key)
+        if column is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        else:
+            self.misses += 1
+            column = scale_column(mips, tex_x, level, y_offset, wall_height, ((top >> shift) + 0.5) / (1 << SUBROW_BITS),
+                ((height >> shift) + 0.5) / (1 << SUBROW_BITS), self._rows[:n_rows])
+            self._entries[key] = column
+            self.resident_bytes += column.nbytes + ENTRY_OVERHEAD
+            self._evict()
+        return column[first_row:last_row]
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'columns': len(self._entries),
+            'resident_bytes': self.resident_bytes,
+            'budget_bytes': self.budget_bytes,
+        }
@@ -0,0 +1,57 @@
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+# Frames averaged before each decision, and frames to wait after a change
+# so the new resolution's cost is what gets measured.
+WINDOW = 16
+SETTLE_FRAMES = 8
+
+# Width steps as a share of the full width, from lowest to highest.
+SCALE_STEPS = (0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+# Raise the resolution only once frames take less than this share of the budget,
+# so it does not flip back and forth at the edge of it.
+HEADROOM = 0.7
+
+class DynamicResolution:
+    # Lowers the internal resolution a step when frames run over budget and
+    # raises it again when there is headroom. The aspect ratio stays that of
+    # the full resolution.
+    def __init__(self, width : int, height : int, target_ms : float, min_scale : float = SCALE_STEPS[0]) -> None:
+        self.full_width = width
+        self.full_height = height
+        self.target_ms = target_ms
+        self.steps = [s for s in SCALE_STEPS if s >= min_scale] or [1.0]
+        self.step = len(self.steps) - 1
+        self._frame_ms : Deque[float] = deque(maxlen=WINDOW)
+        self._settle = 0
+
+    @property
+    def scale(self) -> float:
+        return self.steps[self.step]
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        # Even widths keep strips and the upscale from rounding unevenly.
+        width = max(2, int(self.full_width * self.scale) & ~1)
+        return width, max(1, round(width * self.full_height / self.full_width))
+
+    def update(self, frame_ms : float) -> Optional[Tuple[int, int]]:
+        # Returns the new resolution when it changes, None otherwise.
+        if self._settle > 0:
+            self._settle -= 1
+            return None
+        self._frame_ms.append(frame_ms)
+        if len(self._frame_ms) < WINDOW:
+            return None
+
+        mean_ms = sum(self._frame_ms) / len(self._frame_ms)
+        if mean_ms > self.target_ms and self.step > 0:
+            self.step -= 1
+        elif mean_ms < self.target_ms * HEADROOM and self.step < len(self.steps) - 1:
+            self.step += 1
+        else:
+            return None
+        self._frame_ms.clear()
+        self._settle = SETTLE_FRAMES
+        return self.resolution
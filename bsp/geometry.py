@@ -0,0 +1,38 @@
+import math
+from array import array
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+
+class MapGeometry(NamedTuple):
+    seg_normal_x : array
+    seg_normal_y : array
+    # Texture u at the seg's start vertex, as stored in the SEGS lump.
+    seg_tex_offset : array
+    node_x : array
+    node_y : array
+    node_normal_x : array
+    node_normal_y : array
+
+def to_array(typecode : str, a) -> array:
+    return array(typecode, np.ascontiguousarray(a, dtype=np.dtype(typecode)).tobytes())
+
+def build_map_geometry(arrays : Dict[str, np.ndarray]) -> MapGeometry:
+    segs = arrays['segs']
+    nodes = arrays['nodes']
+
+    seg_angle = segs['angle'] / 65535 * 2 * math.pi + math.pi / 2
+
+    part_len = np.hypot(nodes['dx'], nodes['dy']).astype(np.float64)
+    part_len[part_len == 0] = 1.0
+
+    return MapGeometry(
+        seg_normal_x=   to_array('d', np.cos(seg_angle)),
+        seg_normal_y=   to_array('d', np.sin(seg_angle)),
+        seg_tex_offset= to_array('d', segs['offset']),
+        node_x=         to_array('d', nodes['x']),
+        node_y=         to_array('d', nodes['y']),
+        node_normal_x=  to_array('d', -nodes['dy'] / part_len),
+        node_normal_y=  to_array('d', nodes['dx'] / part_len),
+    )
@@ -0,0 +1,59 @@
+import math
+from typing import NamedTuple
+
+import numpy as np
+
+from bsp.projection import FRACBITS
+
+# Like r_main.h: sector light is quantised to 16 levels, walls and sprites
+# pick one of 48 maps by scale, planes one of 128 by distance.
+LIGHTLEVELS = 16
+LIGHTSEGSHIFT = 4
+MAXLIGHTSCALE = 48
+LIGHTSCALESHIFT = 12
+MAXLIGHTZ = 128
+LIGHTZSHIFT = 20
+NUMCOLORMAPS = 32
+DISTMAP = 2
+
+# Light falloff is tuned to this width, like SCREENWIDTH.
+BASE_WIDTH = 320
+
+class LightTables(NamedTuple):
+    colormaps : np.ndarray
+    # Colormap rows by light level, then by wall scale or plane distance, like scalelight and zlight.
+    scale_light : np.ndarray
+    z_light : np.ndarray
+    # Turns 1/z into a scale_light column, like rw_scale >> LIGHTSCALESHIFT.
+    scale_factor : float
+
+def _start_maps() -> np.ndarray:
+    return (LIGHTLEVELS - 1 - np.arange(LIGHTLEVELS)) * 2 * NUMCOLORMAPS // LIGHTLEVELS
+
+def build_light_tables(colormaps : np.ndarray, width : int, fov : float) -> LightTables:
+    # Like R_InitLightTables and R_ExecuteSetViewSize.
+    start = _start_maps()[:, None]
+
+    scale_levels = np.arange(MAXLIGHTSCALE) * BASE_WIDTH // width // DISTMAP
+    scale_light = np.clip(start - scale_levels, 0, NUMCOLORMAPS - 1)
+
+    z_scale = np.array([((BASE_WIDTH // 2 << 32) // ((j + 1) << LIGHTZSHIFT)) >> LIGHTSCALESHIFT
+        for j in range(MAXLIGHTZ)])
+    z_light = np.clip(start - z_scale // DISTMAP, 0, NUMCOLORMAPS - 1)
+
+    scale_factor = width / 2 / math.tan(fov / 2) * (1 << (FRACBITS - LIGHTSCALESHIFT))
+    return LightTables(colormaps, colormaps[scale_light], colormaps[z_light], scale_factor)
+
+def identity_colormaps() -> np.ndarray:
+    # For WADs without a COLORMAP, everything stays full bright.
+    return np.tile(np.arange(256, dtype=np.uint8), (NUMCOLORMAPS + 2, 1))
+
+def light_index(light_level : int, extra : int = 0) -> int:
+    return min(max((light_level >> LIGHTSEGSHIFT) + extra, 0), LIGHTLEVELS - 1)
+
+def scale_colormap(tables : LightTables, light : int, one_over_z : float) -> np.ndarray:
+    return tables.scale_light[light, min(int(one_over_z * tables.scale_factor), MAXLIGHTSCALE - 1)]
+
+def z_light_rows(tables : LightTables, light : int, depth : np.ndarray) -> np.ndarray:
+    # Row of colormaps for each plane depth in map units, like planezlight[distance >> LIGHTZSHIFT].
+    return tables.z_light[light, np.minimum(depth.astype(np.int64) >> (LIGHTZSHIFT - FRACBITS), MAXLIGHTZ - 1)]
@@ -0,0 +1,119 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from wad.reader import WadFile
+
+CACHE_MAGIC = b'DPYC'
+CACHE_VERSION = 6
+_ALIGN = 16
+
+TEXTURE_INFO_DTYPE = np.dtype([
+    ('name', 'S8'), ('width', '<i4'), ('height', '<i4'), ('offset', '<i8')])
+
+IndexedTexture = Tuple[np.ndarray, np.ndarray]
+
+
+def wad_digest(wad : WadFile) -> str:
+    return hashlib.sha1(wad.data).hexdigest()
+
+def cache_path(cache_dir : str, wad : WadFile, map_name : str) -> str:
+    wad_name = os.path.splitext(os.path.basename(wad.wad_path))[0]
+    return os.path.join(cache_dir, '%s.%s.mapcache' % (wad_name, map_name))
+
+def pack_textures(textures : Dict[str, IndexedTexture]) -> Dict[str, np.ndarray]:
+    info = np.zeros(len(textures), dtype=TEXTURE_INFO_DTYPE)
+    offset = 0
+    for i, (name, (pixels, _)) in enumerate(textures.items()):
+        info[i] = (name.encode('utf-8'), pixels.shape[0], pixels.shape[1], offset)
+        offset += pixels.size
+    if textures:
+        pixels = np.concatenate([p.ravel() for p, _ in textures.values()])
+        masks = np.concatenate([m.ravel() for _, m in textures.values()])
+    else:
+        pixels = np.zeros(0, dtype=np.uint8)
+        masks = np.zeros(0, dtype=bool)
+    return {'texture_info': info, 'texture_pixels': pixels, 'texture_masks': masks}
+
+def unpack_textures(arrays : Dict[str, np.ndarray]) -> Dict[str, IndexedTexture]:
+    textures : Dict[str, IndexedTexture] = {}
+    pixels, masks = arrays['texture_pixels'], arrays['texture_masks']
+    for name, width, height, offset in arrays['texture_info'].tolist():
+        end = offset + width * height
+        textures[name.decode('utf-8')] = (
+            pixels[offset:end].reshape(width, height),
+            masks[offset:end].reshape(width, height))
+    return textures
+
+def write_map_cache(path : str, digest : str, map_name : str, arrays : Dict[str, np.ndarray]):
+    entries = {}
+    offset = 0
+    for name, arr in arrays.items():
+        entries[name] = {
+            'descr': np.lib.format.dtype_to_descr(arr.dtype),
+            'shape': arr.shape,
+            'offset': offset,
+        }
+        offset += -(-arr.nbytes // _ALIGN) * _ALIGN
+
+    header = json.dumps({
+        'wad_digest': digest,
+        'map_name': map_name,
+        'arrays': entries,
+    }).encode('utf-8')
+    data_start = -(-(12 + len(header)) // _ALIGN) * _ALIGN
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(CACHE_MAGIC + struct.pack('<II', CACHE_VERSION, len(header)) + header)
+        for name, arr in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(data_start + offset)
+    # Readers in other processes only ever see a complete file.
+    os.replace(tmp_path, path)
+
+def read_map_cache(path : str, digest : str, map_name : str) -> Optional[Dict[str, np.ndarray]]:
+    try:
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    # A truncated or corrupt file reads as a miss and gets rebuilt.
+    try:
+        return _read_arrays(mm, digest, map_name)
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+def _read_arrays(mm : mmap.mmap, digest : str, map_name : str) -> Optional[Dict[str, np.ndarray]]:
+    if mm[0:4] != CACHE_MAGIC:
+        return None
+    version, header_len = struct.unpack_from('<II', mm, 4)
+    if version != CACHE_VERSION:
+        return None
+    # JSONDecodeError and UnicodeDecodeError are both ValueErrors.
+    header = json.loads(bytes(mm[12:12 + header_len]).decode('utf-8'))
+    if header['wad_digest'] != digest or header['map_name'] != map_name:
+        return None
+
+    data_start = -(-(12 + header_len) // _ALIGN) * _ALIGN
+    arrays : Dict[str, np.ndarray] = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.lib.format.descr_to_dtype(entry['descr'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape))
+        if count == 0:
+            arrays[name] = np.zeros(shape, dtype=dtype)
+            continue
+        if data_start + entry['offset'] + count * dtype.itemsize > len(mm):
+            return None
+        arrays[name] = np.frombuffer(mm, dtype=dtype, count=count,
+            offset=data_start + entry['offset']).reshape(shape)
+    return arrays
@@ -0,0 +1,50 @@
+from typing import List, Optional
+
+import numpy as np
+
+# Each level halves the one above it down to a single row or column, level 0
+# being the texture itself.
+MipChain = List[np.ndarray]
+
+# Averaged colors are looked up at 5 bits per channel.
+RGB_BITS = 5
+
+def build_rgb_lookup(palette : np.ndarray) -> np.ndarray:
+    # Nearest palette index of every 15-bit color, palette as (256, 3) RGB.
+    levels = 1 << RGB_BITS
+    codes = np.arange(levels ** 3)
+    step = 256 // levels
+    rgb = np.stack([(codes >> 2 * RGB_BITS) & (levels - 1), (codes >> RGB_BITS) & (levels - 1), codes & (levels - 1)],
+        axis=1) * step + step // 2
+    palette = palette.astype(np.int32)
+
+    lookup = np.empty(len(codes), dtype=np.uint8)
+    for start in range(0, len(codes), 4096):
+        diff = rgb[start:start + 4096, None, :] - palette[None, :, :]
+        lookup[start:start + 4096] = (diff * diff).sum(axis=2).argmin(axis=1)
+    return lookup
+
+def _halve(rgb : np.ndarray) -> np.ndarray:
+    # Box filters 2x2 texels into one, repeating the last row or column of odd sizes.
+    if rgb.shape[0] & 1:
+        rgb = np.concatenate([rgb, rgb[-1:]], axis=0)
+    if rgb.shape[1] & 1:
+        rgb = np.concatenate([rgb, rgb[:, -1:]], axis=1)
+    return (rgb[0::2, 0::2] + rgb[1::2, 0::2] + rgb[0::2, 1::2] + rgb[1::2, 1::2]) * 0.25
+
+def build_mip_chain(pixels : np.ndarray, palette : Optional[np.ndarray], lookup : Optional[np.ndarray]) -> MipChain:
+    # Levels are filtered in RGB and mapped back to the nearest palette index.
+    # Without a palette they are point sampled instead.
+    chain = [pixels]
+    if palette is None or lookup is None:
+        while min(chain[-1].shape) > 1:
+            chain.append(np.ascontiguousarray(chain[-1][::2, ::2]))
+        return chain
+
+    rgb = palette[pixels].astype(np.float32)
+    shift = 8 - RGB_BITS
+    while min(rgb.shape[:2]) > 1:
+        rgb = _halve(rgb)
+        q = rgb.astype(np.intp) >> shift
+        chain.append(lookup[(q[..., 0] << 2 * RGB_BITS) | (q[..., 1] << RGB_BITS) | q[..., 2]])
+    return chain
@@ -0,0 +1,142 @@
+from array import array
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from bsp.geometry import MapGeometry, to_array
+
+SUBSECTOR_FLAG = 1 << 15
+_HULL_EPSILON = 1e-6
+
+# Plain arrays index fast one element at a time and np.frombuffer views them
+# without a copy for the batched path. The partition lines are the map
+# geometry's own arrays.
+class LocatorTables(NamedTuple):
+    root : int
+    node_x : array
+    node_y : array
+    node_normal_x : array
+    node_normal_y : array
+    right_child : array
+    left_child : array
+    subsector_sector : array
+    # Counter-clockwise convex hull of each subsector's seg vertices as CSR
+    # edge lists: edge i runs from hull_x/y[i] in direction hull_dx/dy[i].
+    hull_offsets : array
+    hull_x : array
+    hull_y : array
+    hull_dx : array
+    hull_dy : array
+
+def _convex_hull(points : List[tuple]) -> List[tuple]:
+    # Andrew's monotone chain, counter-clockwise without repeating the first point.
+    points = sorted(set(points))
+    if len(points) < 3:
+        return []
+
+    def half(pts):
+        chain : List[tuple] = []
+        for p in pts:
+            while len(chain) >= 2 and \
+                    (chain[-1][0] - chain[-2][0]) * (p[1] - chain[-2][1]) - \
+                    (chain[-1][1] - chain[-2][1]) * (p[0] - chain[-2][0]) <= 0:
+                chain.pop()
+            chain.append(p)
+        return chain
+
+    hull = half(points)[:-1] + half(points[::-1])[:-1]
+    return hull if len(hull) >= 3 else []
+
+def build_locator_tables(arrays : Dict[str, np.ndarray], geometry : MapGeometry) -> LocatorTables:
+    vertexes, segs, ssectors = arrays['vertexes'], arrays['segs'], arrays['ssectors']
+    nodes, linedefs, sidedefs = arrays['nodes'], arrays['linedefs'], arrays['sidedefs']
+
+    first_segs = segs[ssectors['start_seg']]
+    first_lines = linedefs[first_segs['linedef']]
+    sides = np.where(first_segs['direction'] == 0, first_lines['front_sidedef'], first_lines['back_sidedef'])
+
+    offsets = [0]
+    hull_x : List[float] = []
+    hull_y : List[float] = []
+    hull_dx : List[float] = []
+    hull_dy : List[float] = []
+    vx, vy = vertexes['x'].tolist(), vertexes['y'].tolist()
+    seg_start, seg_end = segs['start_vert'].tolist(), segs['end_vert'].tolist()
+    for n_segs, start_seg in ssectors.tolist():
+        points = []
+        for i in range(start_seg, start_seg + n_segs):
+            points.append((vx[seg_start[i]], vy[seg_start[i]]))
+            points.append((vx[seg_end[i]], vy[seg_end[i]]))
+        hull = _convex_hull(points)
+        for p, q in zip(hull, hull[1:] + hull[:1]):
+            hull_x.append(p[0])
+            hull_y.append(p[1])
+            hull_dx.append(q[0] - p[0])
+            hull_dy.append(q[1] - p[1])
+        offsets.append(len(hull_x))
+
+    return LocatorTables(
+        root=           len(nodes) - 1 if len(nodes) else SUBSECTOR_FLAG,
+        node_x=         geometry.node_x,
+        node_y=         geometry.node_y,
+        node_normal_x=  geometry.node_normal_x,
+        node_normal_y=  geometry.node_normal_y,
+        right_child=    to_array('q', nodes['right_child']),
+        left_child=     to_array('q', nodes['left_child']),
+        subsector_sector=to_array('q', sidedefs['sector'][sides]),
+        hull_offsets=   to_array('q', offsets),
+        hull_x=         to_array('d', hull_x),
+        hull_y=         to_array('d', hull_y),
+        hull_dx=        to_array('d', hull_dx),
+        hull_dy=        to_array('d', hull_dy),
+    )
+
+def in_subsector_hull(tables : LocatorTables, x : float, y : float, subsector_index : int) -> bool:
+    # Strictly inside only, points on a hull edge are left to the BSP to decide.
+    start = tables.hull_offsets[subsector_index]
+    end = tables.hull_offsets[subsector_index + 1]
+    if start == end:
+        return False
+    hx, hy = tables.hull_x, tables.hull_y
+    hdx, hdy = tables.hull_dx, tables.hull_dy
+    for i in range(start, end):
+        if hdx[i] * (y - hy[i]) - hdy[i] * (x - hx[i]) <= _HULL_EPSILON:
+            return False
+    return True
+
+def locate_subsector(tables : LocatorTables, x : float, y : float, hint : int = -1) -> int:
+    if hint >= 0 and in_subsector_hull(tables, x, y, hint):
+        return hint
+
+    node_index = tables.root
+    node_x, node_y = tables.node_x, tables.node_y
+    normal_x, normal_y = tables.node_normal_x, tables.node_normal_y
+    while not node_index & SUBSECTOR_FLAG:
+        if (x - node_x[node_index]) * normal_x[node_index] + (y - node_y[node_index]) * normal_y[node_index] > 0:
+            node_index = tables.left_child[node_index]
+        else:
+            node_index = tables.right_child[node_index]
+    return node_index ^ SUBSECTOR_FLAG
+
+def _view(a : array) -> np.ndarray:
+    return np.frombuffer(a, dtype=np.dtype(a.typecode))
+
+def locate_subsectors(tables : LocatorTables, points : np.ndarray) -> np.ndarray:
+    # Walks every point down the tree at once, one level per iteration.
+    x = np.asarray(points[:, 0], dtype=np.float64)
+    y = np.asarray(points[:, 1], dtype=np.float64)
+    node_x, node_y = _view(tables.node_x), _view(tables.node_y)
+    normal_x, normal_y = _view(tables.node_normal_x), _view(tables.node_normal_y)
+    right_child, left_child = _view(tables.right_child), _view(tables.left_child)
+
+    node_index = np.full(len(x), tables.root, dtype=np.int64)
+    active = np.nonzero((node_index & SUBSECTOR_FLAG) == 0)[0]
+    while len(active):
+        n = node_index[active]
+        left = (x[active] - node_x[n]) * normal_x[n] + (y[active] - node_y[n]) * normal_y[n] > 0
+        node_index[active] = np.where(left, left_child[n], right_child[n])
+        active = active[(node_index[active] & SUBSECTOR_FLAG) == 0]
+    return node_index ^ SUBSECTOR_FLAG
+
+def locate_sectors(tables : LocatorTables, points : np.ndarray) -> np.ndarray:
+    return _view(tables.subsector_sector)[locate_subsectors(tables, points)]
@@ -0,0 +1,78 @@
+import math
+from typing import List, NamedTuple
+
+FINEANGLES = 8192
+FINEMASK = FINEANGLES - 1
+# View angles in [-90, 90) degrees index view_angle_to_x from 0.
+FINE_ANG90 = FINEANGLES // 4
+
+FRACBITS = 16
+FRACUNIT = 1 << FRACBITS
+
+_RAD_TO_FINE = FINEANGLES / (2 * math.pi)
+
+class ProjectionTables(NamedTuple):
+    width : int
+    fov : float
+    clip_angle : float
+    # Fine view angle of the ray through the left edge of each column, width + 1 entries.
+    x_to_view_angle : List[int]
+    # First column at or right of each fine view angle, offset by FINE_ANG90.
+    view_angle_to_x : List[int]
+    fine_tangent : List[float]
+    fine_cosine : List[float]
+
+class SegProjection(NamedTuple):
+    first_col : int
+    last_col : int
+    # Texture u at the foot of the perpendicular from the viewer, and that perpendicular's length.
+    tex_offset : float
+    tex_distance : float
+    # Fine angle between the view direction and the seg normal.
+    center_angle : int
+    one_over_z0 : float
+    one_over_z_step : float
+
+class ScreenCoords(NamedTuple):
+    first_col : int
+    last_col : int
+    tex_offset : float
+    tex_distance : float
+    center_angle : int
+    one_over_z0 : float
+    one_over_z_step : float
+    # Screen rows of the top and bottom edge as 16.16 fixed point.
+    y_top_start : int
+    y_top_step : int
+    y_bottom_start : int
+    y_bottom_step : int
+    wall_height : int
+
+def angle_to_fine(a : float) -> int:
+    return math.floor(a * _RAD_TO_FINE)
+
+def build_projection_tables(width : int, fov : float) -> ProjectionTables:
+    tan_half_fov = math.tan(fov / 2)
+    fine_to_rad = 1 / _RAD_TO_FINE
+
+    x_to_view_angle = [
+        angle_to_fine(math.atan((1 - 2 * x / width) * tan_half_fov))
+        for x in range(width + 1)
+    ]
+
+    view_angle_to_x : List[int] = []
+    for i in range(FINEANGLES // 2):
+        t = math.tan((i - FINE_ANG90 + 0.5) * fine_to_rad) / tan_half_fov
+        view_angle_to_x.append(int((1 - max(-1.0, min(t, 1.0))) * (width / 2)))
+    # Like the fencepost fix in R_InitTextureMapping: segs clipped to the edges
+    # of the view reach the outermost columns, the right edge being exclusive.
+    for i in range(angle_to_fine(-fov / 2) + FINE_ANG90 + 1):
+        view_angle_to_x[i] = width
+    for i in range(angle_to_fine(fov / 2) + FINE_ANG90, len(view_angle_to_x)):
+        view_angle_to_x[i] = 0
+
+    fine_tangent = [math.tan((i + 0.5) * fine_to_rad) for i in range(FINEANGLES)]
+    fine_cosine = [math.cos((i + 0.5) * fine_to_rad) for i in range(FINEANGLES)]
+
+    return ProjectionTables(width, fov, fov / 2, x_to_view_angle,
+        view_angle_to_x, fine_tangent, fine_cosine)
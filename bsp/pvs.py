@@ -0,0 +1,310 @@
+import math
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from bsp.point_location import SUBSECTOR_FLAG
+
+# a * x + b * y + c with (a, b) a unit normal, so the value is a distance.
+Line = Tuple[float, float, float]
+# The same line with integer coefficients in lowest terms, exact for map lines.
+LineKey = Tuple[int, int, int]
+Segment = Tuple[float, float, float, float]
+Polygon = Tuple[List[Tuple[float, float]], List[Optional[LineKey]]]
+
+# Points this far behind a clipping line are still kept, so rounding only
+# ever makes the sets larger.
+ON_EPSILON = 0.1
+# Ends closer to a line than this count as on it when picking separating lines.
+SIDE_EPSILON = 1e-6
+# Separating lines are only drawn through ends at least this far apart.
+MIN_LENGTH = 1.0
+# Leaves smaller than this are seen from and see everywhere.
+MIN_AREA = 1.0
+
+# Portal pairs tested against each other at once, bounding the memory of
+# the first pass to around 20 MB whatever the number of portals.
+BLOCK_PAIRS = 1 << 18
+
+_BOUNDS_MARGIN = 64
+
+class Portal(NamedTuple):
+    # A stretch of boundary between two leaves with no one-sided wall on it,
+    # looked through from from_leaf, with to_leaf on the positive side of line.
+    seg : Segment
+    line : Line
+    from_leaf : int
+    to_leaf : int
+
+def _canonical(a : int, b : int, c : int) -> Tuple[LineKey, int]:
+    # Lines the same up to scale get one key, the sign says which way this one faced.
+    g = math.gcd(math.gcd(a, b), c) or 1
+    a, b, c = a // g, b // g, c // g
+    if a < 0 or (a == 0 and b < 0):
+        return (-a, -b, -c), -1
+    return (a, b, c), 1
+
+def _unit_line(a : float, b : float, c : float) -> Line:
+    length = math.hypot(a, b)
+    return a / length, b / length, c / length
+
+def _side(line : Line, x : float, y : float) -> float:
+    return line[0] * x + line[1] * y + line[2]
+
+def _clip_polygon(polygon : Polygon, key : LineKey) -> Polygon:
+    # Sutherland-Hodgman against a * x + b * y + c >= 0. Edge i runs from
+    # point i to the next one and remembers the line it lies on.
+    points, keys = polygon
+    line = _unit_line(*key)
+    sides = [_side(line, x, y) for x, y in points]
+    out_points : List[Tuple[float, float]] = []
+    out_keys : List[Optional[LineKey]] = []
+    for i in range(len(points)):
+        j = (i + 1) % len(points)
+        (px, py), (qx, qy), sp, sq = points[i], points[j], sides[i], sides[j]
+        if sp >= 0:
+            out_points.append((px, py))
+            out_keys.append(keys[i])
+        if (sp >= 0) != (sq >= 0):
+            t = sp / (sp - sq)
+            out_points.append((px + (qx - px) * t, py + (qy - py) * t))
+            # Leaving runs along the clipping line to where the polygon comes back in.
+            out_keys.append(key if sp >= 0 else keys[i])
+    return out_points, out_keys
+
+def _polygon_area(points : List[Tuple[float, float]]) -> float:
+    return 0.5 * sum(px * qy - qx * py for (px, py), (qx, qy) in zip(points, points[1:] + points[:1]))
+
+def _leaf_polygons(arrays : Dict[str, np.ndarray]) -> List[Polygon]:
+    # Each subsector's area: its BSP cell cut down by the lines of its own segs,
+    # so cells reaching out past the map's walls do not touch across the void.
+    vertexes, linedefs, segs = arrays['vertexes'], arrays['linedefs'], arrays['segs']
+    vx, vy = vertexes['x'].tolist(), vertexes['y'].tolist()
+    line_start, line_end = linedefs['start_vert'].tolist(), linedefs['end_vert'].tolist()
+    seg_line, seg_dir = segs['linedef'].tolist(), segs['direction'].tolist()
+    ssectors = arrays['ssectors'].tolist()
+    nodes = arrays['nodes'].tolist()
+
+    left, bottom = min(vx) - _BOUNDS_MARGIN, min(vy) - _BOUNDS_MARGIN
+    right, top = max(vx) + _BOUNDS_MARGIN, max(vy) + _BOUNDS_MARGIN
+    box : Polygon = ([(left, bottom), (right, bottom), (right, top), (left, top)], [None] * 4)
+
+    polygons : List[Polygon] = [([], [])] * len(ssectors)
+    stack = [(len(nodes) - 1 if nodes else SUBSECTOR_FLAG, box)]
+    while stack:
+        node_index, polygon = stack.pop()
+        if node_index & SUBSECTOR_FLAG:
+            subsector = node_index ^ SUBSECTOR_FLAG
+            n_segs, start_seg = ssectors[subsector]
+            for i in range(start_seg, start_seg + n_segs):
+                # Segs have their subsector on the right, running along their linedef or against it.
+                v0, v1 = line_start[seg_line[i]], line_end[seg_line[i]]
+                dx, dy = vx[v1] - vx[v0], vy[v1] - vy[v0]
+                s = 1 if seg_dir[i] == 0 else -1
+                if len(polygon[0]) >= 3 and (dx or dy):
+                    polygon = _clip_polygon(polygon, (s * dy, -s * dx, s * (dx * vy[v0] - dy * vx[v0])))
+            polygons[subsector] = polygon
+            continue
+
+        x, y, dx, dy = nodes[node_index][:4]
+        right_child, left_child = nodes[node_index][12:14]
+        # Like R_PointOnSide, the left child is where -dy * (px - x) + dx * (py - y) > 0.
+        stack.append((left_child, _clip_polygon(polygon, (-dy, dx, dy * x - dx * y))))
+        stack.append((right_child, _clip_polygon(polygon, (dy, -dx, dx * y - dy * x))))
+    return polygons
+
+def _along(line : Line, x : float, y : float) -> float:
+    return x * line[1] - y * line[0]
+
+def _line_point(line : Line, t : float) -> Tuple[float, float]:
+    a, b, c = line
+    return -c * a + t * b, -c * b - t * a
+
+def _build_portals(arrays : Dict[str, np.ndarray], polygons : List[Polygon]) -> List[Portal]:
+    # Edges of leaves on opposite sides of the same line face each other where
+    # their spans overlap, minus wherever a one-sided wall runs along it.
+    edges : Dict[LineKey, List[Tuple[float, float, int, int]]] = {}
+    for leaf, (points, keys) in enumerate(polygons):
+        for (px, py), (qx, qy), key in zip(points, points[1:] + points[:1], keys):
+            if key is None:
+                continue
+            key, sign = _canonical(*key)
+            line = _unit_line(*key)
+            t0, t1 = sorted((_along(line, px, py), _along(line, qx, qy)))
+            if t1 - t0 > ON_EPSILON:
+                edges.setdefault(key, []).append((t0, t1, sign, leaf))
+
+    walls : Dict[LineKey, List[Tuple[float, float]]] = {}
+    vx, vy = arrays['vertexes']['x'].tolist(), arrays['vertexes']['y'].tolist()
+    linedefs = arrays['linedefs']
+    for v0, v1, back in zip(linedefs['start_vert'].tolist(), linedefs['end_vert'].tolist(), linedefs['back_sidedef'].tolist()):
+        dx, dy = vx[v1] - vx[v0], vy[v1] - vy[v0]
+        if back != -1 or not (dx or dy):
+            continue
+        key, _ = _canonical(dy, -dx, dx * vy[v0] - dy * vx[v0])
+        if key in edges:
+            line = _unit_line(*key)
+            walls.setdefault(key, []).append(tuple(sorted((_along(line, vx[v0], vy[v0]), _along(line, vx[v1], vy[v1])))))
+
+    portals : List[Portal] = []
+    for key, line_edges in edges.items():
+        line = _unit_line(*key)
+        back_line = (-line[0], -line[1], -line[2])
+        for t0, t1, sign, leaf in line_edges:
+            if sign < 0:
+                continue
+            # leaf is on the positive side of the line, other on the negative one.
+            for u0, u1, other_sign, other in line_edges:
+                if other_sign > 0 or other == leaf:
+                    continue
+                spans = [(max(t0, u0), min(t1, u1))]
+                for w0, w1 in walls.get(key, ()):
+                    spans = [(p0, p1) for s0, s1 in spans for p0, p1 in ((s0, min(s1, w0)), (max(s0, w1), s1))
+                        if p1 - p0 > ON_EPSILON]
+                for s0, s1 in spans:
+                    if s1 - s0 > ON_EPSILON:
+                        seg = _line_point(line, s0) + _line_point(line, s1)
+                        portals.append(Portal(seg, back_line, leaf, other))
+                        portals.append(Portal(seg, line, other, leaf))
+    return portals
+
+def _line_through(x0 : float, y0 : float, x1 : float, y1 : float) -> Optional[Line]:
+    dx, dy = x1 - x0, y1 - y0
+    if math.hypot(dx, dy) < MIN_LENGTH:
+        return None
+    return _unit_line(-dy, dx, dy * x0 - dx * y0)
+
+def _clip_segment(seg : Segment, line : Line, sign : float) -> Optional[Segment]:
+    # The part of seg where sign * side >= -ON_EPSILON.
+    x0, y0, x1, y1 = seg
+    s0, s1 = sign * _side(line, x0, y0), sign * _side(line, x1, y1)
+    if s0 >= -ON_EPSILON and s1 >= -ON_EPSILON:
+        return seg
+    if s0 < -ON_EPSILON and s1 < -ON_EPSILON:
+        return None
+    t = (-ON_EPSILON - s0) / (s1 - s0)
+    x, y = x0 + (x1 - x0) * t, y0 + (y1 - y0) * t
+    return (x, y, x1, y1) if s0 < -ON_EPSILON else (x0, y0, x, y)
+
+def _clip_to_separators(source : Segment, pass_seg : Segment, target : Segment) -> Optional[Segment]:
+    # Like ClipToSeperators in vis: a line through an end of source and an end
+    # of pass_seg with the two on opposite sides is crossed between them by every
+    # sight line through both, so past pass_seg those stay on its side of it.
+    for sx, sy in (source[:2], source[2:]):
+        for px, py in (pass_seg[:2], pass_seg[2:]):
+            line = _line_through(sx, sy, px, py)
+            if line is None:
+                continue
+            source_sides = (_side(line, *source[:2]), _side(line, *source[2:]))
+            pass_sides = (_side(line, *pass_seg[:2]), _side(line, *pass_seg[2:]))
+            # Everything on the line says nothing about which side to keep.
+            if max(map(abs, source_sides + pass_sides)) <= SIDE_EPSILON:
+                continue
+            if max(source_sides) <= SIDE_EPSILON and min(pass_sides) >= -SIDE_EPSILON:
+                target = _clip_segment(target, line, 1.0)
+            elif min(source_sides) >= -SIDE_EPSILON and max(pass_sides) <= SIDE_EPSILON:
+                target = _clip_segment(target, line, -1.0)
+            else:
+                continue
+            if target is None:
+                return None
+    return target
+
+def _base_vis(portals : List[Portal], leaf_portals : List[List[int]]) -> List[int]:
+    # Like BasePortalVis: leaves reachable from each portal through portals at
+    # least partly in front of it that it is at least partly behind. A cheap
+    # upper bound the exact flow only ever narrows.
+    n = len(portals)
+    if n == 0:
+        return []
+    ends = np.array([p.seg for p in portals]).reshape(n, 2, 2)
+    lines = np.array([p.line for p in portals])
+
+    might : List[int] = []
+    block = max(1, BLOCK_PAIRS // n)
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        # Ends of every portal against the lines of this block's portals, and
+        # this block's ends against every line.
+        target_sides = np.einsum('id,jkd->ijk', lines[start:stop, :2], ends) + lines[start:stop, 2, None, None]
+        source_sides = np.einsum('jd,ikd->ijk', lines[:, :2], ends[start:stop]) + lines[None, :, 2, None]
+        front = ((target_sides > ON_EPSILON).any(axis=2) & (source_sides < -ON_EPSILON).any(axis=2)).tolist()
+
+        for i in range(start, stop):
+            seen = 1 << portals[i].to_leaf
+            stack = [portals[i].to_leaf]
+            front_i = front[i - start]
+            while stack:
+                for j in leaf_portals[stack.pop()]:
+                    to_leaf = portals[j].to_leaf
+                    if front_i[j] and not seen >> to_leaf & 1:
+                        seen |= 1 << to_leaf
+                        stack.append(to_leaf)
+            might.append(seen)
+    return might
+
+def _portal_flow(source_index : int, portals : List[Portal], leaf_portals : List[List[int]], might : List[int]) -> int:
+    # Like PortalFlow: follows every chain of portals a straight line through
+    # the source portal could pass, narrowing the source and each next portal
+    # to what such lines can still reach. Returns the leaves reached.
+    source = portals[source_index]
+    vis = 0
+    # No line through the source portal comes back to the leaf it was looked through from.
+    stack = [(source.to_leaf, source.seg, None, might[source_index], 1 << source.to_leaf | 1 << source.from_leaf)]
+    while stack:
+        leaf, source_seg, pass_seg, leaf_might, path = stack.pop()
+        vis |= 1 << leaf
+        for j in leaf_portals[leaf]:
+            portal = portals[j]
+            to_leaf = portal.to_leaf
+            # A line crosses a convex leaf once, and only leaves might lets through are worth the clipping.
+            if path >> to_leaf & 1 or not leaf_might >> to_leaf & 1:
+                continue
+            next_might = leaf_might & might[j]
+            if vis >> to_leaf & 1 and not next_might & ~vis:
+                continue
+
+            target = _clip_segment(portal.seg, source.line, 1.0)
+            if target is None:
+                continue
+            next_source = source_seg
+            if pass_seg is not None:
+                target = _clip_to_separators(source_seg, pass_seg, target)
+                if target is None:
+                    continue
+                next_source = _clip_to_separators(target, pass_seg, source_seg)
+                if next_source is None:
+                    continue
+            stack.append((to_leaf, next_source, target, next_might, path | 1 << to_leaf))
+    return vis
+
+def build_pvs(arrays : Dict[str, np.ndarray]) -> np.ndarray:
+    # For every subsector, a bitset of the subsectors a straight line from
+    # anywhere in it could reach through open boundaries, ignoring heights.
+    # Rows are packed like REJECT, little bit first.
+    n_leaves = len(arrays['ssectors'])
+    polygons = _leaf_polygons(arrays)
+    portals = _build_portals(arrays, polygons)
+    leaf_portals : List[List[int]] = [[] for _ in range(n_leaves)]
+    for i, portal in enumerate(portals):
+        leaf_portals[portal.from_leaf].append(i)
+
+    might = _base_vis(portals, leaf_portals)
+    portal_vis = [_portal_flow(i, portals, leaf_portals, might) for i in range(len(portals))]
+
+    visible = np.eye(n_leaves, dtype=bool)
+    for leaf in range(n_leaves):
+        bits = 0
+        for i in leaf_portals[leaf]:
+            bits |= portal_vis[i]
+        if bits:
+            row = np.frombuffer(bits.to_bytes((n_leaves + 7) // 8, 'little'), dtype=np.uint8)
+            visible[leaf] |= np.unpackbits(row, count=n_leaves, bitorder='little').astype(bool)
+
+    # Leaves too thin to have portals are kept visible both ways, and sight
+    # goes both ways whatever rounding did to either direction.
+    degenerate = [i for i, (points, _) in enumerate(polygons) if len(points) < 3 or _polygon_area(points) < MIN_AREA]
+    visible[degenerate, :] = True
+    visible[:, degenerate] = True
+    visible |= visible.T
+    return np.packbits(visible, axis=1, bitorder='little')
@@ -0,0 +1,208 @@
+import json
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, TextIO
+
+from pygame import Surface
+from pygame.font import Font
+
+import bsp.bsp_map as bsp_map
+from bsp.wall_clip import ClipRanges
+
+COUNTERS = ('nodes_visited', 'pvs_rejected', 'bboxes_rejected', 'backfaces_culled',
+    'segs_projected', 'clip_fragments', 'columns_drawn', 'visplanes', 'vissprites')
+STAGES = ('traversal', 'projection', 'clipping', 'drawing', 'planes', 'sprites')
+
+FrameRecord = Dict[str, float]
+
+class RenderStats:
+    def __init__(self, history : int = 120, trace_path : Optional[str] = None) -> None:
+        self.frame_index = 0
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.stage_times = dict.fromkeys(STAGES, 0.0)
+        self.history : Deque[FrameRecord] = deque(maxlen=history)
+        self.trace : Optional[TextIO] = open(trace_path, 'w') if trace_path else None
+
+    def begin_frame(self):
+        for name in COUNTERS:
+            self.counters[name] = 0
+        for stage in STAGES:
+            self.stage_times[stage] = 0.0
+
+    def end_frame(self, frame_time : float):
+        record : FrameRecord = {'frame': self.frame_index, 'frame_ms': frame_time * 1000}
+        record.update(self.counters)
+        for stage, t in self.stage_times.items():
+            record[stage + '_ms'] = t * 1000
+        self.history.append(record)
+        if self.trace is not None:
+            self.trace.write(json.dumps(record) + '\n')
+        self.frame_index += 1
+
+    def add_strips(self, frame_time : float, records : List[FrameRecord]):
+        # A frame drawn by strip workers, each counting its own strip. Stage
+        # times add up across them, the time the workers spent in total.
+        self.begin_frame()
+        for record in records:
+            for name in COUNTERS:
+                self.counters[name] += record[name]
+            for stage in STAGES:
+                self.stage_times[stage] += record[stage + '_ms'] / 1000
+        self.end_frame(frame_time)
+
+    def latest(self) -> Optional[FrameRecord]:
+        return self.history[-1] if self.history else None
+
+    def mean(self, key : str) -> float:
+        if not self.history:
+            return 0.0
+        return sum(r[key] for r in self.history) / len(self.history)
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+# The renderer is instrumented by swapping in wrapped functions, so nothing
+# is counted or timed, and nothing costs anything, while stats are disabled.
+_active : Optional[RenderStats] = None
+_originals : Dict[str, Callable] = {}
+_clip_originals : Dict[str, Callable] = {}
+
+def _wrap_frame(fn : Callable, stats : RenderStats) -> Callable:
+    def wrapper(*args, **kwargs):
+        stats.begin_frame()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        stats.end_frame(time.perf_counter() - start)
+        return result
+    return wrapper
+
+def _wrap_timed(fn : Callable, stage : str, stats : RenderStats, count : Optional[Callable] = None) -> Callable:
+    stage_times, counters = stats.stage_times, stats.counters
+    def wrapper(*args):
+        start = time.perf_counter()
+        result = fn(*args)
+        stage_times[stage] += time.perf_counter() - start
+        if count is not None:
+            count(counters, args, result)
+        return result
+    return wrapper
+
+def _wrap_counted(fn : Callable, count : Callable, stats : RenderStats) -> Callable:
+    counters = stats.counters
+    def wrapper(*args):
+        result = fn(*args)
+        count(counters, args, result)
+        return result
+    return wrapper
+
+def _wrap_traversal(fn : Callable, stats : RenderStats) -> Callable:
+    # Only the time spent finding each subsector counts, not rendering it.
+    stage_times = stats.stage_times
+    def wrapper(*args) -> Iterator[int]:
+        it = fn(*args)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                stage_times['traversal'] += time.perf_counter() - start
+                return
+            stage_times['traversal'] += time.perf_counter() - start
+            yield item
+    return wrapper
+
+def _count_node(counters, args, result):
+    counters['nodes_visited'] += 1
+
+def _count_pvs(counters, args, result):
+    if not result:
+        counters['pvs_rejected'] += 1
+
+def _count_bbox(counters, args, result):
+    if not result:
+        counters['bboxes_rejected'] += 1
+
+def _count_backface(counters, args, result):
+    if result:
+        counters['backfaces_culled'] += 1
+
+def _count_projected(counters, args, result):
+    if result is not None:
+        counters['segs_projected'] += 1
+
+def _count_fragments(counters, args, result):
+    counters['clip_fragments'] += len(result)
+
+def _count_columns(counters, args, result):
+    counters['columns_drawn'] += args[2] - args[1]
+
+def _count_visplanes(counters, args, result):
+    counters['visplanes'] += len(bsp_map._view.visplanes.planes)
+
+def _count_vissprites(counters, args, result):
+    counters['vissprites'] += len(result)
+
+def enable(history : int = 120, trace_path : Optional[str] = None) -> RenderStats:
+    global _active
+    disable()
+    stats = RenderStats(history, trace_path)
+
+    wrapped = {
+        'render_player_view': _wrap_frame(bsp_map.render_player_view, stats),
+        '_visible_subsectors': _wrap_traversal(bsp_map._visible_subsectors, stats),
+        '_on_right_side': _wrap_counted(bsp_map._on_right_side, _count_node, stats),
+        '_in_pvs': _wrap_counted(bsp_map._in_pvs, _count_pvs, stats),
+        '_check_bbox': _wrap_counted(bsp_map._check_bbox, _count_bbox, stats),
+        '_is_backface': _wrap_counted(bsp_map._is_backface, _count_backface, stats),
+        '_project_seg': _wrap_timed(bsp_map._project_seg, 'projection', stats, _count_projected),
+        '_seg_to_screen_coord': _wrap_timed(bsp_map._seg_to_screen_coord, 'projection', stats),
+        '_draw_wall_columns': _wrap_timed(bsp_map._draw_wall_columns, 'drawing', stats, _count_columns),
+        '_draw_planes': _wrap_timed(bsp_map._draw_planes, 'planes', stats, _count_visplanes),
+        '_project_sprites': _wrap_timed(bsp_map._project_sprites, 'sprites', stats, _count_vissprites),
+        '_draw_sprites': _wrap_timed(bsp_map._draw_sprites, 'sprites', stats),
+    }
+    for name, fn in wrapped.items():
+        _originals[name] = getattr(bsp_map, name)
+        setattr(bsp_map, name, fn)
+
+    # Wrapped on the class, so the clip ranges of every renderer are counted.
+    for name in ('clip_solid_wall', 'clip_window_wall'):
+        _clip_originals[name] = getattr(ClipRanges, name)
+        setattr(ClipRanges, name, _wrap_timed(_clip_originals[name], 'clipping', stats, _count_fragments))
+
+    _active = stats
+    return stats
+
+def disable():
+    global _active
+    if _active is None:
+        return
+    for name, fn in _originals.items():
+        setattr(bsp_map, name, fn)
+    _originals.clear()
+    for name, fn in _clip_originals.items():
+        setattr(ClipRanges, name, fn)
+    _clip_originals.clear()
+    _active.close()
+    _active = None
+
+def active() -> Optional[RenderStats]:
+    return _active
+
+def overlay_lines(stats : RenderStats) -> List[str]:
+    record = stats.latest()
+    if record is None:
+        return []
+    lines = ['frame %.2f ms (avg %.2f)' % (record['frame_ms'], stats.mean('frame_ms'))]
+    lines += ['%s %.2f ms' % (stage, record[stage + '_ms']) for stage in STAGES]
+    lines += ['%s %d' % (name.replace('_', ' '), record[name]) for name in COUNTERS]
+    return lines
+
+def draw_overlay(surface : Surface, font : Font, stats : RenderStats, color=(255, 255, 0)):
+    y = 4
+    for line in overlay_lines(stats):
+        text = font.render(line, True, color)
+        surface.blit(text, (4, y))
+        y += text.get_height()
@@ -0,0 +1,101 @@
+from typing import Set
+
+import numpy as np
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bsp import point_location
+from bsp.point_location import SUBSECTOR_FLAG
+from utils.math_utils import line_intersection
+
+def is_rejected(from_sector : int, to_sector : int) -> bool:
+    bit = from_sector * len(bsp_map.sectors) + to_sector
+    return bool(bsp_map.reject[bit >> 3] & (1 << (bit & 7)))
+
+def _side(x : float, y : float, x0 : float, y0 : float, dx : float, dy : float) -> float:
+    return (x - x0) * dy - (y - y0) * dx
+
+def _seg_blocks_sight(seg_index : int, p0 : Vector2, p1 : Vector2, z0 : float, z1 : float, checked : Set[int]) -> bool:
+    seg = bsp_map.segs[seg_index]
+    if seg.linedef in checked:
+        return False
+    checked.add(seg.linedef)
+
+    linedef = bsp_map.linedefs[seg.linedef]
+    v0 = bsp_map.vertexes[linedef.start_vert]
+    v1 = bsp_map.vertexes[linedef.end_vert]
+
+    # The sight line and the linedef have to straddle each other to cross.
+    sight_dx, sight_dy = p1.x - p0.x, p1.y - p0.y
+    if (_side(v0.x, v0.y, p0.x, p0.y, sight_dx, sight_dy) > 0) == (_side(v1.x, v1.y, p0.x, p0.y, sight_dx, sight_dy) > 0):
+        return False
+    line_dx, line_dy = v1.x - v0.x, v1.y - v0.y
+    if (_side(p0.x, p0.y, v0.x, v0.y, line_dx, line_dy) > 0) == (_side(p1.x, p1.y, v0.x, v0.y, line_dx, line_dy) > 0):
+        return False
+
+    if linedef.back_sidedef == -1:
+        return True
+    front = bsp_map.sectors[bsp_map.sidedefs[linedef.front_sidedef].sector]
+    back = bsp_map.sectors[bsp_map.sidedefs[linedef.back_sidedef].sector]
+    if front.floor_height == back.floor_height and front.ceiling_height == back.ceiling_height:
+        return False
+
+    open_bottom = max(front.floor_height, back.floor_height)
+    open_top = min(front.ceiling_height, back.ceiling_height)
+    if open_bottom >= open_top:
+        return True
+    frac = (line_intersection(p0, p1, v0, v1) - p0).length() / (p1 - p0).length()
+    z = z0 + (z1 - z0) * frac
+    return not open_bottom < z < open_top
+
+def _exact_sight(p0 : Vector2, p1 : Vector2, z0 : float, z1 : float) -> bool:
+    # Like P_CrossBSPNode: follow the sight line down both sides of every
+    # partition it crosses and test the segs of the subsectors it reaches.
+    tables, geometry = bsp_map.locator, bsp_map.geometry
+    checked : Set[int] = set()
+    stack = [tables.root]
+    while stack:
+        node_index = stack.pop()
+        if node_index & SUBSECTOR_FLAG:
+            subsector = bsp_map.ssectors[node_index ^ SUBSECTOR_FLAG]
+            for seg_index in range(subsector.start_seg, subsector.start_seg + subsector.n_segs):
+                if _seg_blocks_sight(seg_index, p0, p1, z0, z1, checked):
+                    return False
+            continue
+
+        node_x, node_y = geometry.node_x[node_index], geometry.node_y[node_index]
+        normal_x, normal_y = geometry.node_normal_x[node_index], geometry.node_normal_y[node_index]
+        left0 = (p0.x - node_x) * normal_x + (p0.y - node_y) * normal_y > 0
+        left1 = (p1.x - node_x) * normal_x + (p1.y - node_y) * normal_y > 0
+        if left0 == left1:
+            stack.append(tables.left_child[node_index] if left0 else tables.right_child[node_index])
+        else:
+            stack.append(tables.left_child[node_index])
+            stack.append(tables.right_child[node_index])
+    return True
+
+def check_sight(p0 : Vector2, z0 : float, p1 : Vector2, z1 : float) -> bool:
+    # True when a line from (p0, z0) to (p1, z1) passes no wall, floor or ceiling.
+    tables = bsp_map.locator
+    subsector0 = bsp_map.subsector_search(p0)
+    subsector1 = bsp_map.subsector_search(p1)
+    if is_rejected(tables.subsector_sector[subsector0], tables.subsector_sector[subsector1]):
+        return False
+    if p0 == p1:
+        return True
+    return _exact_sight(p0, p1, z0, z1)
+
+def check_sight_batch(from_points : np.ndarray, to_points : np.ndarray) -> np.ndarray:
+    # Points are (x, y, z) rows. REJECT settles pairs for the whole batch at
+    # once, only the pairs it lets through walk the BSP one by one.
+    tables = bsp_map.locator
+    from_subsectors = point_location.locate_subsectors(tables, from_points)
+    to_subsectors = point_location.locate_subsectors(tables, to_points)
+    subsector_sector = np.frombuffer(tables.subsector_sector, dtype=np.int64)
+    bits = subsector_sector[from_subsectors] * len(bsp_map.sectors) + subsector_sector[to_subsectors]
+    visible = (bsp_map.reject[bits >> 3] & (1 << (bits & 7))) == 0
+
+    exact = np.flatnonzero(visible & (from_points[:, :2] != to_points[:, :2]).any(axis=1))
+    for i, (x0, y0, z0), (x1, y1, z1) in zip(exact.tolist(), from_points[exact].tolist(), to_points[exact].tolist()):
+        visible[i] = _exact_sight(Vector2(x0, y0), Vector2(x1, y1), z0, z1)
+    return visible
@@ -0,0 +1,177 @@
+import math
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from pygame import Vector2
+
+from wad.d_types import IndexedPatch, Thing
+from bsp.lighting import LightTables, light_index, scale_colormap
+from bsp.projection import ProjectionTables
+
+# Sprite and frame of each thing type's spawn state, like mobjinfo in info.c.
+THING_SPRITES : Dict[int, Tuple[str, str]] = {
+    # Monsters
+    3004: ('POSS', 'A'), 9: ('SPOS', 'A'), 65: ('CPOS', 'A'), 3001: ('TROO', 'A'),
+    3002: ('SARG', 'A'), 58: ('SARG', 'A'), 3006: ('SKUL', 'A'), 3005: ('HEAD', 'A'),
+    3003: ('BOSS', 'A'), 69: ('BOS2', 'A'), 68: ('BSPI', 'A'), 71: ('PAIN', 'A'),
+    66: ('SKEL', 'A'), 67: ('FATT', 'A'), 64: ('VILE', 'A'), 84: ('SSWV', 'A'),
+    16: ('CYBR', 'A'), 7: ('SPID', 'A'), 72: ('KEEN', 'A'),
+    # Weapons and ammo
+    2001: ('SHOT', 'A'), 82: ('SGN2', 'A'), 2002: ('MGUN', 'A'), 2003: ('LAUN', 'A'),
+    2004: ('PLAS', 'A'), 2005: ('CSAW', 'A'), 2006: ('BFUG', 'A'), 2007: ('CLIP', 'A'),
+    2048: ('AMMO', 'A'), 2008: ('SHEL', 'A'), 2049: ('SBOX', 'A'), 2010: ('ROCK', 'A'),
+    2046: ('BROK', 'A'), 2047: ('CELL', 'A'), 17: ('CELP', 'A'), 8: ('BPAK', 'A'),
+    # Health, armor, powerups and keys
+    2011: ('STIM', 'A'), 2012: ('MEDI', 'A'), 2014: ('BON1', 'A'), 2015: ('BON2', 'A'),
+    2018: ('ARM1', 'A'), 2019: ('ARM2', 'A'), 2013: ('SOUL', 'A'), 83: ('MEGA', 'A'),
+    2022: ('PINV', 'A'), 2023: ('PSTR', 'A'), 2024: ('PINS', 'A'), 2025: ('SUIT', 'A'),
+    2026: ('PMAP', 'A'), 2045: ('PVIS', 'A'), 5: ('BKEY', 'A'), 6: ('YKEY', 'A'),
+    13: ('RKEY', 'A'), 40: ('BSKU', 'A'), 39: ('YSKU', 'A'), 38: ('RSKU', 'A'),
+    # Obstacles and decorations
+    2035: ('BAR1', 'A'), 48: ('ELEC', 'A'), 30: ('COL1', 'A'), 31: ('COL2', 'A'),
+    32: ('COL3', 'A'), 33: ('COL4', 'A'), 36: ('COL5', 'A'), 37: ('COL6', 'A'),
+    47: ('SMIT', 'A'), 43: ('TRE1', 'A'), 54: ('TRE2', 'A'), 34: ('CAND', 'A'),
+    35: ('CBRA', 'A'), 44: ('TBLU', 'A'), 45: ('TGRN', 'A'), 46: ('TRED', 'A'),
+    55: ('SMBT', 'A'), 56: ('SMGT', 'A'), 57: ('SMRT', 'A'), 2028: ('COLU', 'A'),
+    41: ('CEYE', 'A'), 42: ('FSKU', 'A'), 10: ('PLAY', 'W'), 15: ('PLAY', 'N'),
+}
+
+# THINGS flags: present on "hurt me plenty", and only present in multiplayer.
+MTF_NORMAL = 2
+MTF_NOTSINGLE = 16
+
+# Things closer than this to the view plane are not drawn, like MINZ.
+MIN_Z = 4.0
+
+# One (lump name, mirrored) per rotation, rotation 1 faces the viewer.
+SpriteFrame = List[Tuple[str, bool]]
+
+class DrawSeg(NamedTuple):
+    first_col : int
+    last_col : int
+    one_over_z0 : float
+    one_over_z_step : float
+    # Rows left open by this wall and everything in front of it, None for solid walls.
+    top_clip : Optional[np.ndarray]
+    bottom_clip : Optional[np.ndarray]
+
+class VisSprite(NamedTuple):
+    first_col : int
+    last_col : int
+    one_over_z : float
+    # Texture column at the centre of first_col and texture columns per screen column.
+    tex_x_start : float
+    tex_x_step : float
+    flip : bool
+    # Screen row of the patch's top edge and screen rows per texel.
+    y_top : float
+    y_scale : float
+    patch : IndexedPatch
+    colormap : np.ndarray
+
+def build_sprite_frames(sprite_lumps : Dict[str, Tuple[int, int]]) -> Dict[str, SpriteFrame]:
+    # Like R_InitSpriteDefs: NAMEfr or NAMEfrFR, where r is 0 for all rotations
+    # and the second frame/rotation pair is drawn mirrored.
+    rotations : Dict[str, List[Optional[Tuple[str, bool]]]] = {}
+    for name in sprite_lumps:
+        for i in ((4, 6) if len(name) >= 8 else (4,)):
+            if not name[i + 1:i + 2].isdigit():
+                continue
+            frame = rotations.setdefault(name[:4] + name[i], [None] * 8)
+            rotation = int(name[i + 1])
+            if rotation == 0:
+                frame[:] = [(name, False)] * 8
+            elif rotation <= 8:
+                frame[rotation - 1] = (name, i == 6)
+
+    frames : Dict[str, SpriteFrame] = {}
+    for key, frame in rotations.items():
+        present = [r for r in frame if r is not None]
+        frames[key] = [r if r is not None else present[0] for r in frame]
+    return frames
+
+def is_drawn(thing_type : int, flags : int, frames : Dict[str, SpriteFrame]) -> bool:
+    if thing_type not in THING_SPRITES or flags & MTF_NOTSINGLE or not flags & MTF_NORMAL:
+        return False
+    return ''.join(THING_SPRITES[thing_type]) in frames
+
+def project_thing(thing : Thing, floor_height : int, light_level : int, pos : Vector2, angle : float, eye_z : float,
+        frames : Dict[str, SpriteFrame], get_patch : Callable[[str], IndexedPatch],
+        projection : ProjectionTables, lights : LightTables, vfov : float, height : int) -> Optional[VisSprite]:
+    # Like R_ProjectSprite.
+    dx, dy = thing.position.x - pos.x, thing.position.y - pos.y
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    z = dx * cos_a + dy * sin_a
+    if z < MIN_Z:
+        return None
+    one_over_z = 1 / z
+
+    # Pick the rotation from the angle the viewer sees the thing at.
+    rotation = int(((math.atan2(dy, dx) - math.radians(thing.angle) + math.pi / 8 * 9) % (2 * math.pi)) // (math.pi / 4)) & 7
+    lump, flip = frames[''.join(THING_SPRITES[thing.thing_type])][rotation]
+    patch = get_patch(lump)
+    tex_w = patch.pixels.shape[0]
+
+    x_scale = projection.width / 2 / math.tan(projection.clip_angle) * one_over_z
+    center_x = projection.width / 2 - (dy * cos_a - dx * sin_a) * x_scale
+    x0 = center_x - patch.left_offset * x_scale
+    first_col = max(math.ceil(x0 - 0.5), 0)
+    last_col = min(math.ceil(x0 + tex_w * x_scale - 0.5), projection.width)
+    if last_col <= first_col:
+        return None
+
+    y_scale = vfov * one_over_z
+    y_top = height / 2 - y_scale * (floor_height + patch.top_offset - eye_z)
+    return VisSprite(first_col, last_col, one_over_z,
+        (first_col + 0.5 - x0) / x_scale, 1 / x_scale, flip, y_top, y_scale, patch,
+        scale_colormap(lights, light_index(light_level), one_over_z))
+
+def _sprite_clip(vis : VisSprite, draw_segs : List[DrawSeg], height : int) -> Tuple[np.ndarray, np.ndarray]:
+    # Like R_DrawSprite: only walls nearer than the sprite in a column clip it there.
+    n_cols = vis.last_col - vis.first_col
+    clip_top = np.zeros(n_cols, dtype=np.intp)
+    clip_bottom = np.full(n_cols, height, dtype=np.intp)
+    for ds in draw_segs:
+        first, last = max(ds.first_col, vis.first_col), min(ds.last_col, vis.last_col)
+        if last <= first:
+            continue
+        cols = np.arange(first - ds.first_col, last - ds.first_col)
+        nearer = ds.one_over_z0 + cols * ds.one_over_z_step > vis.one_over_z
+        if not nearer.any():
+            continue
+        vis_cols = slice(first - vis.first_col, last - vis.first_col)
+        if ds.top_clip is None:
+            clip_top[vis_cols][nearer] = height
+        else:
+            top, bottom = ds.top_clip[cols], ds.bottom_clip[cols]
+            clip_top[vis_cols] = np.where(nearer, np.maximum(clip_top[vis_cols], top), clip_top[vis_cols])
+            clip_bottom[vis_cols] = np.where(nearer, np.minimum(clip_bottom[vis_cols], bottom), clip_bottom[vis_cols])
+    return clip_top, clip_bottom
+
+def draw_vissprites(frame_buffer : np.ndarray, vissprites : List[VisSprite], draw_segs : List[DrawSeg],
+        first_col : int, last_col : int):
+    height = frame_buffer.shape[1]
+    # Far to near, so nearer sprites overdraw farther ones.
+    for vis in sorted(vissprites, key=lambda v: v.one_over_z):
+        clip_top, clip_bottom = _sprite_clip(vis, draw_segs, height)
+        pixels, mask = vis.patch.pixels, vis.patch.mask
+        tex_w, tex_h = pixels.shape
+
+        # Texture rows are the same for every column of the sprite.
+        y_top = max(math.ceil(vis.y_top - 0.5), 0)
+        y_bottom = min(math.ceil(vis.y_top + tex_h * vis.y_scale - 0.5), height)
+        if y_bottom <= y_top:
+            continue
+        tex_rows = np.minimum(((np.arange(y_top, y_bottom) + 0.5 - vis.y_top) / vis.y_scale).astype(np.intp), tex_h - 1)
+
+        for i in range(max(vis.first_col, first_col) - vis.first_col, min(vis.last_col, last_col) - vis.first_col):
+            top = max(y_top, clip_top[i])
+            bottom = min(y_bottom, clip_bottom[i])
+            if bottom <= top:
+                continue
+            tex_x = min(int(vis.tex_x_start + i * vis.tex_x_step), tex_w - 1)
+            if vis.flip:
+                tex_x = tex_w - 1 - tex_x
+            rows = tex_rows[top - y_top:bottom - y_top]
+            opaque = mask[tex_x, rows]
+            frame_buffer[vis.first_col + i, top:bottom][opaque] = vis.colormap[pixels[tex_x, rows[opaque]]]
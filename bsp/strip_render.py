@@ -0,0 +1,150 @@
+import os
+import time
+import tempfile
+import multiprocessing as mp
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Optional, Tuple
+
+import numpy as np
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bsp import render_stats
+from entities.player import Player
+from utils.defs import RES_WIDTH, RES_HEIGHT
+from wad.reader import WadFile
+
+PlayerState = Tuple[float, float, float, float, int, int]
+
+def _player_state(player : Player) -> PlayerState:
+    return (player.pos.x, player.pos.y, player.angle, player.fov, player.head_height, player.foot_pos)
+
+def _player_from_state(state : PlayerState) -> Player:
+    x, y, angle, fov, head_height, foot_pos = state
+    player = Player(Vector2(x, y), angle, fov, head_height)
+    player.update_foot_pos(foot_pos)
+    return player
+
+def _attach_frame(shm_name : str, width : int, height : int) -> Tuple[SharedMemory, np.ndarray]:
+    shm = SharedMemory(shm_name)
+    return shm, np.ndarray((width, height), dtype=np.uint8, buffer=shm.buf)
+
+def _strip_worker(conn : Connection, wad_path : str, map_name : str, cache_dir : str, shm_name : str,
+        width : int, height : int, first_col : int, last_col : int):
+    wad = WadFile(wad_path)
+    bsp_map.init_bsp_map(wad, wad.info_table, map_name, cache_dir)
+    shm, frame = _attach_frame(shm_name, width, height)
+    renderer = bsp_map.Renderer(width, height, frame)
+    conn.send(True)
+
+    # Messages are a player state to render with whether to count it, a new
+    # resolution and strip, or None to stop. Counted frames answer with their stats.
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        if msg[0] == 'resize':
+            _, shm_name, width, height, first_col, last_col = msg
+            renderer.frame_buffer = frame = None
+            shm.close()
+            shm, frame = _attach_frame(shm_name, width, height)
+            renderer.set_resolution(width, height, frame)
+            conn.send(True)
+        else:
+            _, state, counted = msg
+            if counted and render_stats.active() is None:
+                render_stats.enable(history=1)
+            elif not counted:
+                render_stats.disable()
+            bsp_map.render_player_view(_player_from_state(state), first_col, last_col, renderer)
+            conn.send(render_stats.active().latest() if counted else True)
+
+    renderer.frame_buffer = frame = None
+    shm.close()
+
+def strip_bounds(n_strips : int, width : int = RES_WIDTH) -> List[Tuple[int, int]]:
+    edges = [round(i * width / n_strips) for i in range(n_strips + 1)]
+    return list(zip(edges[:-1], edges[1:]))
+
+class StripRenderer:
+    # Renders each frame as vertical column strips, one worker process per strip.
+    # Every worker traverses the BSP with the columns outside its strip already
+    # clipped away and draws straight into a framebuffer in shared memory.
+    def __init__(self, wad_path : str, map_name : str, n_workers : Optional[int] = None, cache_dir : Optional[str] = None,
+            width : int = RES_WIDTH, height : int = RES_HEIGHT) -> None:
+        if n_workers is None:
+            n_workers = os.cpu_count() or 1
+
+        # Workers map one cache file instead of each parsing the WAD.
+        self._tmp_dir = None
+        if cache_dir is None:
+            self._tmp_dir = tempfile.TemporaryDirectory()
+            cache_dir = self._tmp_dir.name
+        wad = WadFile(wad_path)
+        bsp_map.load_map_arrays(wad, wad.info_table, map_name, cache_dir)
+        wad.close()
+
+        self._create_frame(width, height)
+        self.strips = strip_bounds(n_workers, width)
+
+        ctx = mp.get_context('spawn')
+        self._conns : List[Connection] = []
+        self._workers = []
+        for first_col, last_col in self.strips:
+            conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(target=_strip_worker, daemon=True,
+                args=(child_conn, wad_path, map_name, cache_dir, self._shm.name, width, height, first_col, last_col))
+            worker.start()
+            self._conns.append(conn)
+            self._workers.append(worker)
+        for conn in self._conns:
+            conn.recv()
+
+    def _create_frame(self, width : int, height : int):
+        self._shm = SharedMemory(create=True, size=width * height)
+        self.frame = np.ndarray((width, height), dtype=np.uint8, buffer=self._shm.buf)
+
+    def set_resolution(self, width : int, height : int):
+        # Workers drop the old framebuffer before it is unlinked.
+        old_shm = self._shm
+        self._create_frame(width, height)
+        self.strips = strip_bounds(len(self._conns), width)
+        for conn, (first_col, last_col) in zip(self._conns, self.strips):
+            conn.send(('resize', self._shm.name, width, height, first_col, last_col))
+        for conn in self._conns:
+            conn.recv()
+        old_shm.close()
+        old_shm.unlink()
+
+    def render(self, player : Player) -> np.ndarray:
+        # While render_stats is enabled here, the workers count their strips for it.
+        stats = render_stats.active()
+        start = time.perf_counter()
+        msg = ('render', _player_state(player), stats is not None)
+        for conn in self._conns:
+            conn.send(msg)
+        records = [conn.recv() for conn in self._conns]
+        if stats is not None:
+            stats.add_strips(time.perf_counter() - start, records)
+        return self.frame
+
+    def close(self):
+        for conn in self._conns:
+            conn.send(None)
+        for worker in self._workers:
+            worker.join()
+        self._conns.clear()
+        self._workers.clear()
+
+        self.frame = None
+        self._shm.close()
+        self._shm.unlink()
+        if self._tmp_dir is not None:
+            self._tmp_dir.cleanup()
+
+    def __enter__(self) -> 'StripRenderer':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from wad.d_types import IndexedPatch, WadTexture
+from wad.reader import WadFile, read_flat, read_indexed_patch, read_patch_names, read_playpal, read_textures
+from bsp.map_cache import IndexedTexture, wad_digest
+from bsp.mipmap import MipChain, build_mip_chain, build_rgb_lookup
+
+DEFAULT_BUDGET = 16 << 20
+
+# (kind, name) where kind is 'mips', 'flat', 'patch' or 'sprite'.
+CacheKey = Tuple[str, str]
+CacheEntry = Union[np.ndarray, IndexedPatch, MipChain]
+
+def _entry_bytes(entry : CacheEntry) -> int:
+    if isinstance(entry, IndexedPatch):
+        return entry.pixels.nbytes + entry.mask.nbytes
+    if isinstance(entry, list):
+        return sum(level.nbytes for level in entry)
+    return entry.nbytes
+
+class TextureManager:
+    # Wall textures, flats and the patches and sprites they are drawn from,
+    # loaded on first use and kept under a byte budget, least recently used
+    # first out. Patches stay shared across maps of the same WAD.
+    def __init__(self, budget_bytes : int = DEFAULT_BUDGET) -> None:
+        self.budget_bytes = budget_bytes
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries : 'OrderedDict[CacheKey, CacheEntry]' = OrderedDict()
+
+        self._wad : Optional[WadFile] = None
+        self._wad_digest : Optional[str] = None
+        self._info_table : Dict = {}
+        self._p_names : List[str] = []
+        self._wad_textures : Dict[str, WadTexture] = {}
+        self._palette : Optional[np.ndarray] = None
+        self._rgb_lookup : Optional[np.ndarray] = None
+        # Already composited textures and flats of the current map, usually
+        # views of a memory mapped map cache.
+        self._map_textures : Dict[str, np.ndarray] = {}
+        self._map_flats : Dict[str, np.ndarray] = {}
+
+    def attach(self, wad : WadFile, info_table : Dict):
+        # Entries stay across maps of the same WAD contents, whatever its path.
+        digest = wad_digest(wad)
+        if digest != self._wad_digest:
+            self.clear()
+            self._wad_digest = digest
+            self._p_names = read_patch_names(wad, *info_table['PNAMES']) if 'PNAMES' in info_table else []
+            self._wad_textures = {}
+            for lump in ('TEXTURE1', 'TEXTURE2'):
+                if lump in info_table:
+                    self._wad_textures.update(read_textures(wad, *info_table[lump]))
+            self._palette = None
+            self._rgb_lookup = None
+            if 'PLAYPAL' in info_table:
+                self._palette = np.array(read_playpal(wad, *info_table['PLAYPAL'])[0], dtype=np.uint8)[:, :3]
+                self._rgb_lookup = build_rgb_lookup(self._palette)
+        self._wad = wad
+        self._info_table = info_table
+
+    def use_map_data(self, textures : Dict[str, np.ndarray], flats : Dict[str, np.ndarray]):
+        # Entries taken from the previous map's data stay until they age out.
+        self._map_textures = textures
+        self._map_flats = flats
+
+    def clear(self):
+        self._entries.clear()
+        self.resident_bytes = 0
+        self._map_textures = {}
+        self._map_flats = {}
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def set_budget(self, budget_bytes : int):
+        self.budget_bytes = budget_bytes
+        self._evict()
+
+    def _evict(self):
+        # The newest entry stays even when it alone is over budget.
+        while self.resident_bytes > self.budget_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self.resident_bytes -= _entry_bytes(entry)
+            self.evictions += 1
+
+    def _get(self, key : CacheKey, load : Callable[[], Optional[CacheEntry]]) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = load()
+        if entry is not None:
+            self._entries[key] = entry
+            self.resident_bytes += _entry_bytes(entry)
+            self._evict()
+        return entry
+
+    def has_texture(self, name : str) -> bool:
+        return name in self._wad_textures or name in self._map_textures
+
+    def mips(self, name : str) -> Optional[MipChain]:
+        # A wall texture and its mip levels, built together when it is loaded.
+        if not self.has_texture(name):
+            return None
+        return self._get(('mips', name), lambda: build_mip_chain(self._load_texture(name), self._palette, self._rgb_lookup))
+
+    def flat(self, name : str) -> Optional[np.ndarray]:
+        if name not in self._map_flats and name not in self._info_table.get('FLAT', {}):
+            return None
+        return self._get(('flat', name), lambda: self._load_flat(name))
+
+    def patch(self, name : str) -> IndexedPatch:
+        return self._get(('patch', name), lambda: read_indexed_patch(self._wad, *self._info_table['PATCH'][name]))
+
+    def sprite(self, name : str) -> IndexedPatch:
+        return self._get(('sprite', name), lambda: read_indexed_patch(self._wad, *self._info_table['SPRITE'][name]))
+
+    def _load_texture(self, name : str) -> np.ndarray:
+        if name in self._map_textures:
+            return np.array(self._map_textures[name])
+        return self.composite(name)[0]
+
+    def _load_flat(self, name : str) -> np.ndarray:
+        if name in self._map_flats:
+            return np.array(self._map_flats[name])
+        return read_flat(self._wad, *self._info_table['FLAT'][name])
+
+    def composite(self, name : str) -> IndexedTexture:
+        # Draws the texture's patches in order, later patches over earlier ones.
+        wad_tex = self._wad_textures[name]
+        pixels = np.zeros((wad_tex.width, wad_tex.height), dtype=np.uint8)
+        mask = np.zeros((wad_tex.width, wad_tex.height), dtype=bool)
+
+        for layout in wad_tex.layouts:
+            patch = self.patch(self._p_names[layout.p_number])
+            p_pixels, p_mask = patch.pixels, patch.mask
+
+            x0, y0 = max(layout.orginx, 0), max(layout.orginy, 0)
+            x1 = min(layout.orginx + p_pixels.shape[0], wad_tex.width)
+            y1 = min(layout.orginy + p_pixels.shape[1], wad_tex.height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            src = (slice(x0 - layout.orginx, x1 - layout.orginx), slice(y0 - layout.orginy, y1 - layout.orginy))
+            src_mask = p_mask[src]
+            pixels[x0:x1, y0:y1][src_mask] = p_pixels[src][src_mask]
+            mask[x0:x1, y0:y1] |= src_mask
+
+        return pixels, mask
+
+    def stats(self) -> Dict[str, int]:
+        kinds = [kind for kind, _ in self._entries]
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'resident_bytes': self.resident_bytes,
+            'budget_bytes': self.budget_bytes,
+            'mip_chains': kinds.count('mips'),
+            'flats': kinds.count('flat'),
+            'patches': kinds.count('patch'),
+            'sprites': kinds.count('sprite'),
+        }
@@ -0,0 +1,113 @@
+import math
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from bsp.lighting import LightTables, light_index, z_light_rows
+from bsp.projection import FRACBITS, FRACUNIT
+
+# Top of a column no wall has marked for a plane, like 0xff in visplane_t.
+UNSET = 0x7fff
+
+FLAT_SIZE = 64
+
+class PlaneTables(NamedTuple):
+    width : int
+    height : int
+    tan_half_fov : float
+    # Depth at each row's centre of a plane one unit above or below the eye, like yslope.
+    y_slope : np.ndarray
+
+class Visplane:
+    def __init__(self, height : int, flat_name : str, light_level : int, width : int) -> None:
+        self.height = height
+        self.flat_name = flat_name
+        self.light_level = light_level
+        # Marked columns are [first_col, last_col), empty until a wall marks some.
+        self.first_col = width
+        self.last_col = 0
+        self.top = [UNSET] * width
+        self.bottom = [0] * width
+
+PlaneKey = Tuple[int, str, int]
+
+class Visplanes:
+    def __init__(self, width : int) -> None:
+        self.width = width
+        self.planes : List[Visplane] = []
+        self._latest : Dict[PlaneKey, Visplane] = {}
+
+    def clear(self):
+        self.planes.clear()
+        self._latest.clear()
+
+    def _new_plane(self, key : PlaneKey) -> Visplane:
+        plane = Visplane(*key, self.width)
+        self.planes.append(plane)
+        self._latest[key] = plane
+        return plane
+
+    def find(self, height : int, flat_name : str, light_level : int) -> Visplane:
+        # Like R_FindPlane.
+        key = (height, flat_name, light_level)
+        plane = self._latest.get(key)
+        return plane if plane is not None else self._new_plane(key)
+
+    def check(self, plane : Visplane, first_col : int, last_col : int) -> Visplane:
+        # Like R_CheckPlane: a plane can take on the columns of a new wall
+        # range as long as none of the ones it already spans are marked.
+        overlap_first = max(first_col, plane.first_col)
+        overlap_last = min(last_col, plane.last_col)
+        if overlap_last <= overlap_first or \
+                plane.top[overlap_first:overlap_last].count(UNSET) == overlap_last - overlap_first:
+            plane.first_col = min(plane.first_col, first_col)
+            plane.last_col = max(plane.last_col, last_col)
+            return plane
+
+        plane = self._new_plane((plane.height, plane.flat_name, plane.light_level))
+        plane.first_col, plane.last_col = first_col, last_col
+        return plane
+
+def build_plane_tables(width : int, height : int, vfov : float, fov : float) -> PlaneTables:
+    row_offsets = np.abs(np.arange(height) + 0.5 - height / 2)
+    return PlaneTables(width, height, math.tan(fov / 2), vfov / np.maximum(row_offsets, 0.5))
+
+def draw_plane(frame_buffer : np.ndarray, plane : Visplane, flat : np.ndarray, tables : PlaneTables,
+        lights : LightTables, view_x : float, view_y : float, angle : float, eye_z : float):
+    first, last = plane.first_col, plane.last_col
+    top = np.array(plane.top[first:last])
+    bottom = np.array(plane.bottom[first:last])
+    y0, y1 = int(top.min()), int(bottom.max())
+    if y1 <= y0 or plane.height == eye_z:
+        return
+
+    # Like R_MapPlane for every row at once: the depth comes from the slope
+    # table, then each row's spans step in 16.16 fixed point from where the
+    # row's first column centre lands in the flat.
+    depth = abs(plane.height - eye_z) * tables.y_slope[y0:y1]
+    cos_a, sin_a = math.cos(angle), math.sin(angle)
+    col_step = 2 * tables.tan_half_fov / tables.width
+    left = tables.tan_half_fov - col_step / 2
+    u_start = ((view_x + depth * (cos_a - sin_a * left)) * FRACUNIT).astype(np.int64)
+    u_step = (depth * (sin_a * col_step * FRACUNIT)).astype(np.int64)
+    # Flat rows run towards -y, like ds_yfrac.
+    v_start = (-(view_y + depth * (sin_a + cos_a * left)) * FRACUNIT).astype(np.int64)
+    v_step = (depth * (cos_a * col_step * FRACUNIT)).astype(np.int64)
+    row_colormaps = z_light_rows(lights, light_index(plane.light_level), depth)
+
+    rows = np.arange(y0, y1)
+    cols, span_rows = np.nonzero((rows >= top[:, None]) & (rows < bottom[:, None]))
+    cols += first
+    u = u_start[span_rows] + cols * u_step[span_rows]
+    v = v_start[span_rows] + cols * v_step[span_rows]
+    frame_buffer[cols, span_rows + y0] = row_colormaps[span_rows, flat.ravel()[
+        ((v >> FRACBITS) & (FLAT_SIZE - 1)) * FLAT_SIZE + ((u >> FRACBITS) & (FLAT_SIZE - 1))]]
+
+def draw_planes(frame_buffer : np.ndarray, planes : List[Visplane], get_flat : Callable[[str], Optional[np.ndarray]],
+        tables : PlaneTables, lights : LightTables, view_x : float, view_y : float, angle : float, eye_z : float):
+    for plane in planes:
+        if plane.last_col <= plane.first_col:
+            continue
+        flat = get_flat(plane.flat_name)
+        if flat is not None:
+            draw_plane(frame_buffer, plane, flat, tables, lights, view_x, view_y, angle, eye_z)
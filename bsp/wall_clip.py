@@ -1,144 +1,68 @@
-import copy
-from typing import NamedTuple, List
-from dataclasses import dataclass
-
-from utils.defs import RES_WIDTH
-
-@dataclass
-class ClipRange:
-    first : int = 0
-    last : int = 0
-
-MAXSEGS = int((RES_WIDTH / 2) + 1)
-n_solid_segs = 0
-solid_segs : List[ClipRange] = [ClipRange() for _ in range(MAXSEGS)]
-
-class ScreenCoords(NamedTuple):
-    first_col : int
-    last_col : int
-    h_top_start : int
-    h_top_end : int
-    y_step_top : float
-    h_bottom_start : int
-    h_bottom_end : int
-    y_step_bottom : float
-    u_left : float
-    u_right : float
-    u_step : float
-    one_over_z0 : float
-    one_over_z1 : float
-    one_over_z_step : float
-    wall_height : int
-
-def clear_clip_range():
-    global n_solid_segs, solid_segs
-    solid_segs[0] = ClipRange(-0x7fffffff, -1)
-    solid_segs[1] = ClipRange(RES_WIDTH, 0x7fffffff)
-    n_solid_segs = 2
-
-def _update_screen_coords(sc:ScreenCoords, new_first_col:int, new_last_col:int) -> ScreenCoords:
-    first_diff = new_first_col - sc.first_col
-    last_diff = new_last_col - sc.last_col
-
-    h_top_start = sc.h_top_start + first_diff * sc.y_step_top
-    h_top_end = sc.h_top_end + last_diff * sc.y_step_top
-
-    h_bottom_start = sc.h_bottom_start + first_diff * sc.y_step_bottom
-    h_bottom_end = sc.h_bottom_end + last_diff * sc.y_step_bottom
-
-    u_left = sc.u_left + first_diff * sc.u_step
-    u_right = sc.u_right + last_diff * sc.u_step
-
-    one_over_z0 = sc.one_over_z0 + first_diff * sc.one_over_z_step
-    one_over_z1 = sc.one_over_z1 + last_diff * sc.one_over_z_step
-
-    first_col = new_first_col
-    last_col = new_last_col
-
-    return ScreenCoords(
-        first_col, last_col,
-        h_top_start, h_top_end, sc.y_step_top,
-        h_bottom_start, h_bottom_end, sc.y_step_bottom,
-        u_left, u_right, sc.u_step,
-        one_over_z0, one_over_z1, sc.one_over_z_step,
-        sc.wall_height)
-
-
-def clip_window_wall(sc:ScreenCoords) -> List[ScreenCoords]:
-    first, last = sc.first_col, sc.last_col
-    res : List[ScreenCoords] = []
-
-    i = 0
-    while first-1 > solid_segs[i].last:
-        i += 1
-
-    if first < solid_segs[i].first:
-        if last < solid_segs[i].first-1:
-            res.append(_update_screen_coords(sc, first, last))
-            return res
-        res.append(_update_screen_coords(sc, first, solid_segs[i].first))
-
-    if last <= solid_segs[i].last:
+from array import array
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+ClipFragment = Tuple[int, int]
+
+class ClipRanges:
+    # Sorted, disjoint, half open solid column ranges kept as two parallel int arrays.
+    # Each renderer owns one as wide as its screen. Half open ranges meet
+    # without the column of overlap inclusive ones need, so fragments end
+    # exactly where covered columns start and never reach past the screen.
+    def __init__(self, width : int) -> None:
+        self.width = width
+        self.clear()
+
+    def clear(self, first_col : int = 0, last_col : Optional[int] = None):
+        # Ranges are half open, columns outside [first_col, last_col) start out covered.
+        if last_col is None:
+            last_col = self.width
+        self.firsts = array('i', (-0x7fffffff, last_col))
+        self.lasts = array('i', (first_col, 0x7fffffff))
+
+    def __len__(self) -> int:
+        return len(self.firsts)
+
+    def is_range_covered(self, first:int, last:int) -> bool:
+        i = bisect_right(self.lasts, first)
+        return self.firsts[i] <= first and last <= self.lasts[i]
+
+    def _gaps(self, first:int, last:int, i:int) -> List[ClipFragment]:
+        # Uncovered parts of [first, last), starting from the first range ending after first.
+        firsts, lasts = self.firsts, self.lasts
+        res : List[ClipFragment] = []
+        while first < last:
+            if first < firsts[i]:
+                res.append((first, min(firsts[i], last)))
+            first = lasts[i]
+            i += 1
         return res
 
-    while last > solid_segs[i+1].first+1:
-        res.append(_update_screen_coords(sc, solid_segs[i].last, solid_segs[i+1].first))
-        i += 1
-        if last <= solid_segs[i].last:
+    def clip_window_wall(self, first:int, last:int) -> List[ClipFragment]:
+        i = bisect_right(self.lasts, first)
+        if self.firsts[i] <= first and last <= self.lasts[i]:
+            return []
+        return self._gaps(first, last, i)
+
+    def clip_solid_wall(self, first:int, last:int) -> List[ClipFragment]:
+        firsts, lasts = self.firsts, self.lasts
+        i = bisect_right(lasts, first)
+        if firsts[i] <= first and last <= lasts[i]:
+            return []
+        res = self._gaps(first, last, i)
+        if not res:
             return res
 
-    res.append(_update_screen_coords(sc, solid_segs[i].last, last))
-    return res
-
-
-def clip_solid_wall(sc:ScreenCoords) -> List[ScreenCoords]:
-    global n_solid_segs, solid_segs
-    first, last = sc.first_col, sc.last_col
-    res : List[ScreenCoords] = []
-
-    i = 0
-    while first-1 > solid_segs[i].last:
-        i += 1
-
-    if first < solid_segs[i].first:
-        if last < solid_segs[i].first-1: # Entire Seg is visible
-            res.append(_update_screen_coords(sc, first, last))
-            next = n_solid_segs
-            while next != i:
-                solid_segs[next] = copy.deepcopy(solid_segs[next-1])
-                next -= 1
-            solid_segs[next].first = first
-            solid_segs[next].last = last
-            n_solid_segs += 1
-            return res
-        res.append(_update_screen_coords(sc, first, solid_segs[i].first))
-        solid_segs[i].first = first
-    
-    if last <= solid_segs[i].last:
-        return res
-    
-    next = i
-    while last >= solid_segs[next+1].first-1:
-        next += 1
-        res.append(_update_screen_coords(sc, solid_segs[next-1].last, solid_segs[next].first))
-        if last <= solid_segs[next].last:
-            solid_segs[i].last = solid_segs[next].last
-            while next != n_solid_segs:
-                next += 1
-                i += 1
-                solid_segs[i] = copy.deepcopy(solid_segs[next])
-            n_solid_segs = i + 1
+        # Ranges touching [first, last), from i up to next, get merged with it.
+        if lasts[i - 1] == first:
+            i -= 1
+        next = bisect_right(firsts, last, i)
+        if i == next:
+            firsts.insert(i, first)
+            lasts.insert(i, last)
             return res
-
-    res.append(_update_screen_coords(sc, solid_segs[next].last, last))
-    solid_segs[i].last = last
-
-    if i == next:
+        firsts[i] = min(first, firsts[i])
+        lasts[i] = max(last, lasts[next - 1])
+        del firsts[i + 1:next]
+        del lasts[i + 1:next]
         return res
-
-    while next != n_solid_segs:
-        next += 1
-        i += 1
-        solid_segs[i] = copy.deepcopy(solid_segs[next])
-    n_solid_segs = i + 1 
-    return res
\ No newline at end of file
@@ -0,0 +1,4 @@
+import os
+
+# Tests render headlessly, and import from the repository root like the scripts do.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
@@ -1,16 +1,28 @@
 import math
-import pygame
 from pygame import Vector2
 
+from entities.ticcmd import CMD_SCALE, TicCmd
+
+# Per tic at full speed, the same pace the old per-frame steps had at 60 fps.
+TURN_PER_TIC = 0.025 * 60 / 35
+MOVE_PER_TIC = 2.5 * 60 / 35
+
+# Like mobjinfo's player height and VIEWHEIGHT, the eyes sit EYE_DROP under the top of the head.
+PLAYER_HEIGHT = 56
+EYE_DROP = 15
+VIEW_HEIGHT = PLAYER_HEIGHT - EYE_DROP
+
 class Player:
     def __init__(self, pos : Vector2, angle : float, fov : float, head_height : int) -> None:
         self.pos = pos
         self.angle = angle
         self.fov = fov
         self.head_height = head_height
-        self.eye_height = head_height - 15
+        self.radius = 16
+        self.eye_height = head_height - EYE_DROP
         self.foot_pos = 0
         self._update_dir()
+        self._save_prev()
 
     def _update_dir(self):
         self.dir = Vector2(math.cos(self.angle), math.sin(self.angle))
@@ -18,6 +30,11 @@ class Player:
         self.frust_right = self.dir.rotate_rad(self.fov/2)
         self.frust_norm_left = Vector2(-self.frust_left.y, self.frust_left.x)
         self.frust_norm_right = Vector2(self.frust_right.y, -self.frust_right.x)
+
+    def _save_prev(self):
+        self.prev_pos = Vector2(self.pos)
+        self.prev_angle = self.angle
+        self.prev_foot_pos = self.foot_pos
     
     def update_foot_pos(self, foot_pos):
         self.foot_pos = foot_pos
@@ -25,13 +42,18 @@ class Player:
     def get_eye_pos(self):
         return self.foot_pos + self.eye_height
 
-    def update(self, keys):
-        if keys[pygame.K_LEFT]:
-            self.angle += 0.025
-        if keys[pygame.K_RIGHT]:
-            self.angle -= 0.025
+    def run_tic(self, cmd : TicCmd, move=None):
+        self._save_prev()
+        self.angle += cmd.turn / CMD_SCALE * TURN_PER_TIC
         self._update_dir()
-        if keys[pygame.K_UP]:
-            self.pos += self.dir * 2.5
-        if keys[pygame.K_DOWN]:
-            self.pos -= self.dir * 2.5
\ No newline at end of file
+        delta = self.dir * (cmd.forward / CMD_SCALE * MOVE_PER_TIC)
+        if delta.length_squared() > 0:
+            # move(player, delta) returns where the player ends up, e.g. collision.move_player.
+            self.pos = move(self, delta) if move is not None else self.pos + delta
+
+    def interpolated(self, alpha : float) -> 'Player':
+        # The view alpha of the way from the previous tic to this one.
+        view = Player(self.prev_pos.lerp(self.pos, alpha), self.prev_angle + (self.angle - self.prev_angle) * alpha,
+            self.fov, self.head_height)
+        view.update_foot_pos(self.prev_foot_pos + (self.foot_pos - self.prev_foot_pos) * alpha)
+        return view
@@ -0,0 +1,37 @@
+from typing import Iterator, List
+
+import bsp.bsp_map as bsp_map
+from bsp import collision
+from entities.player import Player
+from entities.ticcmd import TICRATE, TicCmd
+
+# After a long stall the simulation drops time instead of running this many tics in a row.
+MAX_TICS_PER_FRAME = 10
+
+def run_player_tic(player : Player, cmd : TicCmd):
+    player.run_tic(cmd, collision.move_player)
+    player.update_foot_pos(bsp_map.sector_search(player.pos).floor_height)
+
+class TicClock:
+    # Like TryRunTics: real time is turned into whole tics, the remainder
+    # becomes how far the view is interpolated towards the latest tic.
+    def __init__(self) -> None:
+        self._pending = 0.0
+
+    def advance(self, seconds : float) -> int:
+        self._pending += seconds * TICRATE
+        n_tics = int(self._pending)
+        self._pending -= n_tics
+        if n_tics > MAX_TICS_PER_FRAME:
+            n_tics = MAX_TICS_PER_FRAME
+        return n_tics
+
+    @property
+    def alpha(self) -> float:
+        return self._pending
+
+def replay(player : Player, cmds : List[TicCmd]) -> Iterator[Player]:
+    # The player after every tic of a demo, the same on every run.
+    for cmd in cmds:
+        run_player_tic(player, cmd)
+        yield player
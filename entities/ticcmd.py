@@ -0,0 +1,43 @@
+import struct
+from typing import List, NamedTuple, Tuple
+
+import pygame
+
+# The simulation advances in tics of 1/35 s, like TICRATE, whatever the frame rate.
+TICRATE = 35
+
+# Full speed on the keyboard, commands go up to 127 for analog input.
+CMD_SCALE = 64
+
+DEMO_MAGIC = b'DPYD'
+DEMO_VERSION = 1
+_DEMO_HEADER = struct.Struct('<4sB8sI')
+
+class TicCmd(NamedTuple):
+    # Signed bytes, like ticcmd_t's forwardmove and angleturn.
+    forward : int
+    turn : int
+
+def build_ticcmd(keys) -> TicCmd:
+    forward = CMD_SCALE * (bool(keys[pygame.K_UP]) - bool(keys[pygame.K_DOWN]))
+    turn = CMD_SCALE * (bool(keys[pygame.K_LEFT]) - bool(keys[pygame.K_RIGHT]))
+    return TicCmd(forward, turn)
+
+def write_demo(path : str, map_name : str, cmds : List[TicCmd]):
+    # A small header, then two bytes per tic.
+    with open(path, 'wb') as f:
+        f.write(_DEMO_HEADER.pack(DEMO_MAGIC, DEMO_VERSION, map_name.encode('utf-8'), len(cmds)))
+        f.write(struct.pack('<%db' % (2 * len(cmds)), *(v for cmd in cmds for v in cmd)))
+
+def read_demo(path : str) -> Tuple[str, List[TicCmd]]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < _DEMO_HEADER.size:
+        raise ValueError('%s is too short for a demo header' % path)
+    magic, version, map_name, n_tics = _DEMO_HEADER.unpack_from(data, 0)
+    if magic != DEMO_MAGIC or version != DEMO_VERSION:
+        raise ValueError('%s is not a version %d demo' % (path, DEMO_VERSION))
+    if len(data) - _DEMO_HEADER.size != 2 * n_tics:
+        raise ValueError('%s holds %d bytes of tics, the header says %d tics' % (path, len(data) - _DEMO_HEADER.size, n_tics))
+    values = struct.unpack_from('<%db' % (2 * n_tics), data, _DEMO_HEADER.size)
+    return map_name.rstrip(b'\x00').decode('utf-8'), [TicCmd(*values[i:i + 2]) for i in range(0, len(values), 2)]
@@ -1,53 +1,150 @@
 import pygame
-from pygame import display, event, time, key, transform
-from pygame.constants import KEYDOWN, K_ESCAPE, K_SPACE, QUIT
+from pygame import display, event, time, key, transform, surfarray, font, Surface
+from pygame.constants import KEYDOWN, K_ESCAPE, K_SPACE, K_F3, QUIT
 
-from wad.reader import read_things, read_wad_info_table
+from wad.reader import WadFile, read_playpal, read_things
 
-from bsp.bsp_map import init_bsp_map, render_player_view, sector_search
+import bsp.bsp_map as bsp_map
+from bsp.bsp_map import init_bsp_map, sector_search
+from bsp import render_stats
+from bsp.strip_render import StripRenderer
+from bsp.dynamic_res import DynamicResolution
 
 import math
+import argparse
+from time import perf_counter
 
-from entities.player import Player
+from entities.player import PLAYER_HEIGHT, Player
+from entities.ticcmd import build_ticcmd, read_demo, write_demo
+from entities.tic_loop import TicClock, run_player_tic
+from utils.defs import RES_WIDTH as DEFAULT_WIDTH, RES_HEIGHT as DEFAULT_HEIGHT
 
 
 WAD_PATH = 'wads/DOOM.WAD'
+MAP_CACHE_DIR = 'wads/cache'
 WINDOW_DIMS = RES_WIDTH, HEIGHT_RES = 640, 480
 
-def main():
+def main(trace_path=None, n_workers=0, record_path=None, demo_path=None,
+        width=DEFAULT_WIDTH, height=DEFAULT_HEIGHT, target_fps=None):
     pygame.init()
     screen = display.set_mode(WINDOW_DIMS)
     clock = time.Clock()
 
-    info_table = read_wad_info_table(WAD_PATH)
-    init_bsp_map(WAD_PATH, info_table, 'E1M1')
+    map_name = 'E1M1'
+    demo_cmds = None
+    if demo_path is not None:
+        map_name, demo_cmds = read_demo(demo_path)
+    recorded = []
 
-    things = read_things(WAD_PATH, *info_table['E1M1']['THINGS'])
-    player_thing = list(filter(lambda x: x.thing_type == 1, things))[0]
-
-    player = Player(player_thing.position, math.radians(player_thing.angle), math.radians(90), 56)
+    wad = WadFile(WAD_PATH)
+    info_table = wad.info_table
+    init_bsp_map(wad, info_table, map_name, MAP_CACHE_DIR)
+    view_renderer = bsp_map.Renderer(width, height)
 
+    things = read_things(wad, *info_table[map_name]['THINGS'])
+    player_thing = list(filter(lambda x: x.thing_type == 1, things))[0]
 
+    player = Player(player_thing.position, math.radians(player_thing.angle), math.radians(90), PLAYER_HEIGHT)
+    player.update_foot_pos(sector_search(player.pos).floor_height)
+    # Nothing to interpolate from before the first tic.
+    player.prev_foot_pos = player.foot_pos
+
+    renderer = None
+    if n_workers > 0:
+        renderer = StripRenderer(WAD_PATH, map_name, n_workers, MAP_CACHE_DIR, width, height)
+    dynamic_res = None
+    if target_fps is not None:
+        dynamic_res = DynamicResolution(width, height, 1000 / target_fps)
+
+    frame_surface = None
+    overlay_font = font.Font(None, 18)
+    show_stats = False
+    if trace_path is not None:
+        render_stats.enable(trace_path=trace_path)
+
+    tic_clock = TicClock()
+    tic = 0
+    clock.tick()
     running = True
     while running:
         for e in event.get():
             if e.type == QUIT:
                 running = False
-
-        player.update(key.get_pressed())
-
-        current_sector = sector_search(player.pos)
-        player.update_foot_pos(current_sector.floor_height)
-    
-        screen.fill('white', (0,0,640,400))
-        render_list = render_player_view(player)
-        for pos, ss in render_list:
-            screen.blit(transform.scale2x(ss), (pos[0]*2, pos[1]*2))
+            elif e.type == KEYDOWN and e.key == K_F3:
+                show_stats = not show_stats
+                # A trace keeps recording while the overlay is hidden.
+                if show_stats and render_stats.active() is None:
+                    render_stats.enable()
+                elif not show_stats and trace_path is None:
+                    render_stats.disable()
+
+        # The simulation only moves in whole tics, frames just show where it is.
+        for _ in range(tic_clock.advance(clock.tick() / 1000)):
+            if demo_cmds is not None:
+                if tic == len(demo_cmds):
+                    running = False
+                    break
+                cmd = demo_cmds[tic]
+            else:
+                cmd = build_ticcmd(key.get_pressed())
+            recorded.append(cmd)
+            run_player_tic(player, cmd)
+            tic += 1
+
+        view = player.interpolated(tic_clock.alpha)
+        render_start = perf_counter()
+        if renderer is not None:
+            frame = renderer.render(view)
+        else:
+            frame = bsp_map.render_player_view(view, renderer=view_renderer)
+        if dynamic_res is not None:
+            resolution = dynamic_res.update((perf_counter() - render_start) * 1000)
+            # The new size takes effect from the next frame, this one is copied
+            # out of the framebuffer it is about to replace.
+            if resolution is not None:
+                frame = frame.copy()
+                if renderer is not None:
+                    renderer.set_resolution(*resolution)
+                else:
+                    view_renderer.set_resolution(*resolution)
+        if frame_surface is None or frame_surface.get_size() != frame.shape:
+            frame_surface = Surface(frame.shape, depth=8)
+            frame_surface.set_palette(read_playpal(wad, *info_table['PLAYPAL'])[0])
+        surfarray.blit_array(frame_surface, frame)
+        screen.blit(transform.scale(frame_surface, WINDOW_DIMS), (0, 0))
+        if show_stats:
+            render_stats.draw_overlay(screen, overlay_font, render_stats.active())
         display.update()
-        clock.tick(60)
-        display.set_caption('doom-py %0.1f fps' % clock.get_fps())
+        display.set_caption('doom-py %0.1f fps %dx%d' % (clock.get_fps(), frame.shape[0], frame.shape[1]))
 
+    if record_path is not None:
+        write_demo(record_path, map_name, recorded)
+    if renderer is not None:
+        renderer.close()
+    render_stats.disable()
     pygame.quit()
 
+def prebuild_pvs(map_names):
+    wad = WadFile(WAD_PATH)
+    for map_name in map_names or [name for name, lumps in wad.info_table.items() if isinstance(lumps, dict) and 'NODES' in lumps]:
+        start = perf_counter()
+        pvs = bsp_map.build_map_pvs(wad, wad.info_table, map_name, MAP_CACHE_DIR)
+        print('%s: %d subsectors in %.1f s' % (map_name, len(pvs), perf_counter() - start))
+    wad.close()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trace', help='write per-frame renderer stats to this JSON lines file, F3 shows them on screen')
+    parser.add_argument('--workers', type=int, default=0, help='render each frame as column strips in this many processes')
+    parser.add_argument('--record', help='write the input of every tic to this demo file on exit')
+    parser.add_argument('--playdemo', help='replay the input of a recorded demo instead of the keyboard')
+    parser.add_argument('--width', type=int, default=DEFAULT_WIDTH, help='internal render width, the frame is scaled to the window')
+    parser.add_argument('--height', type=int, default=DEFAULT_HEIGHT, help='internal render height')
+    parser.add_argument('--target-fps', type=float, help='lower the internal resolution whenever rendering falls below this frame rate')
+    parser.add_argument('--build-pvs', nargs='*', metavar='MAP',
+        help='build the potentially visible sets of these maps, or every map, into the map cache and exit')
+    args = parser.parse_args()
+    if args.build_pvs is not None:
+        prebuild_pvs(args.build_pvs)
+        raise SystemExit
+    main(args.trace, args.workers, args.record, args.playdemo, args.width, args.height, args.target_fps)
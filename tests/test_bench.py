@@ -0,0 +1,36 @@
+import json
+import os
+
+import pytest
+
+from bench.render_bench import compare_to_baseline, run_benchmark
+from bench.synth_wad import write_wad
+
+BASELINE = os.path.join(os.path.dirname(__file__), os.pardir, 'bench', 'baseline.json')
+
+@pytest.fixture(scope='module')
+def synth_wad(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('bench') / 'synth.wad')
+    write_wad(path)
+    return path
+
+def test_single_process(synth_wad):
+    result = run_benchmark(synth_wad, 'E1M1', 8, 2, 0)
+    assert result['frames'] == 8
+    assert result['fps'] > 0
+    assert result['counts_per_frame']['columns_drawn'] > 0
+
+def test_strip_workers(synth_wad):
+    result = run_benchmark(synth_wad, 'E1M1', 8, 2, 0, n_workers=2)
+    assert result['frames'] == 8
+    assert result['workers'] == 2
+    assert result['fps'] > 0
+
+def test_no_regression_from_baseline(synth_wad):
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    result = run_benchmark(synth_wad, baseline['map'], baseline['frames'], 10, baseline['seed'],
+        n_workers=baseline['workers'], width=baseline['resolution'][0], height=baseline['resolution'][1])
+    # Frame times depend on the machine, only the work done is checked.
+    regressions, _ = compare_to_baseline(result, baseline)
+    assert regressions == []
@@ -0,0 +1,48 @@
+import struct
+
+import pytest
+
+from bsp import map_cache
+from bsp.bsp_map import load_map_arrays
+from bench.synth_wad import write_wad
+from wad.reader import WadFile
+
+@pytest.fixture
+def cached_map(tmp_path):
+    wad_path = str(tmp_path / 'synth.wad')
+    write_wad(wad_path, rows=2, cols=2)
+    wad = WadFile(wad_path)
+    cache_dir = str(tmp_path / 'cache')
+    load_map_arrays(wad, wad.info_table, 'E1M1', cache_dir)
+    yield wad, cache_dir, map_cache.cache_path(cache_dir, wad, 'E1M1')
+    wad.close()
+
+def _truncate(data : bytes) -> bytes:
+    return data[:len(data) // 2]
+
+def _short_header(data : bytes) -> bytes:
+    return data[:6]
+
+def _header_not_utf8(data : bytes) -> bytes:
+    return data[:12] + b'\xff' * 8 + data[20:]
+
+def _header_not_json(data : bytes) -> bytes:
+    return data[:12] + b'{' * 8 + data[20:]
+
+def _header_past_end(data : bytes) -> bytes:
+    return data[:8] + struct.pack('<I', len(data) * 2) + data[12:]
+
+@pytest.mark.parametrize('corrupt', [_truncate, _short_header, _header_not_utf8, _header_not_json, _header_past_end])
+def test_corrupt_cache_is_rebuilt(cached_map, corrupt):
+    wad, cache_dir, path = cached_map
+    digest = map_cache.wad_digest(wad)
+    assert map_cache.read_map_cache(path, digest, 'E1M1') is not None
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(corrupt(data))
+    assert map_cache.read_map_cache(path, digest, 'E1M1') is None
+
+    load_map_arrays(wad, wad.info_table, 'E1M1', cache_dir)
+    assert map_cache.read_map_cache(path, digest, 'E1M1') is not None
@@ -0,0 +1,82 @@
+import math
+
+import pytest
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bench.render_bench import make_camera_path, make_player
+from bench.synth_wad import write_wad
+from wad.reader import WadFile
+
+def _load_map(wad_path : str, cache_dir : str = None):
+    wad = WadFile(wad_path)
+    bsp_map.init_bsp_map(wad, wad.info_table, 'E1M1', cache_dir)
+    return wad
+
+@pytest.fixture
+def closed_room(tmp_path):
+    path = str(tmp_path / 'room.wad')
+    write_wad(path, rows=1, cols=1)
+    wad = _load_map(path)
+    yield wad
+    wad.close()
+
+def test_closed_room_draws_every_column(closed_room):
+    # Turning in place in a room without doors, walls and planes cover the whole screen.
+    for i in range(32):
+        frame = bsp_map.render_player_view(make_player((Vector2(256, 256), i * 2 * math.pi / 32)))
+        undrawn = (frame == bsp_map.CLEAR_COLOR).any(axis=1).nonzero()[0]
+        assert len(undrawn) == 0, 'columns %s left clear at pose %d' % (list(undrawn), i)
+
+def test_column_cache_keeps_walls_aligned(closed_room):
+    # Cached columns are scaled to within a sixteenth of a row of the wall's
+    # edges, so only the odd texel edge lands on another row.
+    players = [make_player((Vector2(256, 256), i * 2 * math.pi / 32)) for i in range(32)]
+    exact = [bsp_map.render_player_view(player).copy() for player in players]
+    bsp_map.column_cache.set_budget(4 << 20)
+    try:
+        cached = [bsp_map.render_player_view(player).copy() for player in players]
+    finally:
+        bsp_map.column_cache.set_budget(0)
+        bsp_map.column_cache.clear()
+    differing = sum((a != b).sum() for a, b in zip(exact, cached))
+    assert differing < 0.02 * sum(a.size for a in exact)
+
+def test_pvs_does_not_change_frames(tmp_path):
+    # The PVS only skips subsectors that would have been clipped away anyway.
+    path = str(tmp_path / 'synth.wad')
+    cache_dir = str(tmp_path / 'cache')
+    write_wad(path)
+    with WadFile(path) as wad:
+        bsp_map.build_map_pvs(wad, wad.info_table, 'E1M1', cache_dir)
+    wad = _load_map(path, cache_dir)
+    pvs_rows = bsp_map.pvs_rows
+    assert pvs_rows
+
+    poses = make_camera_path(wad, 'E1M1', 200, 0)
+    try:
+        with_pvs = [bsp_map.render_player_view(make_player(pose)).copy() for pose in poses]
+        bsp_map.pvs_rows = []
+        without_pvs = [bsp_map.render_player_view(make_player(pose)).copy() for pose in poses]
+    finally:
+        bsp_map.pvs_rows = pvs_rows
+        wad.close()
+    for i, (a, b) in enumerate(zip(with_pvs, without_pvs)):
+        assert (a == b).all(), 'frame %d differs' % i
+
+def test_loading_never_builds_the_pvs(tmp_path):
+    path = str(tmp_path / 'synth.wad')
+    write_wad(path, rows=1, cols=1)
+    wad = _load_map(path, str(tmp_path / 'cache'))
+    wad.close()
+    assert bsp_map.pvs_rows == []
+
+def test_renderers_keep_their_own_resolution(closed_room):
+    # Rendering through one renderer leaves another's resolution and frame alone.
+    small = bsp_map.Renderer(160, 100)
+    player = make_player((Vector2(256, 256), 0.3))
+    full = bsp_map.render_player_view(player).copy()
+    assert full.shape == (320, 200)
+    assert bsp_map.render_player_view(player, renderer=small).shape == (160, 100)
+    assert (bsp_map.default_renderer.frame_buffer == full).all()
+    assert (bsp_map.render_player_view(player) == full).all()
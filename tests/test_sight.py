@@ -0,0 +1,71 @@
+from typing import Set
+
+import numpy as np
+import pytest
+from pygame import Vector2
+
+import bsp.bsp_map as bsp_map
+from bench.synth_wad import ROOM_GAP, ROOM_SIZE, write_wad
+from bsp import sight
+from wad.reader import WadFile
+
+ROWS = COLS = 3
+
+@pytest.fixture(scope='module')
+def synth_map(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('sight') / 'synth.wad')
+    write_wad(path, rows=ROWS, cols=COLS)
+    wad = WadFile(path)
+    bsp_map.init_bsp_map(wad, wad.info_table, 'E1M1')
+    yield
+    wad.close()
+
+def _random_points(rng : np.random.Generator, n : int) -> np.ndarray:
+    # (x, y, z) rows inside the rooms, at eye heights both over and under the corridors' openings.
+    room = rng.integers(0, ROWS * COLS, n)
+    corner = np.stack((room % COLS, room // COLS), axis=1) * (ROOM_SIZE + ROOM_GAP)
+    xy = corner + rng.uniform(8, ROOM_SIZE - 8, (n, 2))
+    return np.concatenate((xy, rng.uniform(-8, 136, (n, 1))), axis=1)
+
+def _brute_force_sight(p0 : Vector2, z0 : float, p1 : Vector2, z1 : float) -> bool:
+    # Every seg of the map, without the BSP walk narrowing them down.
+    checked : Set[int] = set()
+    return not any(sight._seg_blocks_sight(i, p0, p1, z0, z1, checked) for i in range(len(bsp_map.segs)))
+
+def test_matches_brute_force(synth_map):
+    rng = np.random.default_rng(0)
+    blocked = 0
+    for (x0, y0, z0), (x1, y1, z1) in zip(_random_points(rng, 300).tolist(), _random_points(rng, 300).tolist()):
+        p0, p1 = Vector2(x0, y0), Vector2(x1, y1)
+        expected = _brute_force_sight(p0, z0, p1, z1)
+        assert sight.check_sight(p0, z0, p1, z1) == expected, 'sight from %s to %s' % ((x0, y0, z0), (x1, y1, z1))
+        blocked += not expected
+    # Both outcomes have to be covered for the comparison to mean anything.
+    assert 0 < blocked < 300
+
+def test_reject_bit_hides_sector(synth_map):
+    # Two rooms in sight of each other through the corridor between them.
+    p0, p1 = Vector2(256, 256), Vector2(ROOM_SIZE + ROOM_GAP + 256, 256)
+    assert sight.check_sight(p0, 41, p1, 41)
+
+    from_sector, to_sector = (bsp_map.locator.subsector_sector[bsp_map.subsector_search(p)] for p in (p0, p1))
+    bit = from_sector * len(bsp_map.sectors) + to_sector
+    reject = bsp_map.reject
+    bsp_map.reject = np.zeros_like(reject)
+    bsp_map.reject[bit >> 3] |= 1 << (bit & 7)
+    try:
+        assert not sight.check_sight(p0, 41, p1, 41)
+        assert not sight.check_sight_batch(np.array([[p0.x, p0.y, 41.0]]), np.array([[p1.x, p1.y, 41.0]]))[0]
+        # The bit only hides to_sector from from_sector, not the other way.
+        assert sight.check_sight(p1, 41, p0, 41)
+    finally:
+        bsp_map.reject = reject
+
+def test_batch_matches_single_pairs(synth_map):
+    rng = np.random.default_rng(1)
+    from_points, to_points = _random_points(rng, 300), _random_points(rng, 300)
+    # Pairs at the same spot take the shortcut past the BSP walk.
+    to_points[:10] = from_points[:10]
+    single = [sight.check_sight(Vector2(x0, y0), z0, Vector2(x1, y1), z1)
+        for (x0, y0, z0), (x1, y1, z1) in zip(from_points.tolist(), to_points.tolist())]
+    assert sight.check_sight_batch(from_points, to_points).tolist() == single
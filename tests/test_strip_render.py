@@ -0,0 +1,50 @@
+import pytest
+
+import bsp.bsp_map as bsp_map
+from bench.render_bench import make_camera_path, make_player
+from bench.synth_wad import write_wad
+from bsp import render_stats
+from bsp.strip_render import StripRenderer
+from wad.reader import WadFile
+
+@pytest.fixture(scope='module')
+def synth_wad(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('strips') / 'synth.wad')
+    write_wad(path, rows=2, cols=2)
+    return path
+
+def test_strips_match_single_process(synth_wad):
+    # The strips compose to the very frame one renderer draws, also once
+    # resized to widths the workers do not split evenly.
+    wad = WadFile(synth_wad)
+    bsp_map.init_bsp_map(wad, wad.info_table, 'E1M1')
+    poses = make_camera_path(wad, 'E1M1', 24, 0)
+    with StripRenderer(synth_wad, 'E1M1', 3) as strips:
+        for width, height in ((320, 200), (160, 100), (241, 150)):
+            if (width, height) != strips.frame.shape:
+                strips.set_resolution(width, height)
+            renderer = bsp_map.Renderer(width, height)
+            for i, pose in enumerate(poses):
+                expected = bsp_map.render_player_view(make_player(pose), renderer=renderer)
+                assert (strips.render(make_player(pose)) == expected).all(), 'pose %d at %dx%d' % (i, width, height)
+    wad.close()
+
+def test_strips_are_counted(synth_wad):
+    # Each column is drawn by exactly one strip, so their counts add up to the single-process one.
+    wad = WadFile(synth_wad)
+    bsp_map.init_bsp_map(wad, wad.info_table, 'E1M1')
+    poses = make_camera_path(wad, 'E1M1', 8, 0)
+    renderer = bsp_map.Renderer()
+    stats = render_stats.enable(history=len(poses))
+    try:
+        for pose in poses:
+            bsp_map.render_player_view(make_player(pose), renderer=renderer)
+        expected = [record['columns_drawn'] for record in stats.history]
+        stats.history.clear()
+        with StripRenderer(synth_wad, 'E1M1', 3) as strips:
+            for pose in poses:
+                strips.render(make_player(pose))
+        assert [record['columns_drawn'] for record in stats.history] == expected
+    finally:
+        render_stats.disable()
+        wad.close()
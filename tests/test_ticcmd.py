@@ -0,0 +1,19 @@
+import pytest
+
+from entities.ticcmd import TicCmd, read_demo, write_demo
+
+CMDS = [TicCmd(64, 0), TicCmd(-64, 64), TicCmd(127, -128)]
+
+def test_demo_round_trip(tmp_path):
+    path = str(tmp_path / 'rec.demo')
+    write_demo(path, 'E1M1', CMDS)
+    assert read_demo(path) == ('E1M1', CMDS)
+
+@pytest.mark.parametrize('cut', [1, 2, 3, 10])
+def test_truncated_demo(tmp_path, cut):
+    # Cut mid tic, on a tic boundary and into the header.
+    path = tmp_path / 'rec.demo'
+    write_demo(str(path), 'E1M1', CMDS)
+    path.write_bytes(path.read_bytes()[:-cut])
+    with pytest.raises(ValueError, match='rec.demo'):
+        read_demo(str(path))
@@ -0,0 +1,46 @@
+from typing import List
+
+import pytest
+
+from bench.synth_wad import write_wad
+from bsp.blockmap import build_blockmap
+from wad.d_types import Blockmap
+from wad.reader import WadFile, read_blockmap, read_linedefs_array, read_vertexes_array
+
+@pytest.fixture
+def wad_path(tmp_path):
+    path = str(tmp_path / 'synth.wad')
+    write_wad(path, rows=1, cols=1)
+    return path
+
+def test_close_with_arrays_still_referenced(wad_path):
+    wad = WadFile(wad_path)
+    vertexes = read_vertexes_array(wad, *wad.info_table['E1M1']['VERTEXES'])
+    expected = vertexes.copy()
+    wad.close()
+    # The map stays for as long as the array views it.
+    assert (vertexes == expected).all()
+
+def _blockmap_lists(blockmap : Blockmap) -> List[List[int]]:
+    offsets, lines = blockmap.offsets.tolist(), blockmap.lines.tolist()
+    return [sorted(lines[a:b]) for a, b in zip(offsets, offsets[1:])]
+
+@pytest.mark.parametrize('leading_zero', [True, False])
+def test_read_blockmap_matches_built_one(tmp_path, leading_zero):
+    # With or without the node builder's leading 0, line 0 is only listed where it is.
+    path = str(tmp_path / 'synth.wad')
+    write_wad(path, rows=2, cols=2, blockmap_zero=leading_zero)
+    with WadFile(path) as wad:
+        lumps = wad.info_table['E1M1']
+        read = read_blockmap(wad, *lumps['BLOCKMAP'])
+        built = build_blockmap(read_vertexes_array(wad, *lumps['VERTEXES']), read_linedefs_array(wad, *lumps['LINEDEFS']))
+        assert read[:4] == built[:4]
+        assert _blockmap_lists(read) == _blockmap_lists(built)
+        assert 0 in read.lines
+
+def test_read_blockmap_without_terminator(wad_path):
+    with WadFile(wad_path) as wad:
+        file_pos, size = wad.info_table['E1M1']['BLOCKMAP']
+        # Cut off the last list's 0xFFFF.
+        with pytest.raises(ValueError):
+            read_blockmap(wad, file_pos, size - 2)
@@ -0,0 +1,53 @@
+from typing import List, Tuple
+
+import pytest
+
+from bench.clip_bench import SCENES, make_frames
+from bsp.wall_clip import ClipFragment, ClipRanges
+from utils.defs import RES_WIDTH
+
+class ListClipRanges:
+    # The solid ranges as a plain sorted list scanned from the left, like the
+    # solidsegs list ClipRanges replaced, with the same half open ranges.
+    def __init__(self, first_col : int, last_col : int) -> None:
+        self.ranges : List[Tuple[int, int]] = [(-0x7fffffff, first_col), (last_col, 0x7fffffff)]
+
+    def clip(self, first : int, last : int, solid : bool) -> List[ClipFragment]:
+        res : List[ClipFragment] = []
+        col = first
+        for range_first, range_last in self.ranges:
+            if range_last <= col:
+                continue
+            if range_first >= last:
+                break
+            if col < range_first:
+                res.append((col, range_first))
+            col = max(col, range_last)
+        if col < last:
+            res.append((col, last))
+
+        if solid and res:
+            merged : List[Tuple[int, int]] = []
+            for range_first, range_last in sorted(self.ranges + [(first, last)]):
+                if merged and range_first <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], range_last))
+                else:
+                    merged.append((range_first, range_last))
+            self.ranges = merged
+        return res
+
+@pytest.mark.parametrize('first_col, last_col', [(0, RES_WIDTH), (80, 213)])
+@pytest.mark.parametrize('scene', SCENES, ids=[scene[0] for scene in SCENES])
+def test_matches_list_version(scene, first_col, last_col):
+    _, n_segs, max_width, solid_share = scene
+    clip_ranges = ClipRanges(RES_WIDTH)
+    for spans in make_frames(4, n_segs, max_width, solid_share, 0):
+        clip_ranges.clear(first_col, last_col)
+        reference = ListClipRanges(first_col, last_col)
+        for first, last, solid in spans:
+            covered = clip_ranges.is_range_covered(first, last)
+            fragments = clip_ranges.clip_solid_wall(first, last) if solid else clip_ranges.clip_window_wall(first, last)
+            assert fragments == reference.clip(first, last, solid), (first, last, solid)
+            assert covered == (not fragments)
+            assert all(first_col <= f < l <= last_col for f, l in fragments)
+        assert list(zip(clip_ranges.firsts, clip_ranges.lasts)) == reference.ranges
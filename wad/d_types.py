@@ -1,10 +1,41 @@
 from typing import NamedTuple, List, Tuple
+import numpy as np
 from pygame import Rect, Vector2
 
 
 Color = Tuple[int, int, int, int]
 ColorPalette = List[Color]
 
+THING_DTYPE = np.dtype([
+    ('x', '<i2'), ('y', '<i2'), ('angle', '<i2'), ('thing_type', '<i2'), ('flags', '<i2')])
+
+LINEDEF_DTYPE = np.dtype([
+    ('start_vert', '<u2'), ('end_vert', '<u2'), ('flags', '<i2'), ('special_type', '<i2'),
+    ('sector_tag', '<i2'), ('front_sidedef', '<i2'), ('back_sidedef', '<i2')])
+
+SIDEDEF_DTYPE = np.dtype([
+    ('x_offset', '<i2'), ('y_offset', '<i2'), ('upper_texture_name', 'S8'),
+    ('lower_texture_name', 'S8'), ('middle_texture_name', 'S8'), ('sector', '<i2')])
+
+VERTEX_DTYPE = np.dtype([('x', '<i2'), ('y', '<i2')])
+
+SEG_DTYPE = np.dtype([
+    ('start_vert', '<u2'), ('end_vert', '<u2'), ('angle', '<i2'), ('linedef', '<u2'),
+    ('direction', '<i2'), ('offset', '<i2')])
+
+SSECTOR_DTYPE = np.dtype([('n_segs', '<u2'), ('start_seg', '<u2')])
+
+NODE_DTYPE = np.dtype([
+    ('x', '<i2'), ('y', '<i2'), ('dx', '<i2'), ('dy', '<i2'),
+    ('right_top', '<i2'), ('right_bottom', '<i2'), ('right_left', '<i2'), ('right_right', '<i2'),
+    ('left_top', '<i2'), ('left_bottom', '<i2'), ('left_left', '<i2'), ('left_right', '<i2'),
+    ('right_child', '<u2'), ('left_child', '<u2')])
+
+SECTOR_DTYPE = np.dtype([
+    ('floor_height', '<i2'), ('ceiling_height', '<i2'), ('floor_texture_name', 'S8'),
+    ('ceiling_texture_name', 'S8'), ('light_level', '<i2'), ('special_type', '<i2'),
+    ('tag_number', '<i2')])
+
 class Thing(NamedTuple):
     position : Vector2
     angle : int
@@ -63,17 +94,20 @@ class Sector(NamedTuple):
         return len(self.lines)
 
 
-class PatchPost(NamedTuple):
-    top_delta : int
-    length : int
-    data : bytes
-    
-class Patch(NamedTuple):
-    width : int
-    height : int
+class IndexedPatch(NamedTuple):
+    pixels : np.ndarray
+    mask : np.ndarray
     left_offset : int
     top_offset : int
-    columns : List[PatchPost]
+
+class Blockmap(NamedTuple):
+    origin_x : int
+    origin_y : int
+    columns : int
+    rows : int
+    # Lines in block (column, row) are lines[offsets[b]:offsets[b + 1]] with b = row * columns + column.
+    offsets : np.ndarray
+    lines : np.ndarray
 
 class PatchLayout(NamedTuple):
     orginx : int
@@ -1,309 +1,299 @@
 import re
 import math
+import mmap
+import struct
 from typing import Dict, List
 
+import numpy as np
 from pygame import Rect, Vector2
 
 from wad.d_types import Thing, LineDef, SideDef, Seg, \
-    SubSector, Node, Sector, PatchPost, Patch, \
-    PatchLayout, WadTexture, ColorPalette
+    SubSector, Node, Sector, IndexedPatch, \
+    PatchLayout, WadTexture, ColorPalette, Blockmap
+from wad.d_types import THING_DTYPE, LINEDEF_DTYPE, SIDEDEF_DTYPE, \
+    VERTEX_DTYPE, SEG_DTYPE, SSECTOR_DTYPE, NODE_DTYPE, SECTOR_DTYPE
 
 def _bytes_to_int(b : bytes, signed=False) -> int:
     return int.from_bytes(b, 'little', signed=signed)
 
 def _bytes_to_str(b : bytes) -> str:
-    return b.decode('utf-8').rstrip('\x00')
-
-def read_wad_info_table(wad_path : str):
+    return bytes(b).decode('utf-8').rstrip('\x00')
+
+class WadFile:
+    def __init__(self, wad_path : str) -> None:
+        self.wad_path = wad_path
+        self._file = open(wad_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = memoryview(self._mmap)
+        self.info_table = read_wad_info_table(self)
+
+    def lump(self, file_pos : int, size : int) -> memoryview:
+        return self.data[file_pos:file_pos + size]
+
+    def close(self):
+        self._file.close()
+        # Arrays read with np.frombuffer may still be views of the map, which
+        # then stays until the last of them is collected.
+        try:
+            self.data.release()
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __enter__(self) -> 'WadFile':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def read_wad_info_table(wad : WadFile):
     map_name_re = re.compile(r'E\dM\d')
 
     lump_info : Dict = {}
-    with open(wad_path, 'rb') as f:
-        id = _bytes_to_str(f.read(4))
-        n_lumps = _bytes_to_int(f.read(4))
-        info_table_ptr = _bytes_to_int(f.read(4))
-        f.seek(info_table_ptr)
-
-        current_map = ''
-        map_component_names = ('THINGS', 'LINEDEFS', 'SIDEDEFS', 'VERTEXES', 'SEGS',
-                               'SSECTORS', 'NODES', 'SECTORS', 'REJECT', 'BLOCKMAP',
-                               'BEHAVIOUR')
-        resource_type = None
-
-        for _ in range(n_lumps):
-            file_pos = _bytes_to_int(f.read(4))
-            size = _bytes_to_int(f.read(4))
-            name = _bytes_to_str(f.read(8))
-
-            if name in ('F_END', 'S_END', 'P_END'):
-                resource_type = None
-                continue
-
-            if resource_type is not None:
-                lump_info[resource_type][name] = (file_pos, size)
+    data = wad.data
+    id = _bytes_to_str(data[0:4])
+    n_lumps, info_table_ptr = struct.unpack_from('<ii', data, 4)
+
+    current_map = ''
+    map_component_names = ('THINGS', 'LINEDEFS', 'SIDEDEFS', 'VERTEXES', 'SEGS',
+                           'SSECTORS', 'NODES', 'SECTORS', 'REJECT', 'BLOCKMAP',
+                           'BEHAVIOUR')
+    resource_type = None
+
+    for entry_ptr in range(info_table_ptr, info_table_ptr + n_lumps * 16, 16):
+        file_pos, size = struct.unpack_from('<ii', data, entry_ptr)
+        name = _bytes_to_str(data[entry_ptr + 8:entry_ptr + 16])
+
+        if name in ('F_END', 'S_END', 'P_END'):
+            resource_type = None
+            continue
+
+        if resource_type is not None:
+            lump_info[resource_type][name] = (file_pos, size)
+        else:
+            if map_name_re.match(name):
+                current_map = name
+                lump_info[name] = {}
+            elif name in map_component_names:
+                lump_info[current_map][name] = (file_pos, size)
+            elif name == 'F_START':
+                resource_type = 'FLAT'
+                lump_info[resource_type] = {}
+            elif name == 'S_START':
+                resource_type = 'SPRITE'
+                lump_info[resource_type] = {}
+            elif name == 'P_START':
+                resource_type = 'PATCH'
+                lump_info[resource_type] = {}
             else:
-                if map_name_re.match(name):
-                    current_map = name
-                    lump_info[name] = {}
-                elif name in map_component_names:
-                    lump_info[current_map][name] = (file_pos, size)
-                elif name == 'F_START':
-                    resource_type = 'FLAT'
-                    lump_info[resource_type] = {}
-                elif name == 'S_START':
-                    resource_type = 'SPRITE'
-                    lump_info[resource_type] = {}
-                elif name == 'P_START':
-                    resource_type = 'PATCH'
-                    lump_info[resource_type] = {}
-                else:
-                    lump_info[name] = (file_pos, size)
+                lump_info[name] = (file_pos, size)
 
     return lump_info
 
-def read_things(wad_path : str, file_pos : int, size : int) -> List[Thing]:
-    things : List[Thing] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            thing_bytes = f.read(10)
-            size -= 10
-
-            thing = Thing(
-                position= Vector2(
-                    float(_bytes_to_int(thing_bytes[0:2], signed=True)),
-                    float(_bytes_to_int(thing_bytes[2:4], signed=True)),
-                ),
-                angle= _bytes_to_int(thing_bytes[4:6], signed=True),
-                thing_type= _bytes_to_int(thing_bytes[6:8], signed=True),
-                flags= _bytes_to_int(thing_bytes[8:10], signed=True),
-            )
-            things.append(thing)
-    return things
-
-def read_linedefs(wad_path : str, file_pos : int, size : int) -> List[LineDef]:
-    linedefs : List[LineDef] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            linedef_bytes = f.read(14)
-            size -= 14
-
-            linedef = LineDef(
-                start_vert =    _bytes_to_int(linedef_bytes[0:2],   signed=True),
-                end_vert =      _bytes_to_int(linedef_bytes[2:4],   signed=True),
-                flags =         _bytes_to_int(linedef_bytes[4:6],   signed=True),
-                special_type =  _bytes_to_int(linedef_bytes[6:8],   signed=True),
-                sector_tag =    _bytes_to_int(linedef_bytes[8:10],  signed=True),
-                front_sidedef = _bytes_to_int(linedef_bytes[10:12], signed=True),
-                back_sidedef =  _bytes_to_int(linedef_bytes[12:14], signed=True)
-            )
-            linedefs.append(linedef)
-    return linedefs
-
-def read_sidedefs(wad_path : str, file_pos : int, size : int) -> List[SideDef]:
-    sidedefs : List[SideDef] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            sidedef_bytes = f.read(30)
-            size -= 30
-
-            sidedef = SideDef(
-                x_offset=            _bytes_to_int(sidedef_bytes[0:2], signed=True),
-                y_offset=            _bytes_to_int(sidedef_bytes[2:4], signed=True),
-                upper_texture_name=  _bytes_to_str(sidedef_bytes[4:12]),
-                lower_texture_name=  _bytes_to_str(sidedef_bytes[12:20]),
-                middle_texture_name= _bytes_to_str(sidedef_bytes[20:28]),
-                sector=              _bytes_to_int(sidedef_bytes[28:30], signed=True)
-            )
-            sidedefs.append(sidedef)
-    return sidedefs
-
-def read_vertexes(wad_path : str, file_pos : int, size : int) -> List[Vector2]:
-    vertices : List[Vector2] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            vertex_bytes = f.read(4)
-            size -= 2
-
-            vertex = Vector2(
-                float(_bytes_to_int(vertex_bytes[0:2], signed=True)),
-                float(_bytes_to_int(vertex_bytes[2:4], signed=True))
-            )
-            vertices.append(vertex)
-    return vertices
-
-
-def read_segs(wad_path : str, file_pos : int, size : int) -> List[Seg]:
-    int_to_angle = lambda i: (i / 65535) * 2 * math.pi
-    segs : List[Seg] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            seg_bytes = f.read(12)
-            size -= 12
-
-            seg = Seg(
-                start_vert= _bytes_to_int(seg_bytes[0:2],   signed=True),
-                end_vert=   _bytes_to_int(seg_bytes[2:4],   signed=True),
-                angle=      int_to_angle(_bytes_to_int(seg_bytes[4:6], signed=True)),
-                linedef=    _bytes_to_int(seg_bytes[6:8],   signed=True),
-                direction=  _bytes_to_int(seg_bytes[8:10],  signed=True),
-                offset=     _bytes_to_int(seg_bytes[10:12], signed=True),
-            )
-            segs.append(seg)
-    return segs
-
-def read_ssectors(wad_path : str, file_pos : int, size : int) -> List[SubSector]:
-    ssectors : List[SubSector] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            ssector_bytes = f.read(4)
-            size -= 4
-
-            ssector = SubSector(
-                n_segs=    _bytes_to_int(ssector_bytes[0:2]),
-                start_seg= _bytes_to_int(ssector_bytes[2:4])
-            )
-            ssectors.append(ssector)
-    return ssectors
-
-def read_nodes(wad_path : str, file_pos : int, size : int) -> List[Node]:
-    nodes : List[Node] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            node_bytes = f.read(28)
-            size -= 28
-
-            right_top =    float(_bytes_to_int(node_bytes[8:10], signed=True))
-            right_bottom = float(_bytes_to_int(node_bytes[10:12], signed=True))
-            right_left =   float(_bytes_to_int(node_bytes[12:14], signed=True))
-            right_right =  float(_bytes_to_int(node_bytes[14:16], signed=True))
-
-            left_top =    float(_bytes_to_int(node_bytes[16:18], signed=True))
-            left_bottom = float(_bytes_to_int(node_bytes[18:20], signed=True))
-            left_left =   float(_bytes_to_int(node_bytes[20:22], signed=True))
-            left_right =  float(_bytes_to_int(node_bytes[22:24], signed=True))
-
-            node = Node(
-                part_line_start= Vector2(
-                    float(_bytes_to_int(node_bytes[0:2], signed=True)),
-                    float(_bytes_to_int(node_bytes[2:4], signed=True))
-                ),
-                part_line_dir= Vector2(
-                    float(_bytes_to_int(node_bytes[4:6], signed=True)),
-                    float(_bytes_to_int(node_bytes[6:8], signed=True))
-                ),
-                right_bbox= Rect(
-                    right_left, right_bottom, right_right - right_left, right_top - right_bottom
-                ),
-                left_bbox= Rect(
-                    left_left, left_bottom, left_right - left_left, left_top - left_bottom
-                ),
-                right_child= _bytes_to_int(node_bytes[24:26]),
-                left_child=  _bytes_to_int(node_bytes[26:28])
-            )
-            nodes.append(node)
-    return nodes
-
-def read_sectors(wad_path : str, file_pos : int, size : int) -> List[Sector]:
-    sectors : List[Sector] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            sector_bytes = f.read(26)
-            size -= 26
-
-            sector = Sector(
-                floor_height=         _bytes_to_int(sector_bytes[0:2], signed=True),
-                ceiling_height=       _bytes_to_int(sector_bytes[2:4], signed=True),
-                floor_texture_name=   _bytes_to_str(sector_bytes[4:12]),
-                ceiling_texture_name= _bytes_to_str(sector_bytes[12:20]),
-                light_level=          _bytes_to_int(sector_bytes[20:22], signed=True),
-                special_type=         _bytes_to_int(sector_bytes[22:24], signed=True),
-                tag_number=           _bytes_to_int(sector_bytes[24:26], signed=True),
-                lines=                []
-            )
-            sectors.append(sector)
-    return sectors
-
-def read_playpal(wad_path : str, file_pos : int, size : int) -> List[ColorPalette]:
+def _read_array(wad : WadFile, dtype : np.dtype, file_pos : int, size : int) -> np.ndarray:
+    return np.frombuffer(wad.lump(file_pos, size), dtype=dtype, count=size // dtype.itemsize)
+
+def read_things_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, THING_DTYPE, file_pos, size)
+
+def read_linedefs_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, LINEDEF_DTYPE, file_pos, size)
+
+def read_sidedefs_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, SIDEDEF_DTYPE, file_pos, size)
+
+def read_vertexes_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, VERTEX_DTYPE, file_pos, size)
+
+def read_segs_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, SEG_DTYPE, file_pos, size)
+
+def read_ssectors_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, SSECTOR_DTYPE, file_pos, size)
+
+def read_nodes_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, NODE_DTYPE, file_pos, size)
+
+def read_sectors_array(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    return _read_array(wad, SECTOR_DTYPE, file_pos, size)
+
+
+def things_from_array(arr : np.ndarray) -> List[Thing]:
+    return [Thing(Vector2(x, y), angle, thing_type, flags)
+            for x, y, angle, thing_type, flags in arr.tolist()]
+
+def linedefs_from_array(arr : np.ndarray) -> List[LineDef]:
+    return list(map(LineDef._make, arr.tolist()))
+
+def sidedefs_from_array(arr : np.ndarray) -> List[SideDef]:
+    return [SideDef(x_offset, y_offset, _bytes_to_str(upper), _bytes_to_str(lower), _bytes_to_str(middle), sector)
+            for x_offset, y_offset, upper, lower, middle, sector in arr.tolist()]
+
+def vertexes_from_array(arr : np.ndarray) -> List[Vector2]:
+    return [Vector2(x, y) for x, y in arr.tolist()]
+
+def segs_from_array(arr : np.ndarray) -> List[Seg]:
+    angles = (arr['angle'] / 65535 * 2 * math.pi).tolist()
+    return [Seg(start_vert, end_vert, angle, linedef, direction, offset)
+            for (start_vert, end_vert, _, linedef, direction, offset), angle in zip(arr.tolist(), angles)]
+
+def ssectors_from_array(arr : np.ndarray) -> List[SubSector]:
+    return list(map(SubSector._make, arr.tolist()))
+
+def nodes_from_array(arr : np.ndarray) -> List[Node]:
+    return [Node(
+                part_line_start= Vector2(x, y),
+                part_line_dir=   Vector2(dx, dy),
+                right_bbox=      Rect(right_left, right_bottom, right_right - right_left, right_top - right_bottom),
+                left_bbox=       Rect(left_left, left_bottom, left_right - left_left, left_top - left_bottom),
+                right_child=     right_child,
+                left_child=      left_child)
+            for (x, y, dx, dy,
+                 right_top, right_bottom, right_left, right_right,
+                 left_top, left_bottom, left_left, left_right,
+                 right_child, left_child) in arr.tolist()]
+
+def sectors_from_array(arr : np.ndarray) -> List[Sector]:
+    return [Sector(floor_height, ceiling_height, _bytes_to_str(floor_texture), _bytes_to_str(ceiling_texture),
+                   light_level, special_type, tag_number, [])
+            for (floor_height, ceiling_height, floor_texture, ceiling_texture,
+                 light_level, special_type, tag_number) in arr.tolist()]
+
+
+def read_things(wad : WadFile, file_pos : int, size : int) -> List[Thing]:
+    return things_from_array(read_things_array(wad, file_pos, size))
+
+def read_linedefs(wad : WadFile, file_pos : int, size : int) -> List[LineDef]:
+    return linedefs_from_array(read_linedefs_array(wad, file_pos, size))
+
+def read_sidedefs(wad : WadFile, file_pos : int, size : int) -> List[SideDef]:
+    return sidedefs_from_array(read_sidedefs_array(wad, file_pos, size))
+
+def read_vertexes(wad : WadFile, file_pos : int, size : int) -> List[Vector2]:
+    return vertexes_from_array(read_vertexes_array(wad, file_pos, size))
+
+def read_segs(wad : WadFile, file_pos : int, size : int) -> List[Seg]:
+    return segs_from_array(read_segs_array(wad, file_pos, size))
+
+def read_ssectors(wad : WadFile, file_pos : int, size : int) -> List[SubSector]:
+    return ssectors_from_array(read_ssectors_array(wad, file_pos, size))
+
+def read_nodes(wad : WadFile, file_pos : int, size : int) -> List[Node]:
+    return nodes_from_array(read_nodes_array(wad, file_pos, size))
+
+def read_sectors(wad : WadFile, file_pos : int, size : int) -> List[Sector]:
+    return sectors_from_array(read_sectors_array(wad, file_pos, size))
+
+def read_blockmap(wad : WadFile, file_pos : int, size : int) -> Blockmap:
+    words = np.frombuffer(wad.lump(file_pos, size), dtype='<u2', count=size // 2)
+    origin_x, origin_y, columns, rows = words[:4].view('<i2').tolist()
+    starts = words[4:4 + columns * rows].astype(np.int64)
+
+    # Each list runs up to the next 0xFFFF.
+    terminators = np.flatnonzero(words == 0xffff)
+    if len(starts) and (not len(terminators) or starts.max() > terminators[-1]):
+        raise ValueError('BLOCKMAP of %s has a block list without a 0xFFFF terminator' % wad.wad_path)
+    ends = terminators[np.searchsorted(terminators, starts)]
+    # Most node builders start every list with a 0 that is not a real line,
+    # vanilla ends up testing line 0 everywhere. Only when all lists start
+    # with one is it dropped, otherwise line 0 is real where it is listed.
+    if (words[starts] == 0).all():
+        starts += 1
+
+    lengths = ends - starts
+    offsets = np.zeros(len(starts) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    index = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return Blockmap(origin_x, origin_y, columns, rows, offsets, words[index].astype(np.int32))
+
+def read_reject(wad : WadFile, file_pos : int, size : int, n_sectors : int) -> np.ndarray:
+    # Bit s1 * n_sectors + s2, least significant bit first, is set when no
+    # point in sector s2 can be seen from sector s1. Short lumps reject nothing past their end.
+    reject = np.zeros((n_sectors * n_sectors + 7) // 8, dtype=np.uint8)
+    data = np.frombuffer(wad.lump(file_pos, size), dtype=np.uint8)[:len(reject)]
+    reject[:len(data)] = data
+    return reject
+
+def read_flat(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    # 64x64 palette indices, row after row. Short lumps are padded with 0.
+    flat = np.zeros(64 * 64, dtype=np.uint8)
+    data = np.frombuffer(wad.lump(file_pos, size), dtype=np.uint8)[:len(flat)]
+    flat[:len(data)] = data
+    return flat.reshape(64, 64)
+
+def read_colormap(wad : WadFile, file_pos : int, size : int) -> np.ndarray:
+    # 34 maps of 256 palette indices: 32 light levels from full bright down,
+    # then invulnerability and all black. Short lumps are padded with 0.
+    colormap = np.zeros(34 * 256, dtype=np.uint8)
+    data = np.frombuffer(wad.lump(file_pos, size), dtype=np.uint8)[:len(colormap)]
+    colormap[:len(data)] = data
+    return colormap.reshape(34, 256)
+
+def read_playpal(wad : WadFile, file_pos : int, size : int) -> List[ColorPalette]:
     n_bytes = 256 * 3
     palettes = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        while size > 0:
-            palette_bytes = f.read(n_bytes)
-            size -= n_bytes
-
-            palettes.append([])
-            for i in range(0, n_bytes, 3):
-                palettes[-1].append((int(palette_bytes[i + 0]), int(palette_bytes[i + 1]), int(palette_bytes[i + 2]), 255))
+    palette_data = wad.lump(file_pos, size)
+    for palette_ptr in range(0, size - n_bytes + 1, n_bytes):
+        palette_bytes = palette_data[palette_ptr:palette_ptr + n_bytes]
+        palettes.append([])
+        for i in range(0, n_bytes, 3):
+            palettes[-1].append((palette_bytes[i + 0], palette_bytes[i + 1], palette_bytes[i + 2], 255))
     return palettes
 
-def read_patch(wad_path : str, file_pos : int, size : int) -> Patch:
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        start_pos = f.tell()
-
-        width = _bytes_to_int(f.read(2))
-        height = _bytes_to_int(f.read(2))
-        left_offset = _bytes_to_int(f.read(2), signed=True)
-        top_offset = _bytes_to_int(f.read(2), signed=True)
-
-        columnofs = [_bytes_to_int(f.read(4)) for _ in range(width)]
-
-        patch = Patch(width, height, left_offset, top_offset, [])
-        for offset in columnofs:
-            f.seek(start_pos + offset)
-            top_delta = 0
-            while top_delta != 0xFF:
-                top_delta = _bytes_to_int(f.read(1))
-                length = _bytes_to_int(f.read(1))
-                f.read(1)
-                data = f.read(length)
-                f.read(1)
-                patch_col = PatchPost(top_delta, length, data)
-                patch.columns.append(patch_col)
-
-        return patch
-
-def read_patch_names(wad_path : str, file_pos : int, size : int) -> List[str]:
-    res_data : List[str] = []
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        n_patches = _bytes_to_int(f.read(4))
-        for _ in range(n_patches):
-            res_data.append(_bytes_to_str(f.read(8)).upper())
-    return res_data
-
-def read_textures(wad_path : str, file_pos : int, size : int) -> Dict[str, WadTexture]:
+def read_indexed_patch(wad : WadFile, file_pos : int, size : int) -> IndexedPatch:
+    patch_bytes = wad.lump(file_pos, size)
+
+    width, height, left_offset, top_offset = struct.unpack_from('<HHhh', patch_bytes, 0)
+    columnofs = struct.unpack_from('<%dI' % width, patch_bytes, 8)
+
+    post_x : List[int] = []
+    post_top : List[int] = []
+    post_length : List[int] = []
+    post_ptr : List[int] = []
+    for x, offset in enumerate(columnofs):
+        top = -1
+        top_delta = patch_bytes[offset]
+        while top_delta != 0xFF:
+            # Tall patches store a delta relative to the previous post once it passes 254.
+            top = top + top_delta if top_delta <= top else top_delta
+            length = patch_bytes[offset + 1]
+            post_x.append(x)
+            post_top.append(top)
+            post_length.append(length)
+            post_ptr.append(offset + 3)
+            offset += length + 4
+            top_delta = patch_bytes[offset]
+
+    tops = np.array(post_top, dtype=np.intp)
+    lengths = np.clip(np.minimum(post_length, height - tops), 0, None)
+    run = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    dst = np.repeat(np.array(post_x, dtype=np.intp) * height + tops, lengths) + run
+    src = np.repeat(np.array(post_ptr, dtype=np.intp), lengths) + run
+
+    pixels = np.zeros(width * height, dtype=np.uint8)
+    mask = np.zeros(width * height, dtype=bool)
+    pixels[dst] = np.frombuffer(patch_bytes, dtype=np.uint8)[src]
+    mask[dst] = True
+    return IndexedPatch(pixels.reshape(width, height), mask.reshape(width, height), left_offset, top_offset)
+
+def read_patch_names(wad : WadFile, file_pos : int, size : int) -> List[str]:
+    pnames_bytes = wad.lump(file_pos, size)
+    n_patches = _bytes_to_int(pnames_bytes[0:4])
+    return [_bytes_to_str(pnames_bytes[i:i + 8]).upper() for i in range(4, 4 + n_patches * 8, 8)]
+
+def read_textures(wad : WadFile, file_pos : int, size : int) -> Dict[str, WadTexture]:
     res_dict : Dict[str, WadTexture] = {}
-    with open(wad_path, 'rb') as f:
-        f.seek(file_pos)
-        n_textures = _bytes_to_int(f.read(4))
-        texture_offsets = [_bytes_to_int(f.read(4)) for _ in range(n_textures)]
-
-        for i, offset in enumerate(texture_offsets):
-            f.seek(file_pos + offset)
-            name = _bytes_to_str(f.read(8))
-            f.read(4)
-            width = _bytes_to_int(f.read(2))
-            height = _bytes_to_int(f.read(2))
-            f.read(4)
-            n_patches = _bytes_to_int(f.read(2))
-
-            texture = WadTexture(name, width, height, n_patches, [])
-            for i in range(n_patches):
-                orginx = _bytes_to_int(f.read(2), signed=True)
-                orginy = _bytes_to_int(f.read(2), signed=True)
-                p_num = _bytes_to_int(f.read(2), signed=True)
-                f.read(4)
-                layout = PatchLayout(orginx, orginy, p_num)
-                texture.layouts.append(layout)
-            res_dict[name] = texture
-    return res_dict
\ No newline at end of file
+    texture_bytes = wad.lump(file_pos, size)
+    n_textures = _bytes_to_int(texture_bytes[0:4])
+    texture_offsets = struct.unpack_from('<%di' % n_textures, texture_bytes, 4)
+
+    for offset in texture_offsets:
+        name = _bytes_to_str(texture_bytes[offset:offset + 8])
+        width, height, n_patches = struct.unpack_from('<4xhh4xh', texture_bytes, offset + 8)
+
+        texture = WadTexture(name, width, height, n_patches, [])
+        for orginx, orginy, p_num in struct.iter_unpack('<hhh4x', texture_bytes[offset + 22:offset + 22 + n_patches * 10]):
+            layout = PatchLayout(orginx, orginy, p_num)
+            texture.layouts.append(layout)
+        res_dict[name] = texture
+    return res_dict